@@ -1,39 +1,137 @@
+import os
+import sys
+
 import pygame
 from pygame.locals import *
-import pickle
+
+from chesscore import instrument
+from chesscore.book import OpeningBook
+from chesscore.engine import EngineWorker
+from chesscore.explorer import PositionIndex, format_rows
+from chesscore.game import Game
+from chesscore.pgn import read_games, replay
+from chesscore.position import COLOR_NAMES, PIECE_SYMBOLS, Position, iter_squares, move_to_uci, square
+from chesscore.savegame import SaveFile
+from chesscore.search import DIFFICULTY_LEVELS, Searcher, mate_in
+from chesscore.tablebase import Tablebase
 
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 800
 BOARD_SIZE = 8
 SQUARE_SIZE = SCREEN_WIDTH // BOARD_SIZE
-
-pygame.init()
-
-class ChessGame:
+SAVE_FILE = "chess_save.journal"
+TABLEBASE_DIR = "tablebases"
+BOOK_FILE = "book.bin"
+ENGINE_LEVEL = "medium"
+POSITION_INDEX = "positions.db"
+
+
+LIGHT_SQUARE = (200, 200, 200)
+DARK_SQUARE = (100, 100, 100)
+SELECTED_SQUARE = (120, 170, 90)
+TARGET_HINT = (70, 130, 180)
+TARGET_RADIUS = SQUARE_SIZE // 6
+
+# The F3 metrics overlay covers the top left of the window and is redrawn
+# on a timer while shown
+HUD_REFRESH = pygame.event.custom_type()
+HUD_REFRESH_MS = 500
+HUD_RECT = pygame.Rect(0, 0, 5 * SQUARE_SIZE, 3 * SQUARE_SIZE)
+HUD_SQUARES = sum(1 << (row * BOARD_SIZE + col) for row in range(3) for col in range(5))
+HUD_BACKGROUND = (0, 0, 0, 180)
+HUD_TEXT = (230, 230, 230)
+HUD_LINE_HEIGHT = 16
+
+# The F2 explorer panel covers the bottom right of the window and lists the
+# moves the indexed games played from the position on the board
+EXPLORER_RECT = pygame.Rect(4 * SQUARE_SIZE, 5 * SQUARE_SIZE, 4 * SQUARE_SIZE, 3 * SQUARE_SIZE)
+EXPLORER_SQUARES = sum(1 << (row * BOARD_SIZE + col) for row in range(5, 8) for col in range(4, 8))
+EXPLORER_MOVES = 12
+
+# The engine thinks on a worker thread and reports back through the event
+# queue, so the window keeps drawing and taking input while it searches
+ENGINE_INFO = pygame.event.custom_type()
+ENGINE_MOVE = pygame.event.custom_type()
+
+
+def square_rect(sq):
+    row, col = divmod(sq, BOARD_SIZE)
+    return pygame.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+
+
+class ChessGame(Game):
     def __init__(self):
+        Game.__init__(self, Position())
+        pygame.init()
         self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
         pygame.display.set_caption("Chess Game")
         self.clock = pygame.time.Clock()
-        self.board = [[None] * BOARD_SIZE for _ in range(BOARD_SIZE)]
         self.selected_piece = None
+        # Bitboard of the legal targets of the selected piece
+        self.highlighted = 0
+        self.board_surface = None
+        # Bitboard of squares to repaint on the next frame, or everything
+        # when full_redraw is set
+        self.dirty = 0
+        self.full_redraw = True
+        self.save_file = SaveFile(SAVE_FILE)
+        if os.path.isdir(TABLEBASE_DIR):
+            self.tablebase = Tablebase(TABLEBASE_DIR)
+        self.book = None
+        if os.path.exists(BOOK_FILE):
+            self.book = OpeningBook(BOOK_FILE)
+        self.engine = EngineWorker(Searcher(book=self.book, tablebase=self.tablebase))
+        # Color index the engine plays, or None for two human players
+        self.engine_side = None
+        self.position_index = None
+        if os.path.exists(POSITION_INDEX):
+            self.position_index = PositionIndex(POSITION_INDEX, readonly=True)
+        self.explorer = False
+        # Position key and text of the explorer panel last looked up
+        self.explorer_key = None
+        self.explorer_lines = []
+        self.hud = False
+        self.hud_font = None
+        # Where metrics are written on quit when started with --profile
+        self.metrics_path = None
 
     def run(self):
+        # Paint only what changed, then sleep in event.wait until there is
+        # input, so an idle board costs no CPU
         while True:
-            self.handle_events()
-            self.draw_board()
-            self.draw_pieces()
-            pygame.display.flip()
+            self.render()
+            self.handle_events([pygame.event.wait()] + pygame.event.get())
             self.clock.tick(60)
 
-    def handle_events(self):
-        for event in pygame.event.get():
+    def handle_events(self, events):
+        for event in events:
             if event.type == QUIT:
+                self.engine.cancel()  # Stop thinking before the save reads the game
                 self.save_game()  # Save the game before quitting
+                self.save_file.close()
+                if self.book is not None:
+                    self.book.close()
+                if self.position_index is not None:
+                    self.position_index.close()
+                if self.metrics_path:
+                    instrument.metrics.write(self.metrics_path)
                 pygame.quit()
                 exit()
 
+            if event.type in (VIDEOEXPOSE, WINDOWEXPOSED):
+                self.full_redraw = True
+
+            if event.type == HUD_REFRESH:
+                self.dirty |= HUD_SQUARES
+
+            if event.type == ENGINE_INFO:
+                self.show_thinking(event.result)
+
+            if event.type == ENGINE_MOVE:
+                self.play_engine_move(event.key, event.move)
+
             if event.type == MOUSEBUTTONDOWN:
-                self.on_mouse_press(*pygame.mouse.get_pos(), event.button, event.mod)
+                self.on_mouse_press(*event.pos, event.button, pygame.key.get_mods())
 
             if event.type == KEYDOWN:
                 if event.key == K_s and pygame.key.get_mods() & KMOD_CTRL:
@@ -42,284 +140,396 @@ class ChessGame:
                 if event.key == K_l and pygame.key.get_mods() & KMOD_CTRL:
                     self.load_game()  # Load the game when Ctrl + L is pressed
 
-    def draw_board(self):
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                color = (200, 200, 200) if (row + col) % 2 == 0 else (100, 100, 100)
-                pygame.draw.rect(self.screen, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+                if event.key == K_z and pygame.key.get_mods() & KMOD_CTRL:
+                    self.take_back()  # Take back the last move when Ctrl + Z is pressed
 
-    def draw_pieces(self):
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = self.board[row][col]
-                if piece:
-                    piece.draw(self.screen, col * SQUARE_SIZE, row * SQUARE_SIZE)
+                if event.key == K_y and pygame.key.get_mods() & KMOD_CTRL:
+                    self.review(self.redo)  # Play an undone move again when Ctrl + Y is pressed
 
-    def on_mouse_press(self, x, y, button, modifiers):
-        col = x // SQUARE_SIZE
-        row = y // SQUARE_SIZE
+                if event.key == K_LEFT:
+                    self.review(self.undo)
 
-        if self.selected_piece is None:
-            self.selected_piece = (row, col)
-        else:
-            if self.is_valid_move(self.selected_piece, (row, col)):
-                self.move_piece(self.selected_piece, (row, col))
-            self.selected_piece = None
+                if event.key == K_RIGHT:
+                    self.review(self.redo)
 
-    def is_valid_move(self, start, end):
-        start_row, start_col = start
-        end_row, end_col = end
-        piece = self.board[start_row][start_col]
+                if event.key == K_HOME:
+                    self.review(self.seek, 0)
 
-        if piece:
-            return piece.is_valid_move(start, end, self.board)
+                if event.key == K_END:
+                    self.review(self.seek, len(self.moves) + len(self.future))
 
-        return False
+                if event.key == K_e and pygame.key.get_mods() & KMOD_CTRL:
+                    self.toggle_engine()  # The engine takes over the side to move
 
-    def move_piece(self, start, end):
-        start_row, start_col = start
-        end_row, end_col = end
-        piece = self.board[start_row][start_col]
+                if event.key == K_r and pygame.key.get_mods() & KMOD_CTRL:
+                    self.resign()  # Resign, even while the engine is thinking
+
+                if event.key == K_ESCAPE and self.engine.busy():
+                    self.toggle_engine()  # Hand the move back to the player
 
-        if piece:
-            if piece.is_valid_move(start, end, self.board):
-                self.board[end_row][end_col] = piece
-                self.board[start_row][start_col] = None
+                if event.key == K_F2:
+                    self.toggle_explorer()
 
-    def is_check(self, color):
-        king_position = None
+                if event.key == K_F3:
+                    self.toggle_hud()
 
+    def render(self):
+        # One indexed lookup per position shown, not per frame
+        if self.explorer and self.explorer_key != self.position.key:
+            self.explorer_key = self.position.key
+            self.explorer_lines = format_rows(self.position_index.lookup(self.position), EXPLORER_MOVES)
+            self.dirty |= EXPLORER_SQUARES
+        if self.full_redraw:
+            self.draw_board()
+            self.draw_pieces()
+            self.draw_targets()
+            if self.explorer:
+                self.draw_explorer()
+            if self.hud:
+                self.draw_hud()
+            pygame.display.flip()
+        elif self.dirty:
+            rects = [self.draw_square(sq) for sq in iter_squares(self.dirty)]
+            # Squares under an overlay were repainted, so it goes back on top
+            if self.explorer and self.dirty & EXPLORER_SQUARES:
+                self.draw_explorer()
+            if self.hud and self.dirty & HUD_SQUARES:
+                self.draw_hud()
+            pygame.display.update(rects)
+        self.full_redraw = False
+        self.dirty = 0
+
+    def toggle_hud(self):
+        # Instrumentation is only switched on while the overlay is shown,
+        # or for the whole run with --profile
+        self.hud = not self.hud
+        if self.hud:
+            if not instrument.enabled():
+                instrument.enable(FRAME_TARGETS)
+            pygame.time.set_timer(HUD_REFRESH, HUD_REFRESH_MS)
+        else:
+            if not self.metrics_path:
+                instrument.disable()
+            pygame.time.set_timer(HUD_REFRESH, 0)
+        self.full_redraw = True
+
+    def toggle_explorer(self):
+        if self.position_index is None:
+            print(f"No {POSITION_INDEX}; build one with: python -m chesscore explorer build {POSITION_INDEX} games.pgn")
+            return
+        self.explorer = not self.explorer
+        self.explorer_key = None
+        self.full_redraw = True
+
+    def draw_hud(self):
+        self.draw_panel(HUD_RECT, ["F3 hides these metrics"] + instrument.metrics.summary_lines())
+
+    def draw_explorer(self):
+        self.draw_panel(EXPLORER_RECT, ["F2 hides the explorer"] + self.explorer_lines)
+
+    def draw_panel(self, rect, lines):
+        if self.hud_font is None:
+            self.hud_font = pygame.font.Font(None, 18)
+        overlay = pygame.Surface(rect.size, SRCALPHA)
+        overlay.fill(HUD_BACKGROUND)
+        for i, line in enumerate(lines[:rect.height // HUD_LINE_HEIGHT]):
+            overlay.blit(self.hud_font.render(line, True, HUD_TEXT), (6, 4 + i * HUD_LINE_HEIGHT))
+        self.screen.blit(overlay, rect.topleft)
+
+    def toggle_engine(self):
+        if self.engine_side is None:
+            self.engine_side = self.position.side_to_move
+            self.think()
+        else:
+            self.engine.cancel()
+            self.engine_side = None
+            pygame.display.set_caption("Chess Game")
+
+    def resign(self):
+        # The player resigns against the engine, otherwise the side to move
+        loser = self.position.side_to_move if self.engine_side is None else self.engine_side ^ 1
+        self.engine.cancel()
+        self.engine_side = None
+        pygame.display.set_caption(f"Chess Game - {COLOR_NAMES[loser]} resigned")
+        print(f"{COLOR_NAMES[loser].capitalize()} resigns. {COLOR_NAMES[loser ^ 1].capitalize()} wins!")
+
+    def think(self):
+        # Starts a search when it is the engine's turn in a game still going
+        if self.engine_side != self.position.side_to_move or not self.legal_moves():
+            return
+        self.engine.start(
+            self.position,
+            DIFFICULTY_LEVELS[ENGINE_LEVEL],
+            self.key_history,
+            on_info=lambda result: pygame.event.post(pygame.event.Event(ENGINE_INFO, result=result)),
+            on_done=lambda key, result: pygame.event.post(pygame.event.Event(ENGINE_MOVE, key=key, move=result.move)),
+        )
+        pygame.display.set_caption("Chess Game - thinking")
+
+    def show_thinking(self, result):
+        mate = mate_in(result.score)
+        score = f"mate {mate}" if mate is not None else f"{result.score / 100:+.2f}"
+        pv = " ".join(move_to_uci(move) for move in result.pv[:4])
+        pygame.display.set_caption(f"Chess Game - depth {result.depth} {score} {pv}")
+
+    def play_engine_move(self, key, move):
+        # A move for a position that has since changed is dropped
+        if key != self.position.key or self.engine_side != self.position.side_to_move or not move:
+            return
+        pygame.display.set_caption("Chess Game")
+        self.make_move(move)
+        message = self.status()
+        if message:
+            print(message)
+
+    def step_history(self, action, *args):
+        # Undo, redo and seek repaint only the squares that changed
+        self.engine.cancel()
+        before = list(self.position.pieces)
+        action(*args)
+        for old, new in zip(before, self.position.pieces):
+            self.dirty |= old ^ new
+        if self.selected_piece is not None:
+            self.dirty |= 1 << square(*self.selected_piece) | self.highlighted
+            self.selected_piece = None
+            self.highlighted = 0
+
+    def take_back(self):
+        # Against the engine this goes back to the player's previous turn
+        self.step_history(self.undo)
+        if self.engine_side == self.position.side_to_move and self.moves:
+            self.step_history(self.undo)
+        self.think()
+
+    def review(self, action, *args):
+        # Stepping through a game hands the engine's side back to the player
+        if self.engine_side is not None:
+            self.toggle_engine()
+        self.step_history(action, *args)
+
+    def render_board_surface(self):
+        # The empty checkerboard never changes, so it is drawn once and
+        # squares are restored from it
+        surface = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert()
         for row in range(BOARD_SIZE):
             for col in range(BOARD_SIZE):
-                piece = self.board[row][col]
-                if isinstance(piece, King) and piece.color == color:
-                    king_position = (row, col)
-                    break
-
-        if king_position:
-            for row in range(BOARD_SIZE):
-                for col in range(BOARD_SIZE):
-                    piece = self.board[row][col]
-                    if piece and piece.color != color and piece.is_valid_move((row, col), king_position, self.board):
-                        return True
+                color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
+                pygame.draw.rect(surface, color, (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+        return surface
 
-        return False
+    def draw_board(self):
+        if self.board_surface is None:
+            self.board_surface = self.render_board_surface()
+        self.screen.blit(self.board_surface, (0, 0))
+        if self.selected_piece is not None:
+            pygame.draw.rect(self.screen, SELECTED_SQUARE, square_rect(square(*self.selected_piece)))
 
-    def is_checkmate(self, color):
-        for row in range(BOARD_SIZE):
-            for col in range(BOARD_SIZE):
-                piece = self.board[row][col]
-                if piece and piece.color == color:
-                    for i in range(BOARD_SIZE):
-                        for j in range(BOARD_SIZE):
-                            if piece.is_valid_move((row, col), (i, j), self.board):
-                                temp_board = [row[:] for row in self.board]
-                                temp_board[i][j] = temp_board[row][col]
-                                temp_board[row][col] = None
+    def draw_pieces(self):
+        atlas = piece_atlas()
+        for index, bitboard in enumerate(self.position.pieces):
+            for sq in iter_squares(bitboard):
+                row, col = divmod(sq, BOARD_SIZE)
+                atlas.draw(self.screen, self.pieces[index].index, col * SQUARE_SIZE, row * SQUARE_SIZE)
+
+    def draw_targets(self):
+        for sq in iter_squares(self.highlighted):
+            self.draw_target(square_rect(sq))
+
+    def draw_target(self, rect):
+        pygame.draw.circle(self.screen, TARGET_HINT, rect.center, TARGET_RADIUS)
+
+    def draw_square(self, sq):
+        rect = square_rect(sq)
+        if self.board_surface is None:
+            self.board_surface = self.render_board_surface()
+        self.screen.blit(self.board_surface, rect, rect)
+        if self.selected_piece is not None and square(*self.selected_piece) == sq:
+            pygame.draw.rect(self.screen, SELECTED_SQUARE, rect)
+        piece = self.position.piece_at(sq)
+        if piece is not None:
+            piece_atlas().draw(self.screen, self.pieces[piece].index, rect.x, rect.y)
+        if self.highlighted >> sq & 1:
+            self.draw_target(rect)
+        return rect
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        col = x // SQUARE_SIZE
+        row = y // SQUARE_SIZE
+        if not (0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE):
+            return
+        if self.engine_side == self.position.side_to_move:
+            return
+
+        # Targets come from the legal moves Game caches per position, which
+        # status() already built after the last move, so a click never waits
+        # on move generation
+        if self.selected_piece is None:
+            self.selected_piece = (row, col)
+            self.highlighted = self.legal_targets((row, col))
+            self.dirty |= 1 << square(row, col) | self.highlighted
+        else:
+            self.dirty |= 1 << square(*self.selected_piece) | self.highlighted
+            if self.highlighted >> square(row, col) & 1:
+                self.move_piece(self.selected_piece, (row, col))
+            self.selected_piece = None
+            self.highlighted = 0
+
+    def make_move(self, move):
+        # Every square whose contents changed, which covers castling rooks
+        # and en passant captures as well as the two move squares
+        before = list(self.position.pieces)
+        Game.make_move(self, move)
+        for old, new in zip(before, self.position.pieces):
+            self.dirty |= old ^ new
+
+    def reset(self, position=None):
+        # Loads and replays start here, so a search of the old game ends
+        self.engine.cancel()
+        Game.reset(self, position)
+        self.selected_piece = None
+        self.highlighted = 0
+        self.full_redraw = True
 
-                                if not self.is_check(color):
-                                    return False
+    def move_piece(self, start, end):
+        move = Game.move_piece(self, start, end)
 
-        return True
+        if move is not None:
+            message = self.status()
+            if message:
+                print(message)
+            self.think()
+        return move
 
     def save_game(self):
-        with open("chess_save.pickle", "wb") as file:
-            pickle.dump(self.board, file)
-            print("Game saved!")
+        # Appends only the moves made since the last save
+        self.save_file.save(self)
+        print("Game saved!")
 
     def load_game(self):
         try:
-            with open("chess_save.pickle", "rb") as file:
-                self.board = pickle.load(file)
-                print("Game loaded!")
-        except FileNotFoundError:
+            loaded = self.save_file.load(self)
+        except ValueError as error:
+            print(f"Save file is damaged: {error}")
+            return
+        if loaded:
+            print("Game loaded!")
+            self.think()
+        else:
             print("No saved game found.")
 
-class ChessPiece:
-    def __init__(self, filename, scale, color, symbol):
-        self.image = pygame.image.load(filename)
-        self.image = pygame.transform.scale(self.image, (int(scale * SQUARE_SIZE), int(scale * SQUARE_SIZE)))
-        self.rect = self.image.get_rect()
-        self.color = color
-        self.symbol = symbol
-
-    def is_valid_move(self, start, end, board):
-        raise NotImplementedError("Subclasses must implement this method")
-
-    def draw(self, screen, x, y):
-        screen.blit(self.image, (x, y))
-
-
-class Pawn(ChessPiece):
-    def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-        direction = 1 if self.color == "white" else -1
-
-        # Regular move
-        if start_col == end_col and start_row + direction == end_row and board[end_row][end_col] is None:
-            return True
-
-        # Initial double move
-        if (
-            start_col == end_col
-            and start_row + 2 * direction == end_row
-            and start_row == 1 if self.color == "white" else 6
-            and board[end_row][end_col] is None
-        ):
-            return True
-
-        # Capture move
-        if abs(start_col - end_col) == 1 and start_row + direction == end_row:
-            if board[end_row][end_col] and board[end_row][end_col].color != self.color:
-                return True
-
-        return False
-
-
-class Rook(ChessPiece):
-    def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        # Horizontal move
-        if start_row == end_row and self.is_clear_horizontal_path(start, end, board):
-            return True
-
-        # Vertical move
-        if start_col == end_col and self.is_clear_vertical_path(start, end, board):
-            return True
-
-        return False
-
-    def is_clear_horizontal_path(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        step = 1 if end_col > start_col else -1
-
-        for col in range(start_col + step, end_col, step):
-            if board[start_row][col]:
-                return False
-
-        return True
-
-    def is_clear_vertical_path(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        step = 1 if end_row > start_row else -1
-
-        for row in range(start_row + step, end_row, step):
-            if board[row][start_col]:
-                return False
-
-        return True
-
-
-class Knight(ChessPiece):
-    def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        # Knight Move
-        if (
-            (abs(start_row - end_row) == 2 and abs(start_col - end_col) == 1)
-            or (abs(start_row - end_row) == 1 and abs(start_col - end_col) == 2)
-        ) and (board[end_row][end_col] is None or board[end_row][end_col].color != self.color):
-            return True
-
-        return False
-
-
-class Bishop(ChessPiece):
-    def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        # Diagonal Move
-        if abs(start_row - end_row) == abs(start_col - end_col):
-            if self.is_clear_diagonal_path(start, end, board):
+    def open_pgn(self, path, number=1):
+        # Replays the numbered game of a PGN file onto the board
+        for pgn_game in read_games(path):
+            if pgn_game.index == number - 1:
+                replay(self, pgn_game)
+                if pgn_game.error:
+                    print(f"Game {number} stops early: {pgn_game.error}")
+                else:
+                    print(f"Game {number} loaded from {path}.")
                 return True
-
+        print(f"No game {number} in {path}.")
         return False
 
-    def is_clear_diagonal_path(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
-
-        row_step = 1 if end_row > start_row else -1
-        col_step = 1 if end_col > start_col else -1
-
-        row, col = start_row + row_step, start_col + col_step
-        while row != end_row and col != end_col:
-            if board[row][col]:
-                return False
-            row += row_step
-            col += col_step
 
-        return True
+# Front end methods timed while instrumentation is on; render and
+# handle_events each run once per frame
+FRAME_TARGETS = (
+    (ChessGame, "render", "frame.render"),
+    (ChessGame, "handle_events", "frame.events"),
+    (ChessGame, "draw_board", "draw.board"),
+    (ChessGame, "draw_pieces", "draw.pieces"),
+    (ChessGame, "draw_square", "draw.square"),
+    (PositionIndex, "lookup", "explorer.lookup"),
+)
+
+
+# Piece images in PIECE_SYMBOLS order; a piece's index here is its slot in
+# the atlas
+PIECE_IMAGE_FILES = (
+    "pawn_white.png",
+    "knight_white.png",
+    "bishop_white.png",
+    "rook_white.png",
+    "queen_white.png",
+    "king_white.png",
+    "pawn_black.png",
+    "knight_black.png",
+    "bishop_black.png",
+    "rook_black.png",
+    "queen_black.png",
+    "king_black.png",
+)
+PIECE_SCALE = 0.5
+
+
+class PieceAtlas:
+    # Every piece image, scaled once and packed side by side into a single
+    # surface converted to the display's pixel format
+    def __init__(self, filenames, size):
+        self.size = size
+        surface = pygame.Surface((size * len(filenames), size), SRCALPHA)
+        self.rects = []
+        for index, filename in enumerate(filenames):
+            image = pygame.transform.scale(pygame.image.load(filename), (size, size))
+            surface.blit(image, (index * size, 0))
+            self.rects.append(pygame.Rect(index * size, 0, size, size))
+        self.surface = surface.convert_alpha()
+
+    def draw(self, screen, index, x, y):
+        screen.blit(self.surface, (x, y), self.rects[index])
+
+
+# Atlases built so far, by image size. Loading happens once per process, so
+# resets and loads never go back to disk for images.
+_atlases = {}
+
+
+def piece_atlas(size=None):
+    if size is None:
+        size = int(PIECE_SCALE * SQUARE_SIZE)
+    atlas = _atlases.get(size)
+    if atlas is None:
+        atlas = _atlases[size] = PieceAtlas(PIECE_IMAGE_FILES, size)
+    return atlas
 
 
-class Queen(ChessPiece):
-    def __init__(self, filename, scale, color, symbol):
-        super().__init__(filename, scale, color, symbol)
-
-    def is_valid_move(self, start, end, board):
-        if Rook(self.filename, self.scale, self.color, self.symbol).is_valid_move(start, end, board) or \
-           Bishop(self.filename, self.scale, self.color, self.symbol).is_valid_move(start, end, board):
-            return True
-        return False
-
+class ChessPiece:
+    # What a piece looks like; the rules live in chesscore. A piece is just
+    # its atlas index, so it holds no surface and pickles to almost nothing.
+    def __init__(self, index):
+        self.index = index
+        self.color = COLOR_NAMES[index // 6]
+        self.symbol = PIECE_SYMBOLS[index]
+        self.side = index // 6
+
+    @property
+    def rect(self):
+        return piece_atlas().rects[self.index].copy()
 
-class King(ChessPiece):
-    def is_valid_move(self, start, end, board):
-        start_row, start_col = start
-        end_row, end_col = end
+    def draw(self, screen, x, y):
+        piece_atlas().draw(screen, self.index, x, y)
 
-        # Single move in any direction
-        if abs(start_row - end_row) <= 1 and abs(start_col - end_col) <= 1:
-            return True
 
-        return False
+def initialize_board(game):
+    # One piece object per piece type and color, in PIECE_SYMBOLS order
+    game.pieces = [ChessPiece(index) for index in range(len(PIECE_SYMBOLS))]
+    game.reset(Position.starting())
 
 
-def initialize_board(game):
-    # Pawns
-    for col in range(BOARD_SIZE):
-        game.board[1][col] = Pawn("pawn_white.png", 0.5, "white", "P")
-        game.board[6][col] = Pawn("pawn_black.png", 0.5, "black", "p")
-
-    # Rooks
-    game.board[0][0] = Rook("rook_white.png", 0.5, "white", "R")
-    game.board[0][7] = Rook("rook_white.png", 0.5, "white", "R")
-    game.board[7][0] = Rook("rook_black.png", 0.5, "black", "r")
-    game.board[7][7] = Rook("rook_black.png", 0.5, "black", "r")
-
-    # Knights
-    game.board[0][1] = Knight("knight_white.png", 0.5, "white", "N")
-    game.board[0][6] = Knight("knight_white.png", 0.5, "white", "N")
-    game.board[7][1] = Knight("knight_black.png", 0.5, "black", "n")
-    game.board[7][6] = Knight("knight_black.png", 0.5, "black", "n")
-
-    # Bishops
-    game.board[0][2] = Bishop("bishop_white.png", 0.5, "white", "B")
-    game.board[0][5] = Bishop("bishop_white.png", 0.5, "white", "B")
-    game.board[7][2] = Bishop("bishop_black.png", 0.5, "black", "b")
-    game.board[7][5] = Bishop("bishop_black.png", 0.5, "black", "b")
-
-    # Queens
-    game.board[0][3] = Queen("queen_white.png", 0.5, "white", "Q")
-    game.board[7][3] = Queen("queen_black.png", 0.5, "black", "q")
-
-    # Kings
-    game.board[0][4] = King("king_white.png", 0.5, "white", "K")
-    game.board[7][4] = King("king_black.png", 0.5, "black", "k")
-
-
-def main():
+def main(argv=None):
+    # Chess Game.py [games.pgn [N]] starts from the end of game N of a PGN file.
+    # --profile PATH first instruments the whole run, shows the metrics
+    # overlay and writes the metrics to PATH (JSON or .csv) on quit.
+    argv = sys.argv[1:] if argv is None else argv
     game = ChessGame()
     initialize_board(game)
+    if argv[:1] == ["--profile"] and len(argv) > 1:
+        game.metrics_path = argv[1]
+        argv = argv[2:]
+        instrument.enable(FRAME_TARGETS)
+        game.toggle_hud()
+    if argv:
+        game.open_pgn(argv[0], int(argv[1]) if len(argv) > 1 else 1)
     game.run()
 
 
@@ -0,0 +1,12 @@
+from .position import (
+    BLACK,
+    STARTING_FEN,
+    WHITE,
+    BoardView,
+    Position,
+    parse_square,
+    square,
+    square_name,
+)
+from .movegen import generate_legal_moves, is_check, is_checkmate, is_stalemate
+from .game import Game, validate_move
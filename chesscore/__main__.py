@@ -0,0 +1,47 @@
+import importlib
+import sys
+
+# Headless commands, each one a module with its own main(argv)
+COMMANDS = {
+    "perft": "chesscore.perft",
+    "search": "chesscore.search",
+    "validate": "chesscore.game",
+    "journal": "chesscore.savegame",
+    "pgn": "chesscore.pgn",
+    "batcheval": "chesscore.batcheval",
+    "book": "chesscore.book",
+    "tablebase": "chesscore.tablebase",
+    "server": "chesscore.server",
+    "uci": "chesscore.uci",
+    "tournament": "chesscore.tournament",
+    "explorer": "chesscore.explorer",
+}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # --profile PATH runs the command instrumented and writes the metrics
+    # to PATH (JSON, or CSV for a .csv path) when it finishes
+    profile = None
+    if argv[:1] == ["--profile"] and len(argv) > 1:
+        profile, argv = argv[1], argv[2:]
+    if not argv or argv[0] not in COMMANDS:
+        print(f"usage: python -m chesscore [--profile PATH] {{{','.join(COMMANDS)}}} ...", file=sys.stderr)
+        return 2
+
+    module = importlib.import_module(COMMANDS[argv[0]])
+    if profile is None:
+        return module.main(argv[1:])
+
+    from . import instrument
+
+    instrument.enable()
+    try:
+        return module.main(argv[1:])
+    finally:
+        instrument.disable()
+        instrument.metrics.write(profile)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+from .position import BOARD_SIZE
+
+# Attack tables. Leaper attacks are a plain list lookup per square, built at
+# import. Sliding attacks are split into the four lines through a square
+# (rank, file, diagonal, anti-diagonal); each line maps the blockers on its
+# inner squares straight to the attack set, so a rook or bishop query is two
+# masked dict lookups instead of a ray walk.
+
+KNIGHT_OFFSETS = ((2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1))
+KING_OFFSETS = ((1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1))
+
+# Directions are indices into KING_OFFSETS; direction d + 4 is its opposite
+FILE_DIRECTIONS = (0, 4)
+DIAGONAL_DIRECTIONS = (1, 5)
+RANK_DIRECTIONS = (2, 6)
+ANTI_DIAGONAL_DIRECTIONS = (3, 7)
+
+
+def _on_board(row, col):
+    return 0 <= row < BOARD_SIZE and 0 <= col < BOARD_SIZE
+
+
+def _leaper_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, BOARD_SIZE)
+        bitboard = 0
+        for d_row, d_col in offsets:
+            if _on_board(row + d_row, col + d_col):
+                bitboard |= 1 << ((row + d_row) * BOARD_SIZE + col + d_col)
+        table.append(bitboard)
+    return table
+
+
+def _ray_squares(sq, d_row, d_col):
+    row, col = divmod(sq, BOARD_SIZE)
+    squares = []
+    row += d_row
+    col += d_col
+    while _on_board(row, col):
+        squares.append(row * BOARD_SIZE + col)
+        row += d_row
+        col += d_col
+    return squares
+
+
+# RAY_SQUARES[sq][direction] lists the squares from sq to the board edge
+RAY_SQUARES = [[_ray_squares(sq, d_row, d_col) for d_row, d_col in KING_OFFSETS] for sq in range(64)]
+
+
+def _ray(sq, direction, occupied):
+    bitboard = 0
+    for target in RAY_SQUARES[sq][direction]:
+        bit = 1 << target
+        bitboard |= bit
+        if occupied & bit:
+            break
+    return bitboard
+
+
+def _blocker_mask(sq, directions):
+    # Squares whose occupancy can cut the line short; the last square of each
+    # ray is attacked whether or not it is occupied, so it is left out
+    mask = 0
+    for direction in directions:
+        for target in RAY_SQUARES[sq][direction][:-1]:
+            mask |= 1 << target
+    return mask
+
+
+class _LineAttacks(dict):
+    # Blocker pattern -> attack set for one square and line. Entries are
+    # filled on first use, which keeps importing the rules cheap.
+    __slots__ = ("sq", "directions")
+
+    def __init__(self, sq, directions):
+        super().__init__()
+        self.sq = sq
+        self.directions = directions
+
+    def __missing__(self, blockers):
+        attacks = 0
+        for direction in self.directions:
+            attacks |= _ray(self.sq, direction, blockers)
+        self[blockers] = attacks
+        return attacks
+
+
+def _line_table(directions):
+    masks = [_blocker_mask(sq, directions) for sq in range(64)]
+    tables = [_LineAttacks(sq, directions) for sq in range(64)]
+    return masks, tables
+
+
+KNIGHT_ATTACKS = _leaper_table(KNIGHT_OFFSETS)
+KING_ATTACKS = _leaper_table(KING_OFFSETS)
+PAWN_ATTACKS = (
+    _leaper_table(((1, -1), (1, 1))),
+    _leaper_table(((-1, -1), (-1, 1))),
+)
+
+RANK_MASKS, RANK_ATTACKS = _line_table(RANK_DIRECTIONS)
+FILE_MASKS, FILE_ATTACKS = _line_table(FILE_DIRECTIONS)
+DIAGONAL_MASKS, DIAGONAL_ATTACKS = _line_table(DIAGONAL_DIRECTIONS)
+ANTI_DIAGONAL_MASKS, ANTI_DIAGONAL_ATTACKS = _line_table(ANTI_DIAGONAL_DIRECTIONS)
+
+
+def _alignment_tables():
+    # BETWEEN[a][b] holds the squares strictly between two aligned squares and
+    # LINE[a][b] the whole line through both; both are 0 when not aligned.
+    # EMPTY_RAYS[sq][direction] is the ray to the edge as a bitboard.
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    empty_rays = []
+    for sq in range(64):
+        rays = []
+        for squares in RAY_SQUARES[sq]:
+            bitboard = 0
+            for target in squares:
+                bitboard |= 1 << target
+            rays.append(bitboard)
+        empty_rays.append(rays)
+
+    for sq in range(64):
+        for direction in range(8):
+            full = empty_rays[sq][direction] | empty_rays[sq][(direction + 4) % 8] | (1 << sq)
+            path = 0
+            for target in RAY_SQUARES[sq][direction]:
+                between[sq][target] = path
+                line[sq][target] = full
+                path |= 1 << target
+    return between, line, empty_rays
+
+
+BETWEEN, LINE, EMPTY_RAYS = _alignment_tables()
+
+# Attacks on an empty board, handy as a cheap "could it ever reach" filter
+ROOK_RAYS = [rays[0] | rays[2] | rays[4] | rays[6] for rays in EMPTY_RAYS]
+BISHOP_RAYS = [rays[1] | rays[3] | rays[5] | rays[7] for rays in EMPTY_RAYS]
+
+
+def rook_attacks(sq, occupied):
+    return RANK_ATTACKS[sq][occupied & RANK_MASKS[sq]] | FILE_ATTACKS[sq][occupied & FILE_MASKS[sq]]
+
+
+def bishop_attacks(sq, occupied):
+    return (
+        DIAGONAL_ATTACKS[sq][occupied & DIAGONAL_MASKS[sq]]
+        | ANTI_DIAGONAL_ATTACKS[sq][occupied & ANTI_DIAGONAL_MASKS[sq]]
+    )
+
+
+def queen_attacks(sq, occupied):
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+def pawn_attacks(color, sq):
+    return PAWN_ATTACKS[color][sq]
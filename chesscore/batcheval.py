@@ -0,0 +1,219 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from .evaluate import (
+    DOUBLED_PAWN_PENALTY,
+    ISOLATED_PAWN_PENALTY,
+    MOBILITY_WEIGHTS,
+    PASSED_PAWN_BONUS,
+    PIECE_SQUARE_TABLES,
+)
+from .position import BISHOP, BLACK, KNIGHT, PAWN, QUEEN, ROOK, WHITE, Position
+
+# Batch evaluation with NumPy, giving exactly the scores of evaluate() for
+# many positions at once. A batch is an (N, 13) uint64 array: the twelve
+# piece bitboards in PIECE_SYMBOLS order, then the side to move. Every term
+# is worked out with whole-array bitboard operations:
+#   material and placement  a per-byte lookup of piece-square table sums
+#   mobility                per-direction fills, which never count a square
+#                           twice for one piece kind
+#   pawn structure          file counts and filled enemy pawn fronts
+# Datasets on disk are the same rows back to back, so np.memmap can feed
+# files larger than memory through evaluate_file in chunks.
+
+COLUMNS = 13
+SIDE_TO_MOVE = 12
+CHUNK_ROWS = 1 << 16
+
+_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+_NOT_FILE_A = np.uint64(0xFEFEFEFEFEFEFEFE)
+_NOT_FILE_H = np.uint64(0x7F7F7F7F7F7F7F7F)
+_NOT_FILES_AB = np.uint64(0xFCFCFCFCFCFCFCFC)
+_NOT_FILES_GH = np.uint64(0x3F3F3F3F3F3F3F3F)
+_FILES = [np.uint64(0x0101010101010101 << col) for col in range(8)]
+_RANKS = [np.uint64(0xFF << (8 * row)) for row in range(8)]
+
+# (shift, mask) per step; a positive shift moves towards higher squares and
+# the mask drops bits that wrapped around a board edge
+_ROOK_STEPS = ((8, _ONES), (-8, _ONES), (1, _NOT_FILE_A), (-1, _NOT_FILE_H))
+_BISHOP_STEPS = ((9, _NOT_FILE_A), (7, _NOT_FILE_H), (-7, _NOT_FILE_A), (-9, _NOT_FILE_H))
+_KNIGHT_STEPS = (
+    (17, _NOT_FILE_A),
+    (15, _NOT_FILE_H),
+    (10, _NOT_FILES_AB),
+    (6, _NOT_FILES_GH),
+    (-6, _NOT_FILES_AB),
+    (-10, _NOT_FILES_GH),
+    (-15, _NOT_FILE_A),
+    (-17, _NOT_FILE_H),
+)
+
+
+def _byte_tables():
+    # _BYTE_TABLES[k][byte] sums the piece-square entries of the bits set in
+    # byte k of the twelve little-endian bitboards
+    tables = np.zeros((96, 256), dtype=np.int64)
+    for k in range(96):
+        table = PIECE_SQUARE_TABLES[k // 8]
+        for byte in range(1, 256):
+            low = byte & -byte
+            tables[k, byte] = tables[k, byte ^ low] + table[(k % 8) * 8 + low.bit_length() - 1]
+    return tables
+
+
+_BYTE_TABLES = _byte_tables()
+_BYTE_INDEX = np.arange(96)
+
+
+def _shift(bitboards, amount, mask):
+    if amount > 0:
+        return (bitboards << np.uint64(amount)) & mask
+    return (bitboards >> np.uint64(-amount)) & mask
+
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(bitboards):
+        return np.bitwise_count(bitboards).astype(np.int64)
+else:
+    _BYTE_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+    def _popcount(bitboards):
+        return _BYTE_COUNTS[np.ascontiguousarray(bitboards).view(np.uint8)].reshape(bitboards.shape + (8,)).sum(-1)
+
+
+def _slider_mobility(sliders, empty, free, steps):
+    # Occluded fill in each direction, then one more step onto the blocker.
+    # Rays of two pieces of one kind in one direction only meet on the
+    # nearer piece itself, which free excludes, so counting the union is
+    # the same as counting piece by piece.
+    total = 0
+    for amount, mask in steps:
+        fill = sliders
+        flood = sliders
+        step_empty = empty & mask
+        for _ in range(6):
+            flood = _shift(flood, amount, step_empty)
+            fill = fill | flood
+        total = total + _popcount(_shift(fill, amount, mask) & free)
+    return total
+
+
+def _mobility(boards, occupied, own, color):
+    base = color * 6
+    empty = ~occupied
+    free = ~own
+    knights = boards[:, base + KNIGHT]
+    score = 0
+    for amount, mask in _KNIGHT_STEPS:
+        score = score + MOBILITY_WEIGHTS[KNIGHT] * _popcount(_shift(knights, amount, mask) & free)
+    queens = boards[:, base + QUEEN]
+    score = score + MOBILITY_WEIGHTS[BISHOP] * _slider_mobility(boards[:, base + BISHOP], empty, free, _BISHOP_STEPS)
+    score = score + MOBILITY_WEIGHTS[ROOK] * _slider_mobility(boards[:, base + ROOK], empty, free, _ROOK_STEPS)
+    score = score + MOBILITY_WEIGHTS[QUEEN] * _slider_mobility(queens, empty, free, _ROOK_STEPS + _BISHOP_STEPS)
+    return score
+
+
+def _pawn_structure(pawns, enemy_pawns, color):
+    score = 0
+    for col in range(8):
+        count = _popcount(pawns & _FILES[col])
+        neighbours = (_FILES[col - 1] if col > 0 else np.uint64(0)) | (_FILES[col + 1] if col < 7 else np.uint64(0))
+        score = score - DOUBLED_PAWN_PENALTY * np.maximum(count - 1, 0)
+        score = score - ISOLATED_PAWN_PENALTY * np.where((pawns & neighbours) == 0, count, 0)
+
+    # Squares an enemy pawn stops: its own and both neighbouring files, every
+    # row behind it from the point of view of our pawns
+    front = enemy_pawns | ((enemy_pawns << np.uint64(1)) & _NOT_FILE_A) | ((enemy_pawns >> np.uint64(1)) & _NOT_FILE_H)
+    step = -8 if color == WHITE else 8
+    blocked = _shift(front, step, _ONES)
+    for _ in range(3):
+        blocked = blocked | _shift(blocked, step, _ONES)
+        step *= 2
+    passed = pawns & ~blocked
+
+    for row in range(8):
+        advanced = row if color == WHITE else 7 - row
+        if PASSED_PAWN_BONUS[advanced]:
+            score = score + PASSED_PAWN_BONUS[advanced] * _popcount(passed & _RANKS[row])
+    return score
+
+
+def evaluate_white_batch(boards):
+    # boards: (N, 12) or (N, 13) uint64; scores from white's point of view
+    boards = np.asarray(boards, dtype=np.uint64)
+    pieces = np.ascontiguousarray(boards[:, :12], dtype="<u8")
+    score = _BYTE_TABLES[_BYTE_INDEX, pieces.view(np.uint8)].sum(axis=1)
+
+    white = np.bitwise_or.reduce(pieces[:, :6], axis=1)
+    black = np.bitwise_or.reduce(pieces[:, 6:], axis=1)
+    occupied = white | black
+    score += _mobility(pieces, occupied, white, WHITE)
+    score -= _mobility(pieces, occupied, black, BLACK)
+    score += _pawn_structure(pieces[:, PAWN], pieces[:, 6 + PAWN], WHITE)
+    score -= _pawn_structure(pieces[:, 6 + PAWN], pieces[:, PAWN], BLACK)
+    return score
+
+
+def evaluate_batch(boards):
+    # (N, 13) rows; scores from the side to move's point of view, as
+    # evaluate() gives them
+    boards = np.asarray(boards, dtype=np.uint64)
+    score = evaluate_white_batch(boards)
+    return np.where(boards[:, SIDE_TO_MOVE] == WHITE, score, -score)
+
+
+def pack_positions(positions):
+    boards = np.empty((len(positions), COLUMNS), dtype=np.uint64)
+    for row, position in enumerate(positions):
+        boards[row, :12] = position.pieces
+        boards[row, SIDE_TO_MOVE] = position.side_to_move
+    return boards
+
+
+def write_dataset(path, positions):
+    pack_positions(positions).tofile(path)
+
+
+def open_dataset(path):
+    # Read-only memory map of a dataset file, shaped (N, 13)
+    return np.memmap(path, dtype=np.uint64, mode="r").reshape(-1, COLUMNS)
+
+
+def evaluate_file(path, out=None, chunk_rows=CHUNK_ROWS):
+    # Scores a dataset chunk by chunk, so only one chunk is ever in memory.
+    # out may be any writable (N,) int array, e.g. another memmap.
+    boards = open_dataset(path)
+    if out is None:
+        out = np.empty(len(boards), dtype=np.int64)
+    for start in range(0, len(boards), chunk_rows):
+        out[start:start + chunk_rows] = evaluate_batch(boards[start:start + chunk_rows])
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore batcheval", description="Score a dataset of positions.")
+    parser.add_argument("path", help="dataset of (N, 13) uint64 rows")
+    parser.add_argument("--pack", metavar="FEN_FILE", help="first write the dataset from one FEN per line")
+    parser.add_argument("--out", help="save the scores as a .npy file")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    if args.pack:
+        with open(args.pack) as file:
+            write_dataset(args.path, [Position.from_fen(line) for line in file if line.strip()])
+
+    start = time.perf_counter()
+    scores = evaluate_file(args.path, chunk_rows=args.chunk_rows)
+    seconds = time.perf_counter() - start
+    if args.out:
+        np.save(args.out, scores)
+    rate = int(len(scores) / seconds) if seconds > 0 else 0
+    print(f"{len(scores)} positions in {seconds:.3f}s ({rate} positions/s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
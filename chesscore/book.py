@@ -0,0 +1,185 @@
+import argparse
+import mmap
+import random
+import struct
+import sys
+from collections import Counter
+
+from .movegen import generate_legal_moves
+from .pgn import read_games, start_position
+from .position import CASTLE, KING, STARTING_FEN, Position, move_to_uci
+
+# Polyglot opening books: 16-byte big-endian records (key, move, weight,
+# learn) sorted by key, where key is the Polyglot Zobrist hash that
+# Position.key already is. The file is memory-mapped and searched in place,
+# so opening a book costs the same however large it is.
+
+ENTRY = struct.Struct(">QHHI")
+ENTRY_SIZE = ENTRY.size
+MAX_WEIGHT = 0xFFFF
+
+# Result points for the side that played the move, as Polyglot's own book
+# builder counts them
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)}
+
+# Polyglot writes castling as the king taking its own rook
+_CASTLING_ROOKS = {(4, 6): 7, (4, 2): 0, (60, 62): 63, (60, 58): 56}
+_CASTLING_KINGS = {(from_sq, rook): to_sq for (from_sq, to_sq), rook in _CASTLING_ROOKS.items()}
+
+
+def encode_book_move(move):
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    if (move >> 15) == CASTLE:
+        to_sq = _CASTLING_ROOKS[(from_sq, to_sq)]
+    return to_sq | (from_sq << 6) | (((move >> 12) & 7) << 12)
+
+
+def decode_book_move(position, raw):
+    # The legal move a book entry stands for, or None
+    from_sq = (raw >> 6) & 63
+    to_sq = raw & 63
+    promotion = (raw >> 12) & 7
+    if position.piece_at(from_sq) == position.side_to_move * 6 + KING:
+        to_sq = _CASTLING_KINGS.get((from_sq, to_sq), to_sq)
+    for move in generate_legal_moves(position):
+        if move & 63 == from_sq and (move >> 6) & 63 == to_sq and (move >> 12) & 7 == promotion:
+            return move
+    return None
+
+
+class OpeningBook:
+    def __init__(self, path, rng=None):
+        self.path = path
+        self.rng = rng or random.Random()
+        self.file = open(path, "rb")
+        self.size = 0
+        self.data = None
+        length = self.file.seek(0, 2)
+        if length:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = length // ENTRY_SIZE
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def _key_at(self, index):
+        return struct.unpack_from(">Q", self.data, index * ENTRY_SIZE)[0]
+
+    def raw_entries(self, key):
+        # (raw move, weight) of every record for key, found by binary search
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            entry_key, raw, weight, _ = ENTRY.unpack_from(self.data, low * ENTRY_SIZE)
+            if entry_key != key:
+                break
+            entries.append((raw, weight))
+            low += 1
+        return entries
+
+    def entries(self, position):
+        # (move, weight) pairs that are legal in position
+        entries = []
+        for raw, weight in self.raw_entries(position.key):
+            move = decode_book_move(position, raw)
+            if move is not None:
+                entries.append((move, weight))
+        return entries
+
+    def choose(self, position):
+        # A book move picked with probability proportional to its weight
+        entries = [(move, weight) for move, weight in self.entries(position) if weight]
+        if not entries:
+            return None
+        pick = self.rng.randrange(sum(weight for _, weight in entries))
+        for move, weight in entries:
+            pick -= weight
+            if pick < 0:
+                return move
+        return entries[-1][0]
+
+
+def collect_book_moves(games, max_plies=20):
+    # Counter of (key, raw move) -> points over the opening of each game
+    points = Counter()
+    for game in games:
+        if game.error:
+            continue
+        scores = RESULT_POINTS.get(game.result, (1, 1))
+        position = start_position(game.headers)
+        for move in game.moves[:max_plies]:
+            points[position.key, encode_book_move(move)] += scores[position.side_to_move]
+            position.make_move(move)
+    return points
+
+
+def write_book(path, points):
+    # Weights are scaled down together if any would overflow 16 bits, and
+    # moves that never scored are left out as Polyglot does
+    top = max(points.values(), default=0)
+    scale = MAX_WEIGHT / top if top > MAX_WEIGHT else 1
+    count = 0
+    with open(path, "wb") as file:
+        for (key, raw), score in sorted(points.items()):
+            weight = int(score * scale)
+            if weight:
+                file.write(ENTRY.pack(key, raw, weight, 0))
+                count += 1
+    return count
+
+
+def build_book(pgn_path, book_path, max_plies=20, processes=1):
+    points = collect_book_moves(read_games(pgn_path, processes, ordered=False), max_plies)
+    return write_book(book_path, points)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore book", description="Build or query a Polyglot opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from a PGN file")
+    build.add_argument("pgn")
+    build.add_argument("book")
+    build.add_argument("--plies", type=int, default=20, help="opening plies taken from each game")
+    build.add_argument("--processes", "-j", type=int, default=1, help="PGN worker processes, 0 for one per core")
+    probe = commands.add_parser("probe", help="list the book moves for a position")
+    probe.add_argument("book")
+    probe.add_argument("--fen", default=STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        count = build_book(args.pgn, args.book, args.plies, args.processes)
+        print(f"{count} entries written to {args.book}")
+        return 0
+
+    position = Position.from_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        entries = book.entries(position)
+    total = sum(weight for _, weight in entries) or 1
+    for move, weight in sorted(entries, key=lambda entry: -entry[1]):
+        print(f"{move_to_uci(move)} weight {weight} ({100 * weight / total:.1f}%)")
+    if not entries:
+        print("no book moves")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
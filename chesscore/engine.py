@@ -0,0 +1,50 @@
+import threading
+
+from .search import Searcher
+
+# Thinking off a front end's event loop. A search runs on a daemon thread
+# and hands its progress and result to callbacks, which a front end turns
+# into events for its own queue. Searcher.stop() is checked at every node,
+# so cancel() returns within a node or two of being called.
+
+
+class EngineWorker:
+    def __init__(self, searcher=None):
+        self.searcher = searcher if searcher is not None else Searcher()
+        self.thread = None
+        # Set by cancel(), so a stopped search reports nothing more
+        self.cancelled = False
+
+    def busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, position, limits, key_history=(), on_info=None, on_done=None):
+        # on_info(result) after every iteration and on_done(key, result) at
+        # the end, both called on the worker thread; key is the position
+        # key searched, so a late result can be told from a current one
+        self.cancel()
+        self.cancelled = False
+        self.thread = threading.Thread(
+            target=self.run,
+            args=(position.copy(), limits, list(key_history), on_info, on_done),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def run(self, position, limits, key_history, on_info, on_done):
+        def info(result):
+            if not self.cancelled and on_info is not None:
+                on_info(result)
+
+        result = self.searcher.search(position, limits, key_history, info=info)
+        if not self.cancelled and on_done is not None:
+            on_done(position.key, result)
+
+    def cancel(self):
+        # Stops any search and waits for the thread; stop() is repeated in
+        # case the thread had not started searching yet
+        self.cancelled = True
+        while self.busy():
+            self.searcher.stop()
+            self.thread.join(0.01)
+        self.thread = None
@@ -0,0 +1,208 @@
+from .attacks import KNIGHT_ATTACKS, bishop_attacks, rook_attacks
+from .position import BISHOP, BLACK, KNIGHT, PAWN, QUEEN, ROOK, WHITE, iter_squares
+
+# Static evaluation in centipawns: material, piece-square tables, mobility
+# and pawn structure. Terms are computed for white and mirrored for black.
+
+PIECE_VALUES = (100, 320, 330, 500, 900, 0)
+
+# Piece-square tables from white's point of view, written rank 8 first so
+# they read like a board; PIECE_SQUARE_TABLES below re-indexes them by square
+_PAWN_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+_KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+_BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+_ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+_QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+_KING_TABLE = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+
+# PIECE_SQUARE_TABLES[piece][sq] includes the material value and is signed
+# from white's point of view, so black entries are negated and mirrored
+PIECE_SQUARE_TABLES = []
+for _color in (WHITE, BLACK):
+    for _kind, _table in enumerate((_PAWN_TABLE, _KNIGHT_TABLE, _BISHOP_TABLE, _ROOK_TABLE, _QUEEN_TABLE, _KING_TABLE)):
+        _entries = []
+        for _sq in range(64):
+            _row = _sq >> 3 if _color == WHITE else 7 - (_sq >> 3)
+            _value = PIECE_VALUES[_kind] + _table[(7 - _row) * 8 + (_sq & 7)]
+            _entries.append(_value if _color == WHITE else -_value)
+        PIECE_SQUARE_TABLES.append(_entries)
+
+# Centipawns per square a piece attacks that is not held by its own side
+MOBILITY_WEIGHTS = (0, 4, 5, 2, 1, 0)
+
+DOUBLED_PAWN_PENALTY = 15
+ISOLATED_PAWN_PENALTY = 12
+# Passed pawn bonus by how many rows the pawn has advanced
+PASSED_PAWN_BONUS = (0, 5, 10, 20, 35, 60, 100, 0)
+
+FILE_MASKS = [0x0101010101010101 << col for col in range(8)]
+ADJACENT_FILE_MASKS = [
+    (FILE_MASKS[col - 1] if col > 0 else 0) | (FILE_MASKS[col + 1] if col < 7 else 0) for col in range(8)
+]
+
+
+def _passed_masks(color):
+    # Squares ahead of a pawn, on its file and both neighbours, that must be
+    # free of enemy pawns for it to be passed
+    masks = []
+    for sq in range(64):
+        row, col = sq >> 3, sq & 7
+        rows = range(row + 1, 8) if color == WHITE else range(0, row)
+        ahead = 0
+        for r in rows:
+            ahead |= 0xFF << (8 * r)
+        masks.append(ahead & (FILE_MASKS[col] | ADJACENT_FILE_MASKS[col]))
+    return masks
+
+
+PASSED_PAWN_MASKS = (_passed_masks(WHITE), _passed_masks(BLACK))
+
+
+def pawn_structure(pieces, color):
+    pawns = pieces[color * 6 + PAWN]
+    enemy_pawns = pieces[(color ^ 1) * 6 + PAWN]
+    score = 0
+    for col in range(8):
+        count = bin(pawns & FILE_MASKS[col]).count("1")
+        if count > 1:
+            score -= DOUBLED_PAWN_PENALTY * (count - 1)
+        if count and not pawns & ADJACENT_FILE_MASKS[col]:
+            score -= ISOLATED_PAWN_PENALTY * count
+
+    passed = PASSED_PAWN_MASKS[color]
+    for sq in iter_squares(pawns):
+        if not enemy_pawns & passed[sq]:
+            advanced = sq >> 3 if color == WHITE else 7 - (sq >> 3)
+            score += PASSED_PAWN_BONUS[advanced]
+    return score
+
+
+# Pawn structure changes far less often than anything else, so its score is
+# cached by the pair of pawn bitboards
+PAWN_CACHE_SIZE = 1 << 16
+_pawn_cache = {}
+
+
+def cached_pawn_structure(pieces):
+    key = (pieces[PAWN], pieces[6 + PAWN])
+    score = _pawn_cache.get(key)
+    if score is None:
+        if len(_pawn_cache) >= PAWN_CACHE_SIZE:
+            _pawn_cache.clear()
+        score = pawn_structure(pieces, WHITE) - pawn_structure(pieces, BLACK)
+        _pawn_cache[key] = score
+    return score
+
+
+def mobility(pieces, occupied, own, color):
+    base = color * 6
+    free = ~own
+    score = 0
+    knights = pieces[base + KNIGHT]
+    while knights:
+        lsb = knights & -knights
+        score += MOBILITY_WEIGHTS[KNIGHT] * bin(KNIGHT_ATTACKS[lsb.bit_length() - 1] & free).count("1")
+        knights ^= lsb
+    bishops = pieces[base + BISHOP]
+    while bishops:
+        lsb = bishops & -bishops
+        score += MOBILITY_WEIGHTS[BISHOP] * bin(bishop_attacks(lsb.bit_length() - 1, occupied) & free).count("1")
+        bishops ^= lsb
+    rooks = pieces[base + ROOK]
+    while rooks:
+        lsb = rooks & -rooks
+        score += MOBILITY_WEIGHTS[ROOK] * bin(rook_attacks(lsb.bit_length() - 1, occupied) & free).count("1")
+        rooks ^= lsb
+    queens = pieces[base + QUEEN]
+    while queens:
+        lsb = queens & -queens
+        sq = lsb.bit_length() - 1
+        attacks = rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+        score += MOBILITY_WEIGHTS[QUEEN] * bin(attacks & free).count("1")
+        queens ^= lsb
+    return score
+
+
+def material_and_placement(pieces):
+    score = 0
+    for piece in range(12):
+        bitboard = pieces[piece]
+        table = PIECE_SQUARE_TABLES[piece]
+        while bitboard:
+            lsb = bitboard & -bitboard
+            score += table[lsb.bit_length() - 1]
+            bitboard ^= lsb
+    return score
+
+
+def evaluate_white(position):
+    # Score from white's point of view
+    pieces = position.pieces
+    white, black = position.occupied
+    occupied = white | black
+    return (
+        material_and_placement(pieces)
+        + mobility(pieces, occupied, white, WHITE)
+        - mobility(pieces, occupied, black, BLACK)
+        + cached_pawn_structure(pieces)
+    )
+
+
+def evaluate(position):
+    # Score from the side to move's point of view, as negamax wants it
+    score = evaluate_white(position)
+    return score if position.side_to_move == WHITE else -score
@@ -0,0 +1,269 @@
+import argparse
+import sqlite3
+import sys
+import time
+
+from .movegen import is_checkmate, is_stalemate, parse_uci_move
+from .pgn import PGNGame, read_games, start_position
+from .position import STARTING_FEN, WHITE, Position, move_to_uci
+from .savegame import read_journal
+
+# Position index: for every position reached in the archived games, the
+# moves played from it and how those games ended, so the board can show
+# what was played from here without scanning any archive. It is one SQLite
+# table keyed by (Zobrist key, move) and stored WITHOUT ROWID, so a lookup
+# is a single B-tree range read however many positions there are, and
+# SQLite's page cache keeps memory bounded. A second table posts every
+# game id under each position it reached, so the games behind a position
+# are one range read too. Games are ingested in large batches, each written
+# in one transaction with its rows sorted by key. A source already in the
+# index is skipped rather than counted twice.
+
+# (key, move) rows and position postings gathered in memory before they
+# are written out
+BATCH_ROWS = 1 << 19
+# SQLite page cache in KiB while building, and for lookups
+BUILD_CACHE_KB = 256 * 1024
+LOOKUP_CACHE_KB = 16 * 1024
+
+# Column of moves a result is counted in
+RESULT_COLUMNS = {"1-0": 0, "1/2-1/2": 1, "0-1": 2}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    white TEXT,
+    black TEXT,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS moves (
+    key INTEGER NOT NULL,
+    move INTEGER NOT NULL,
+    games INTEGER NOT NULL,
+    white INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    black INTEGER NOT NULL,
+    first_game INTEGER NOT NULL,
+    PRIMARY KEY (key, move)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS positions (
+    key INTEGER NOT NULL,
+    game INTEGER NOT NULL,
+    PRIMARY KEY (key, game)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS games_source ON games (source);
+"""
+
+# move is 0 on the row counting games that ended in the position
+UPSERT_MOVE = """
+INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key, move) DO UPDATE SET
+    games = games + excluded.games,
+    white = white + excluded.white,
+    draws = draws + excluded.draws,
+    black = black + excluded.black
+"""
+
+
+def _signed(key):
+    # SQLite integers are signed 64-bit
+    return key - (1 << 64) if key >> 63 else key
+
+
+class PositionIndex:
+    def __init__(self, path, readonly=False):
+        self.path = path
+        if readonly:
+            self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            self.connection.execute(f"PRAGMA cache_size = -{LOOKUP_CACHE_KB}")
+        else:
+            self.connection = sqlite3.connect(path)
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.execute(f"PRAGMA cache_size = -{BUILD_CACHE_KB}")
+            self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_games(self, games, source, batch_rows=BATCH_ROWS):
+        # Adds PGNGames, skipping those with errors; returns (games, rows
+        # written). A position repeated within a game counts that game once.
+        next_id = self.connection.execute("SELECT coalesce(max(id), 0) + 1 FROM games").fetchone()[0]
+        added = written = 0
+        rows = {}
+        game_rows = []
+        postings = []
+        for game in games:
+            if game.error:
+                continue
+            column = RESULT_COLUMNS.get(game.result)
+            position = start_position(game.headers)
+            seen = set()
+            keys = set()
+            for move in game.moves + [0]:
+                if position.key not in keys:
+                    keys.add(position.key)
+                    postings.append((position.key, next_id))
+                entry = (position.key, move)
+                if entry not in seen:
+                    seen.add(entry)
+                    row = rows.get(entry)
+                    if row is None:
+                        row = rows[entry] = [0, 0, 0, 0, next_id]
+                    row[0] += 1
+                    if column is not None:
+                        row[1 + column] += 1
+                if move:
+                    position.make_move(move)
+            game_rows.append(
+                (next_id, source, game.index + 1, game.headers.get("White"), game.headers.get("Black"), game.result)
+            )
+            next_id += 1
+            added += 1
+            if len(rows) + len(postings) >= batch_rows:
+                written += self.write_batch(rows, game_rows, postings)
+                rows = {}
+                game_rows = []
+                postings = []
+        written += self.write_batch(rows, game_rows, postings)
+        return added, written
+
+    def write_batch(self, rows, game_rows, postings):
+        # One transaction per batch, rows in key order so the inserts walk
+        # the B-tree instead of jumping around it
+        with self.connection:
+            self.connection.executemany("INSERT INTO games VALUES (?, ?, ?, ?, ?, ?)", game_rows)
+            self.connection.executemany(
+                UPSERT_MOVE, ((_signed(key), move, *row) for (key, move), row in sorted(rows.items()))
+            )
+            self.connection.executemany(
+                "INSERT INTO positions VALUES (?, ?)", ((_signed(key), game) for key, game in sorted(postings))
+            )
+        return len(rows)
+
+    def has_source(self, source):
+        return self.connection.execute("SELECT 1 FROM games WHERE source = ? LIMIT 1", (source,)).fetchone() is not None
+
+    def lookup(self, position):
+        # (move, games, white wins, draws, black wins, first game id) for
+        # every move played from position, most played first
+        return self.connection.execute(
+            "SELECT move, games, white, draws, black, first_game FROM moves WHERE key = ? ORDER BY games DESC",
+            (_signed(position.key),),
+        ).fetchall()
+
+    def games_reaching(self, position, limit=-1):
+        # Ids of the games that reached position, oldest first
+        return [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT game FROM positions WHERE key = ? ORDER BY game LIMIT ?", (_signed(position.key), limit)
+            )
+        ]
+
+    def game(self, game_id):
+        # (source, number, white, black, result), or None
+        return self.connection.execute(
+            "SELECT source, number, white, black, result FROM games WHERE id = ?", (game_id,)
+        ).fetchone()
+
+
+def totals(rows):
+    # (games, white wins, draws, black wins) over lookup rows
+    return tuple(sum(row[i] for row in rows) for i in range(1, 5))
+
+
+def journal_game(path):
+    # A save journal as a PGNGame, its result read off the final position
+    saved = read_journal(path)
+    if saved is None:
+        return None
+    position, moves = saved
+    headers = {"FEN": position.to_fen()}
+    for move in moves:
+        position.make_move(move)
+    result = "*"
+    if is_checkmate(position):
+        result = "0-1" if position.side_to_move == WHITE else "1-0"
+    elif is_stalemate(position):
+        result = "1/2-1/2"
+    return PGNGame(0, headers, moves, result, None)
+
+
+def build_index(index_path, sources, processes=1, out=None):
+    with PositionIndex(index_path) as index:
+        for source in sources:
+            if index.has_source(source):
+                if out is not None:
+                    print(f"{source}: already indexed, skipped", file=out)
+                continue
+            start = time.perf_counter()
+            if source.endswith(".pgn"):
+                games = read_games(source, processes, ordered=False)
+            else:
+                game = journal_game(source)
+                games = [game] if game is not None else []
+            added, written = index.add_games(games, source)
+            if out is not None:
+                seconds = time.perf_counter() - start
+                print(f"{source}: {added} games, {written} position moves in {seconds:.1f}s", file=out)
+
+
+def format_rows(rows, limit=None):
+    # Text lines for lookup rows: a total, then one line per move
+    games, white, draws, black = totals(rows)
+    if not games:
+        return ["no games reached this position"]
+    lines = [f"{games} games: white {100 * white / games:.0f}% draw {100 * draws / games:.0f}% black {100 * black / games:.0f}%"]
+    for move, count, white, draws, black, _ in rows[:limit]:
+        name = move_to_uci(move) if move else "end"
+        lines.append(f"{name:6} {count:>7}  +{white} ={draws} -{black}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore explorer", description="Build or query a position index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="add PGN archives and save journals to an index")
+    build.add_argument("index")
+    build.add_argument("sources", nargs="+", help=".pgn files or save journals")
+    build.add_argument("--processes", "-j", type=int, default=1, help="PGN worker processes, 0 for one per core")
+    query = commands.add_parser("query", help="show the moves played from a position")
+    query.add_argument("index")
+    query.add_argument("moves", nargs="*", help="UCI moves played from the position")
+    query.add_argument("--fen", default=STARTING_FEN)
+    query.add_argument("--games", type=int, default=1, help="games that reached the position to list")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_index(args.index, args.sources, args.processes, sys.stdout)
+        return 0
+
+    position = Position.from_fen(args.fen)
+    for uci in args.moves:
+        position.make_move(parse_uci_move(position, uci))
+    with PositionIndex(args.index, readonly=True) as index:
+        start = time.perf_counter()
+        rows = index.lookup(position)
+        seconds = time.perf_counter() - start
+        for line in format_rows(rows):
+            print(line)
+        games = index.games_reaching(position, args.games)
+        for game_id in games:
+            source, number, white, black, result = index.game(game_id)
+            print(f"reached in {source} game {number}: {white} - {black} {result}")
+    print(f"lookup took {seconds * 1000:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+from .movegen import find_move, generate_legal_moves, is_check, parse_uci_move
+from .position import COLOR_NAMES, PIECE_SYMBOLS, STARTING_FEN, BoardView, Position, square
+from .zobrist import repetition_count
+
+# Plies between the packed positions kept for seeking, so a seek never
+# plays more than this many moves
+CHECKPOINT_INTERVAL = 16
+
+
+class Game:
+    # The rules side of a game: position, key history and move entry points
+    # in the (row, col) coordinates the front ends use. Both front ends build
+    # on it, and it works on its own with no display.
+    def __init__(self, position=None):
+        self.position = position if position is not None else Position.starting()
+        # Objects handed out by board[row][col], one per piece index
+        self.pieces = [None] * len(PIECE_SYMBOLS)
+        self.key_history = [self.position.key]
+        # Moves played since the position was set, for saving and replay
+        self.start_position = self.position.copy()
+        self.moves = []
+        # Position.make_move's undo record for each move in moves
+        self.undos = []
+        # (move, undo, key) of undone moves, the next one to redo last
+        self.future = []
+        # Packed position every CHECKPOINT_INTERVAL plies along moves and
+        # then future, starting with the start position
+        self.checkpoints = [self.position.pack()]
+        # Optional Tablebase; status() then calls won and drawn endgames
+        self.tablebase = None
+        # Legal moves of the position with key legal_key, and the same
+        # moves as from square -> bitboard of targets, built on first use
+        self.legal = None
+        self.legal_key = None
+        self.targets = None
+
+    @property
+    def board(self):
+        return BoardView(self.position, self.pieces)
+
+    def reset(self, position=None):
+        self.position = position if position is not None else Position.starting()
+        self.key_history = [self.position.key]
+        self.start_position = self.position.copy()
+        self.moves = []
+        self.undos = []
+        self.future = []
+        self.checkpoints = [self.position.pack()]
+
+    def replay(self, position, moves):
+        self.reset(position)
+        for move in moves:
+            self.make_move(move)
+
+    def find_move(self, start, end):
+        return find_move(self.position, square(*start), square(*end), legal_moves=self.legal_moves())
+
+    def legal_moves(self):
+        # Generated once per position, so status() and the next move entry
+        # share one generation
+        if self.legal_key != self.position.key:
+            self.legal = generate_legal_moves(self.position)
+            self.legal_key = self.position.key
+            self.targets = None
+        return self.legal
+
+    def legal_targets(self, start):
+        # Bitboard of the squares the piece on start may move to
+        moves = self.legal_moves()
+        if self.targets is None:
+            targets = {}
+            for move in moves:
+                from_sq = move & 63
+                targets[from_sq] = targets.get(from_sq, 0) | 1 << ((move >> 6) & 63)
+            self.targets = targets
+        return self.targets.get(square(*start), 0)
+
+    def is_valid_move(self, start, end):
+        return self.find_move(start, end) is not None
+
+    def move_piece(self, start, end):
+        move = self.find_move(start, end)
+
+        if move is not None:
+            self.make_move(move)
+
+        return move
+
+    def make_move(self, move):
+        # Playing the next undone move keeps the rest for redo; any other
+        # move starts a new line from here
+        ply = len(self.moves)
+        if self.future and self.future[-1][0] == move:
+            self.future.pop()
+        elif self.future:
+            self.future.clear()
+            del self.checkpoints[ply // CHECKPOINT_INTERVAL + 1:]
+        self.undos.append(self.position.make_move(move))
+        self.key_history.append(self.position.key)
+        self.moves.append(move)
+        ply += 1
+        if ply % CHECKPOINT_INTERVAL == 0 and len(self.checkpoints) == ply // CHECKPOINT_INTERVAL:
+            self.checkpoints.append(self.position.pack())
+
+    def undo(self):
+        # Takes back the last move, or returns None at the start
+        if not self.moves:
+            return None
+        move = self.moves.pop()
+        undo = self.undos.pop()
+        self.future.append((move, undo, self.key_history.pop()))
+        self.position.unmake_move(move, undo)
+        return move
+
+    def redo(self):
+        # Plays the last undone move again, or returns None if there is none
+        if not self.future:
+            return None
+        move = self.future[-1][0]
+        self.make_move(move)
+        return move
+
+    def seek(self, ply):
+        # Moves to ply (0 is the start position) of the line made of moves
+        # and future. Short steps undo or redo; longer jumps move the
+        # records across in slices and rebuild the position from the
+        # nearest checkpoint, so any seek plays fewer than
+        # CHECKPOINT_INTERVAL moves.
+        ply = max(0, min(ply, len(self.moves) + len(self.future)))
+        # key_history may start with keys from before start_position
+        keys = len(self.key_history) - len(self.moves) + ply
+        if abs(ply - len(self.moves)) < CHECKPOINT_INTERVAL:
+            while len(self.moves) > ply:
+                self.undo()
+            while len(self.moves) < ply:
+                self.redo()
+            return
+        if ply < len(self.moves):
+            self.future.extend(zip(reversed(self.moves[ply:]), reversed(self.undos[ply:]), reversed(self.key_history[keys:])))
+            del self.moves[ply:], self.undos[ply:], self.key_history[keys:]
+        else:
+            count = ply - len(self.moves)
+            records = self.future[-count:][::-1]
+            del self.future[-count:]
+            self.moves.extend(record[0] for record in records)
+            self.undos.extend(record[1] for record in records)
+            self.key_history.extend(record[2] for record in records)
+        checkpoint = ply // CHECKPOINT_INTERVAL
+        position = Position.unpack(self.checkpoints[checkpoint])
+        for move in self.moves[checkpoint * CHECKPOINT_INTERVAL:ply]:
+            position.make_move(move)
+        self.position = position
+
+    def is_check(self, color):
+        return is_check(self.position, COLOR_NAMES.index(color))
+
+    def is_checkmate(self, color):
+        return self.position.side_to_move == COLOR_NAMES.index(color) and is_check(self.position) and not self.legal_moves()
+
+    def is_stalemate(self, color):
+        return self.position.side_to_move == COLOR_NAMES.index(color) and not is_check(self.position) and not self.legal_moves()
+
+    def is_threefold_repetition(self):
+        return repetition_count(self.key_history, self.position.halfmove_clock) >= 3
+
+    def status(self):
+        # Message for the position after the last move, or None
+        color = COLOR_NAMES[self.position.side_to_move]
+        if self.is_check(color):
+            if self.is_checkmate(color):
+                winner = COLOR_NAMES[self.position.side_to_move ^ 1]
+                return f"Checkmate! {winner.capitalize()} wins!"
+            return f"Check! {color.capitalize()} is in check."
+        if self.is_stalemate(color):
+            return "Stalemate!"
+        if self.is_threefold_repetition():
+            return "Draw by threefold repetition."
+        if self.tablebase is not None:
+            hit = self.tablebase.probe(self.position)
+            if hit is not None:
+                outcome, plies = hit
+                if not outcome:
+                    return "Drawn endgame."
+                winner = COLOR_NAMES[self.position.side_to_move ^ (outcome < 0)]
+                return f"{winner.capitalize()} mates in {(plies + 1) // 2}."
+        return None
+
+
+def validate_move(fen, uci):
+    # One-shot check of a UCI move string against a FEN position
+    try:
+        parse_uci_move(Position.from_fen(fen), uci)
+    except ValueError:
+        return False
+    return True
+
+
+def main(argv=None):
+    # argparse is only needed here; importing chesscore stays lean for
+    # short-lived validation workers
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="chesscore validate", description="Check moves against a position.")
+    parser.add_argument("moves", nargs="+", help="UCI moves, each checked against the same position")
+    parser.add_argument("--fen", default=STARTING_FEN)
+    args = parser.parse_args(argv)
+
+    illegal = 0
+    for uci in args.moves:
+        legal = validate_move(args.fen, uci)
+        illegal += not legal
+        print(f"{uci} {'legal' if legal else 'illegal'}")
+    return 1 if illegal else 0
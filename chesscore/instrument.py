@@ -0,0 +1,243 @@
+import csv
+import json
+import sys
+import time
+
+# Opt-in instrumentation. Nothing here runs until enable() is called, which
+# swaps the instrumented functions and methods for timing or counting
+# wrappers; disable() puts the originals back. While it is off the rules,
+# search and drawing code are exactly the functions they always were, with
+# no flag checks or extra calls.
+
+# Timings go into log-scale histograms with four buckets per power of two,
+# so memory stays fixed however long a session runs and percentiles are
+# good to within about 20%.
+_SUB_BUCKETS = 4
+
+
+def _bucket(ns):
+    if ns < _SUB_BUCKETS:
+        return ns
+    exponent = ns.bit_length() - 1
+    return exponent * _SUB_BUCKETS + ((ns >> (exponent - 2)) & 3)
+
+
+def _bucket_top(index):
+    # Largest value that falls in a bucket
+    if index < _SUB_BUCKETS:
+        return index
+    exponent, sub = divmod(index, _SUB_BUCKETS)
+    return ((_SUB_BUCKETS + sub + 1) << (exponent - 2)) - 1
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, ns):
+        index = _bucket(ns)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+
+    def percentile(self, fraction):
+        # Nanoseconds below which fraction of the samples fall
+        if not self.count:
+            return 0
+        rank = fraction * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_top(index), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total / 1e6, 3),
+            "mean_us": round(self.total / self.count / 1e3, 3) if self.count else 0.0,
+            "p50_us": round(self.percentile(0.5) / 1e3, 3),
+            "p90_us": round(self.percentile(0.9) / 1e3, 3),
+            "p99_us": round(self.percentile(0.99) / 1e3, 3),
+            "max_us": round(self.max / 1e3, 3),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.timings = {}
+        self.counters = {}
+
+    def reset(self):
+        self.timings.clear()
+        self.counters.clear()
+
+    def record(self, name, ns):
+        histogram = self.timings.get(name)
+        if histogram is None:
+            histogram = self.timings[name] = Histogram()
+        histogram.record(ns)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        return {
+            "timings": {name: histogram.summary() for name, histogram in sorted(self.timings.items())},
+            "counters": dict(sorted(self.counters.items())),
+        }
+
+    def summary_lines(self):
+        # Short text lines for an overlay or a terminal
+        lines = []
+        for name, summary in self.snapshot()["timings"].items():
+            lines.append(
+                f"{name}: {summary['count']}x p50 {summary['p50_us']:.0f}us "
+                f"p99 {summary['p99_us']:.0f}us max {summary['max_us']:.0f}us"
+            )
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"{name}: {value}")
+        return lines
+
+    def write(self, path):
+        # JSON, or CSV when the path ends in .csv
+        snapshot = self.snapshot()
+        if not path.endswith(".csv"):
+            with open(path, "w") as file:
+                json.dump(snapshot, file, indent=2)
+            return
+        columns = ("count", "total_ms", "mean_us", "p50_us", "p90_us", "p99_us", "max_us")
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(("name", "kind") + columns)
+            for name, summary in snapshot["timings"].items():
+                writer.writerow((name, "timing") + tuple(summary[column] for column in columns))
+            for name, value in snapshot["counters"].items():
+                writer.writerow((name, "counter", value) + ("",) * (len(columns) - 1))
+
+
+metrics = Metrics()
+
+# (owner, attribute, original) for everything enable() replaced
+_patches = []
+# (name, wrapper, original) for each module-level function enable() wrapped
+_functions = []
+
+
+def timed(name, function):
+    clock = time.perf_counter_ns
+    record = metrics.record
+
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, clock() - start)
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _generate_legal_moves(function):
+    def wrapper(*args, **kwargs):
+        moves = function(*args, **kwargs)
+        metrics.count("movegen.calls")
+        metrics.count("movegen.moves", len(moves))
+        return moves
+
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+def _search(function):
+    def wrapper(self, *args, **kwargs):
+        result = function(self, *args, **kwargs)
+        metrics.count("search.nodes", result.nodes)
+        return result
+
+    return timed("search", wrapper)
+
+
+def _replace(owner, attribute, wrapper):
+    # A class keeps its own __dict__ entry, or None when the method was
+    # inherited, so disable() never leaves a copy shadowing the base class
+    original = owner.__dict__.get(attribute) if isinstance(owner, type) else getattr(owner, attribute)
+    _patches.append((owner, attribute, original))
+    setattr(owner, attribute, wrapper)
+
+
+def _replace_function(module, name, wrapper):
+    # A module-level function is also replaced wherever a chesscore module
+    # imported it by name
+    original = getattr(module, name)
+    _functions.append((name, wrapper, original))
+    for loaded in _chesscore_modules():
+        if getattr(loaded, name, None) is original:
+            _replace(loaded, name, wrapper)
+
+
+def _chesscore_modules():
+    return [module for name, module in list(sys.modules.items()) if name.split(".")[0] == "chesscore"]
+
+
+def rule_targets():
+    # (owner, attribute, metric) for the rules side of a game
+    from .game import Game
+
+    return [
+        (Game, "is_check", "rules.is_check"),
+        (Game, "is_checkmate", "rules.is_checkmate"),
+        (Game, "is_stalemate", "rules.is_stalemate"),
+        (Game, "status", "rules.status"),
+        (Game, "find_move", "validation.find_move"),
+        (Game, "make_move", "rules.make_move"),
+        (Game, "undo", "history.undo"),
+        (Game, "redo", "history.redo"),
+        (Game, "seek", "history.seek"),
+    ]
+
+
+def enabled():
+    return bool(_patches)
+
+
+def enable(targets=()):
+    # Instruments the rules, move generation, validation and search, plus
+    # any extra (owner, attribute, metric) targets such as a front end's
+    # drawing methods
+    if _patches:
+        disable()
+    from . import movegen, search
+
+    _replace_function(movegen, "generate_legal_moves", _generate_legal_moves(movegen.generate_legal_moves))
+    _replace_function(movegen, "parse_uci_move", timed("validation.parse_uci_move", movegen.parse_uci_move))
+    _replace_function(movegen, "parse_san", timed("validation.parse_san", movegen.parse_san))
+    _replace(search.Searcher, "search", _search(search.Searcher.search))
+    for owner, attribute, name in rule_targets() + list(targets):
+        _replace(owner, attribute, timed(name, getattr(owner, attribute)))
+
+
+def disable():
+    while _patches:
+        owner, attribute, original = _patches.pop()
+        if original is None:
+            delattr(owner, attribute)
+        else:
+            setattr(owner, attribute, original)
+    # A module imported while enabled copied a wrapper by name from its
+    # source module, so enable() never saw that binding
+    while _functions:
+        name, wrapper, original = _functions.pop()
+        for loaded in _chesscore_modules():
+            if getattr(loaded, name, None) is wrapper:
+                setattr(loaded, name, original)
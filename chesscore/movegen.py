@@ -0,0 +1,415 @@
+from .attacks import (
+    BETWEEN,
+    BISHOP_RAYS,
+    KING_ATTACKS,
+    KNIGHT_ATTACKS,
+    LINE,
+    PAWN_ATTACKS,
+    ROOK_RAYS,
+    bishop_attacks,
+    rook_attacks,
+)
+from .position import (
+    BISHOP,
+    BLACK,
+    CASTLE,
+    EN_PASSANT,
+    KING,
+    KNIGHT,
+    PAWN,
+    QUEEN,
+    ROOK,
+    WHITE,
+    BLACK_KINGSIDE,
+    BLACK_QUEENSIDE,
+    WHITE_KINGSIDE,
+    WHITE_QUEENSIDE,
+    FILE_NAMES,
+    PIECE_SYMBOLS,
+    iter_squares,
+    parse_square,
+    square_name,
+)
+
+ALL_SQUARES = (1 << 64) - 1
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+PROMOTION_RANKS = RANK_1 | RANK_8
+PROMOTION_KINDS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# (right, king from, king to, squares that must be empty, squares the king crosses)
+CASTLING_RULES = (
+    (
+        (WHITE_KINGSIDE, 4, 6, 0x60, (5, 6)),
+        (WHITE_QUEENSIDE, 4, 2, 0x0E, (3, 2)),
+    ),
+    (
+        (BLACK_KINGSIDE, 60, 62, 0x60 << 56, (61, 62)),
+        (BLACK_QUEENSIDE, 60, 58, 0x0E << 56, (59, 58)),
+    ),
+)
+
+
+def attackers_to(position, sq, by_color, occupied):
+    pieces = position.pieces
+    base = by_color * 6
+    queens = pieces[base + QUEEN]
+    return (
+        (PAWN_ATTACKS[by_color ^ 1][sq] & pieces[base + PAWN])
+        | (KNIGHT_ATTACKS[sq] & pieces[base + KNIGHT])
+        | (KING_ATTACKS[sq] & pieces[base + KING])
+        | (rook_attacks(sq, occupied) & (pieces[base + ROOK] | queens))
+        | (bishop_attacks(sq, occupied) & (pieces[base + BISHOP] | queens))
+    )
+
+
+def king_square(position, color):
+    return position.king_squares[color]
+
+
+def checkers(position):
+    # Reverse lookup: anything that attacks the king square is giving check
+    us = position.side_to_move
+    sq = position.king_squares[us]
+    if sq is None:
+        return 0
+    return attackers_to(position, sq, us ^ 1, position.occupied[WHITE] | position.occupied[BLACK])
+
+
+def pinned_pieces(position, color, king_sq):
+    pieces = position.pieces
+    them = (color ^ 1) * 6
+    occupied = position.occupied[WHITE] | position.occupied[BLACK]
+    own = position.occupied[color]
+    queens = pieces[them + QUEEN]
+    snipers = (ROOK_RAYS[king_sq] & (pieces[them + ROOK] | queens)) | (
+        BISHOP_RAYS[king_sq] & (pieces[them + BISHOP] | queens)
+    )
+
+    pinned = 0
+    for sniper in iter_squares(snipers):
+        blockers = BETWEEN[king_sq][sniper] & occupied
+        if blockers and not blockers & (blockers - 1) and blockers & own:
+            pinned |= blockers
+    return pinned
+
+
+def _add_pawn_moves(moves, from_sq, targets):
+    for to_sq in iter_squares(targets):
+        if (1 << to_sq) & PROMOTION_RANKS:
+            for kind in PROMOTION_KINDS:
+                moves.append(from_sq | (to_sq << 6) | (kind << 12))
+        else:
+            moves.append(from_sq | (to_sq << 6))
+
+
+def _add_castling_moves(moves, position, us, king_sq, occupied):
+    rooks = position.pieces[us * 6 + ROOK]
+    for right, king_from, king_to, empty, crossed in CASTLING_RULES[us]:
+        if (
+            position.castling & right
+            and king_sq == king_from
+            and not occupied & empty
+            and rooks & (1 << (king_from + 3 if king_to > king_from else king_from - 4))
+            and not any(attackers_to(position, sq, us ^ 1, occupied) for sq in crossed)
+        ):
+            moves.append(king_from | (king_to << 6) | (CASTLE << 15))
+
+
+def generate_legal_moves(position, captures_only=False):
+    # captures_only keeps captures and promotions, for quiescence search
+    moves = []
+    us = position.side_to_move
+    them = us ^ 1
+    pieces = position.pieces
+    own = position.occupied[us]
+    enemy = position.occupied[them]
+    occupied = own | enemy
+    base = us * 6
+
+    king_sq = position.king_squares[us]
+    if king_sq is None:
+        return moves
+
+    # King steps: the destination may not be attacked once the king has left
+    # its square, otherwise it could retreat along a checking ray
+    without_king = occupied ^ (1 << king_sq)
+    for to_sq in iter_squares(KING_ATTACKS[king_sq] & (enemy if captures_only else ~own)):
+        if not attackers_to(position, to_sq, them, without_king):
+            moves.append(king_sq | (to_sq << 6))
+
+    checking = attackers_to(position, king_sq, them, occupied)
+    if checking & (checking - 1):
+        # Double check: only the king can move
+        return moves
+
+    if checking:
+        checker_sq = checking.bit_length() - 1
+        evasions = checking | BETWEEN[king_sq][checker_sq]
+    else:
+        evasions = ALL_SQUARES
+        if not captures_only:
+            _add_castling_moves(moves, position, us, king_sq, occupied)
+
+    pinned = pinned_pieces(position, us, king_sq)
+    targets = (enemy if captures_only else ~own) & evasions
+
+    for from_sq in iter_squares(pieces[base + KNIGHT] & ~pinned):
+        for to_sq in iter_squares(KNIGHT_ATTACKS[from_sq] & targets):
+            moves.append(from_sq | (to_sq << 6))
+
+    rooks = pieces[base + ROOK] | pieces[base + QUEEN]
+    for from_sq in iter_squares(rooks):
+        allowed = targets & LINE[king_sq][from_sq] if pinned & (1 << from_sq) else targets
+        for to_sq in iter_squares(rook_attacks(from_sq, occupied) & allowed):
+            moves.append(from_sq | (to_sq << 6))
+
+    bishops = pieces[base + BISHOP] | pieces[base + QUEEN]
+    for from_sq in iter_squares(bishops):
+        allowed = targets & LINE[king_sq][from_sq] if pinned & (1 << from_sq) else targets
+        for to_sq in iter_squares(bishop_attacks(from_sq, occupied) & allowed):
+            moves.append(from_sq | (to_sq << 6))
+
+    empty = ~occupied
+    forward = 8 if us == WHITE else -8
+    start_row = 1 if us == WHITE else 6
+    for from_sq in iter_squares(pieces[base + PAWN]):
+        allowed = evasions & LINE[king_sq][from_sq] if pinned & (1 << from_sq) else evasions
+        pawn_targets = PAWN_ATTACKS[us][from_sq] & enemy
+        one = from_sq + forward
+        if captures_only:
+            pawn_targets |= empty & (1 << one) & PROMOTION_RANKS
+        elif empty & (1 << one):
+            pawn_targets |= 1 << one
+            two = one + forward
+            if from_sq >> 3 == start_row and empty & (1 << two):
+                pawn_targets |= 1 << two
+        _add_pawn_moves(moves, from_sq, pawn_targets & allowed)
+
+    ep_square = position.ep_square
+    if ep_square is not None and pieces[them * 6 + PAWN] >> (ep_square - forward) & 1:
+        for from_sq in iter_squares(PAWN_ATTACKS[them][ep_square] & pieces[base + PAWN]):
+            move = from_sq | (ep_square << 6) | (EN_PASSANT << 15)
+            # Removing two pawns from one rank can expose the king, so en
+            # passant is checked by playing it
+            if is_legal_after(position, move):
+                moves.append(move)
+
+    return moves
+
+
+def is_legal_after(position, move):
+    us = position.side_to_move
+    undo = position.make_move(move)
+    king_sq = position.king_squares[us]
+    safe = not attackers_to(position, king_sq, us ^ 1, position.occupied[WHITE] | position.occupied[BLACK])
+    position.unmake_move(move, undo)
+    return safe
+
+
+def is_check(position, color=None):
+    if color is None:
+        color = position.side_to_move
+    sq = position.king_squares[color]
+    if sq is None:
+        return False
+    return bool(attackers_to(position, sq, color ^ 1, position.occupied[WHITE] | position.occupied[BLACK]))
+
+
+def is_checkmate(position):
+    return is_check(position) and not generate_legal_moves(position)
+
+
+def is_stalemate(position):
+    return not is_check(position) and not generate_legal_moves(position)
+
+
+def find_move(position, from_sq, to_sq, promotion=QUEEN, legal_moves=None):
+    found = None
+    for move in generate_legal_moves(position) if legal_moves is None else legal_moves:
+        if move & 63 == from_sq and (move >> 6) & 63 == to_sq:
+            kind = (move >> 12) & 7
+            if not kind or kind == promotion:
+                return move
+            found = move
+    return found
+
+
+_UCI_PROMOTIONS = {"": 0, "n": KNIGHT, "b": BISHOP, "r": ROOK, "q": QUEEN}
+
+
+def parse_uci_move(position, text, legal_moves=None):
+    # The text is turned into a move int once and compared against the legal
+    # moves, rather than formatting every legal move as text. legal_moves
+    # may be passed in when the caller already has them.
+    try:
+        target = parse_square(text[:2]) | (parse_square(text[2:4]) << 6) | (_UCI_PROMOTIONS[text[4:]] << 12)
+    except (IndexError, KeyError, TypeError, ValueError):
+        raise ValueError(f"Illegal move: {text!r}") from None
+    for move in generate_legal_moves(position) if legal_moves is None else legal_moves:
+        if move & 0x7FFF == target:
+            return move
+    raise ValueError(f"Illegal move: {text!r}")
+
+
+SAN_PIECES = {"N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+FILE_MASKS = [0x0101010101010101 << col for col in range(8)]
+RANK_MASKS = [0xFF << (8 * row) for row in range(8)]
+
+
+def parse_san(position, text):
+    # Resolves a SAN move by working back from the destination square to the
+    # pieces that could reach it, so only those few candidates get a
+    # legality check instead of generating every move
+    san = text.rstrip("+#!?")
+    us = position.side_to_move
+    base = us * 6
+    pieces = position.pieces
+    occupied = position.occupied[WHITE] | position.occupied[BLACK]
+
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        castles = []
+        king_sq = position.king_squares[us]
+        if king_sq is not None and not checkers(position):
+            _add_castling_moves(castles, position, us, king_sq, occupied)
+        for move in castles:
+            if ((move >> 6) & 63 > move & 63) == (len(san) == 3):
+                return move
+        raise ValueError(f"Illegal move: {text!r}")
+
+    # [piece] [from file] [from rank] [x] square [[=] promotion]
+    promotion = None
+    if len(san) > 2 and san[-1] in SAN_PIECES and san[-2] in "=18":
+        promotion = san[-1]
+        san = san[:-2] if san[-2] == "=" else san[:-1]
+    letter = None
+    if san[:1] in SAN_PIECES:
+        letter = san[0]
+        san = san[1:]
+    to_name = san[-2:]
+    origin = san[:-2]
+    if origin.endswith("x"):
+        origin = origin[:-1]
+    from_file = origin[0] if origin[:1] and origin[0] in FILE_NAMES else None
+    from_rank = origin[-1] if origin[-1:] and origin[-1] in "12345678" else None
+    if (
+        len(to_name) != 2
+        or to_name[0] not in FILE_NAMES
+        or to_name[1] not in "12345678"
+        or len(origin) != (from_file is not None) + (from_rank is not None)
+        or promotion == "K"
+    ):
+        raise ValueError(f"Invalid move: {text!r}")
+    to_sq = FILE_NAMES.index(to_name[0]) + 8 * (int(to_name[1]) - 1)
+    if position.occupied[us] & (1 << to_sq):
+        raise ValueError(f"Illegal move: {text!r}")
+
+    kind = SAN_PIECES[letter] if letter else PAWN
+    flags = 0
+    if kind == KNIGHT:
+        candidates = KNIGHT_ATTACKS[to_sq]
+    elif kind == BISHOP:
+        candidates = bishop_attacks(to_sq, occupied)
+    elif kind == ROOK:
+        candidates = rook_attacks(to_sq, occupied)
+    elif kind == QUEEN:
+        candidates = rook_attacks(to_sq, occupied) | bishop_attacks(to_sq, occupied)
+    elif kind == KING:
+        candidates = KING_ATTACKS[to_sq]
+    elif from_file is not None:
+        # Pawn capture, possibly en passant
+        candidates = PAWN_ATTACKS[us ^ 1][to_sq]
+        if to_sq == position.ep_square:
+            flags = EN_PASSANT
+        elif not position.occupied[us ^ 1] & (1 << to_sq):
+            raise ValueError(f"Illegal move: {text!r}")
+    else:
+        # Pawn push, one or two squares
+        if occupied & (1 << to_sq):
+            raise ValueError(f"Illegal move: {text!r}")
+        back = -8 if us == WHITE else 8
+        candidates = 1 << (to_sq + back) if 0 <= to_sq + back < 64 else 0
+        if not pieces[base + PAWN] & candidates and to_sq >> 3 == (3 if us == WHITE else 4):
+            if not occupied & candidates:
+                candidates = 1 << (to_sq + 2 * back)
+
+    candidates &= pieces[base + kind]
+    if from_file is not None:
+        candidates &= FILE_MASKS[FILE_NAMES.index(from_file)]
+    if from_rank is not None:
+        candidates &= RANK_MASKS[int(from_rank) - 1]
+
+    promotes = kind == PAWN and (1 << to_sq) & PROMOTION_RANKS
+    if bool(promotes) != bool(promotion):
+        raise ValueError(f"Illegal move: {text!r}")
+    promotion_kind = SAN_PIECES[promotion] if promotion else 0
+
+    # Apart from king moves and en passant, legality only depends on pins
+    # and on answering any check, both known without playing the move
+    king_sq = position.king_squares[us]
+    quick = kind != KING and flags != EN_PASSANT and king_sq is not None
+    if quick and candidates:
+        checking = checkers(position)
+        if not checking:
+            evasions = ALL_SQUARES
+        elif checking & (checking - 1):
+            evasions = 0
+        else:
+            evasions = checking | BETWEEN[king_sq][checking.bit_length() - 1]
+        pinned = pinned_pieces(position, us, king_sq)
+
+    found = None
+    for from_sq in iter_squares(candidates):
+        move = from_sq | (to_sq << 6) | (promotion_kind << 12) | (flags << 15)
+        if quick:
+            allowed = evasions & LINE[king_sq][from_sq] if pinned & (1 << from_sq) else evasions
+            legal = allowed & (1 << to_sq)
+        else:
+            legal = is_legal_after(position, move)
+        if legal:
+            if found is not None:
+                raise ValueError(f"Ambiguous move: {text!r}")
+            found = move
+    if found is None:
+        raise ValueError(f"Illegal move: {text!r}")
+    return found
+
+
+def move_to_san(position, move, legal_moves=None):
+    # SAN for a legal move, with just enough of the origin square to tell it
+    # from the other legal moves of the same piece to the same square
+    from_sq = move & 63
+    to_sq = (move >> 6) & 63
+    promotion = (move >> 12) & 7
+    flags = move >> 15
+    if flags == CASTLE:
+        san = "O-O" if to_sq > from_sq else "O-O-O"
+    else:
+        piece = position.piece_at(from_sq)
+        capture = flags == EN_PASSANT or position.piece_at(to_sq) is not None
+        if piece % 6 == PAWN:
+            san = (FILE_NAMES[from_sq & 7] + "x" if capture else "") + square_name(to_sq)
+            if promotion:
+                san += "=" + PIECE_SYMBOLS[promotion]
+        else:
+            if legal_moves is None:
+                legal_moves = generate_legal_moves(position)
+            rivals = {
+                other & 63
+                for other in legal_moves
+                if (other >> 6) & 63 == to_sq and other & 63 != from_sq and position.piece_at(other & 63) == piece
+            }
+            origin = ""
+            if rivals:
+                if all(sq & 7 != from_sq & 7 for sq in rivals):
+                    origin = FILE_NAMES[from_sq & 7]
+                elif all(sq >> 3 != from_sq >> 3 for sq in rivals):
+                    origin = str((from_sq >> 3) + 1)
+                else:
+                    origin = square_name(from_sq)
+            san = PIECE_SYMBOLS[piece % 6] + origin + ("x" if capture else "") + square_name(to_sq)
+    undo = position.make_move(move)
+    if is_check(position):
+        san += "#" if not generate_legal_moves(position) else "+"
+    position.unmake_move(move, undo)
+    return san
@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .position import Position
+from .search import SearchLimits, Searcher
+from .tt import BUCKET_SLOTS, SLOT_BYTES, TranspositionTable
+
+# Lazy SMP: helper processes search the same position as the main searcher
+# and share one transposition table in shared memory, so whatever one of
+# them finds is picked up by the others through TT cutoffs and move ordering.
+
+_helper = None
+
+
+def _shared_slots(raw):
+    return memoryview(raw).cast("B").cast("Q")
+
+
+def _init_helper(raw, stop_event):
+    global _helper
+    _helper = Searcher(TranspositionTable(slots=_shared_slots(raw)))
+    _helper.stop_event = stop_event
+
+
+def _helper_search(fen, key_history, limits, start_depth, generation):
+    result = _helper.search(
+        Position.from_fen(fen),
+        limits,
+        key_history,
+        start_depth=start_depth,
+        generation=generation,
+    )
+    return result.move, result.score, result.depth, result.nodes, result.pv
+
+
+class ParallelSearcher:
+    # workers counts the main searcher too, so workers=1 is a plain search
+    def __init__(self, workers=None, tt_size_mb=64, book=None, tablebase=None):
+        self.workers = workers or os.cpu_count() or 1
+        words = max(1, (tt_size_mb << 20) // (SLOT_BYTES * BUCKET_SLOTS)) * BUCKET_SLOTS * 2
+        # Helpers are spawned rather than forked: a fork taken while another
+        # thread holds a lock (the UCI loop blocked reading stdin) can leave
+        # the helper stuck on that lock for good
+        context = multiprocessing.get_context("spawn")
+        self.raw = context.RawArray("Q", words)
+        self.stop_event = context.Event()
+        self.tt = TranspositionTable(slots=_shared_slots(self.raw))
+        self.searcher = Searcher(self.tt, book=book, tablebase=tablebase)
+        self.searcher.stop_event = self.stop_event
+        self.pool = None
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers - 1,
+                initializer=_init_helper,
+                initargs=(self.raw, self.stop_event),
+                mp_context=context,
+            )
+
+    def stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        self.stop_event.set()
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def search(self, position, limits=SearchLimits(), key_history=(), info=None):
+        start = time.perf_counter()
+        # Book and tablebase moves are answered before any helper is woken
+        result = self.searcher.book_move(position)
+        if result is not None:
+            return result._replace(seconds=time.perf_counter() - start)
+        self.stop_event.clear()
+        generation = (self.tt.generation + 1) & 255
+        fen = position.to_fen()
+
+        # Half the helpers start one ply deeper so they are not all working
+        # on the same iteration at the same time
+        helpers = []
+        if self.pool is not None:
+            for i in range(self.workers - 1):
+                helpers.append(
+                    self.pool.submit(_helper_search, fen, list(key_history), limits, 1 + i % 2, generation)
+                )
+
+        result = self.searcher.search(position, limits, key_history, info, generation=generation)
+        self.stop_event.set()
+
+        nodes = result.nodes
+        for future in helpers:
+            move, score, depth, helper_nodes, pv = future.result()
+            nodes += helper_nodes
+            # A helper that finished a deeper iteration has the better answer
+            if depth > result.depth and move:
+                result = result._replace(move=move, score=score, depth=depth, pv=pv)
+
+        return result._replace(nodes=nodes, seconds=time.perf_counter() - start)
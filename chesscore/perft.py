@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .movegen import generate_legal_moves, parse_uci_move
+from .position import STARTING_FEN, Position, move_to_uci
+
+# Standard perft positions and node counts (chessprogramming.org "Perft Results")
+REFERENCE_POSITIONS = [
+    ("initial", STARTING_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609, 6: 119060324}),
+    (
+        "kiwipete",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+        {1: 48, 2: 2039, 3: 97862, 4: 4085603, 5: 193690690},
+    ),
+    (
+        "position3",
+        "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+        {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624, 6: 11030083},
+    ),
+    (
+        "position4",
+        "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+        {1: 6, 2: 264, 3: 9467, 4: 422333, 5: 15833292},
+    ),
+    (
+        "position4-mirrored",
+        "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+        {1: 6, 2: 264, 3: 9467, 4: 422333, 5: 15833292},
+    ),
+    (
+        "position5",
+        "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+        {1: 44, 2: 1486, 3: 62379, 4: 2103487, 5: 89941194},
+    ),
+    (
+        "position6",
+        "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+        {1: 46, 2: 2079, 3: 89890, 4: 3894594, 5: 164075551},
+    ),
+]
+
+
+def perft(position, depth):
+    if depth == 0:
+        return 1
+
+    moves = generate_legal_moves(position)
+    if depth == 1:
+        return len(moves)
+
+    nodes = 0
+    for move in moves:
+        undo = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move, undo)
+    return nodes
+
+
+def divide(position, depth):
+    counts = {}
+    for move in generate_legal_moves(position):
+        undo = position.make_move(move)
+        counts[move_to_uci(move)] = perft(position, depth - 1)
+        position.unmake_move(move, undo)
+    return counts
+
+
+def _perft_root_move(fen, uci, depth):
+    position = Position.from_fen(fen)
+    position.make_move(parse_uci_move(position, uci))
+    return uci, perft(position, depth - 1)
+
+
+def parallel_divide(fen, depth, processes=None):
+    # Root splitting: every legal root move becomes one task in the pool
+    if depth < 2:
+        return divide(Position.from_fen(fen), depth)
+
+    root_moves = [move_to_uci(move) for move in generate_legal_moves(Position.from_fen(fen))]
+    with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as pool:
+        results = pool.map(_perft_root_move, [fen] * len(root_moves), root_moves, [depth] * len(root_moves))
+        return dict(results)
+
+
+def run_perft(fen, depth, processes=1, split=False):
+    # Returns (per root move counts or None, total nodes, seconds)
+    start = time.perf_counter()
+    if processes == 1:
+        position = Position.from_fen(fen)
+        counts = divide(position, depth) if split else None
+        nodes = sum(counts.values()) if split else perft(position, depth)
+    else:
+        counts = parallel_divide(fen, depth, processes)
+        nodes = sum(counts.values())
+    return counts, nodes, time.perf_counter() - start
+
+
+def run_suite(max_nodes, processes=1, out=sys.stdout):
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, expected in REFERENCE_POSITIONS:
+        depth = max(d for d, nodes in expected.items() if nodes <= max_nodes or d == 1)
+        _, nodes, seconds = run_perft(fen, depth, processes)
+        total_nodes += nodes
+        total_seconds += seconds
+        ok = nodes == expected[depth]
+        failures += not ok
+        print(
+            f"{'ok  ' if ok else 'FAIL'} {name:<20} depth {depth} nodes {nodes:>10} "
+            f"expected {expected[depth]:>10} {_nps(nodes, seconds):>10} nps",
+            file=out,
+        )
+    print(f"total {total_nodes} nodes in {total_seconds:.2f}s, {_nps(total_nodes, total_seconds)} nps", file=out)
+    return failures
+
+
+def _nps(nodes, seconds):
+    return int(nodes / seconds) if seconds else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore perft", description="Count move generator leaf nodes.")
+    parser.add_argument("depth", type=int, nargs="?", default=4)
+    parser.add_argument("--fen", default=STARTING_FEN)
+    parser.add_argument("--divide", action="store_true", help="print the node count below each root move")
+    parser.add_argument("--processes", "-j", type=int, default=1, help="worker processes, 0 for one per core")
+    parser.add_argument("--suite", action="store_true", help="check the reference positions instead")
+    parser.add_argument("--max-nodes", type=int, default=1000000, help="deepest suite depth to run per position")
+    args = parser.parse_args(argv)
+    processes = args.processes or os.cpu_count()
+
+    if args.suite:
+        return 1 if run_suite(args.max_nodes, processes) else 0
+
+    counts, nodes, seconds = run_perft(args.fen, args.depth, processes, args.divide)
+    if args.divide:
+        for uci in sorted(counts):
+            print(f"{uci}: {counts[uci]}")
+    print(f"nodes {nodes} time {seconds:.3f}s nps {_nps(nodes, seconds)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
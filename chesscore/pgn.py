@@ -0,0 +1,198 @@
+import argparse
+import os
+import re
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .game import Game
+from .movegen import parse_san
+from .position import Position
+
+# Streaming PGN import. The file is read in fixed-size chunks and cut into
+# games at each "[Event " tag line, so memory use stays flat however large
+# the archive is. Games are parsed and replayed in batches, either inline or
+# across a process pool.
+
+CHUNK_SIZE = 1 << 22
+BATCH_SIZE = 256
+GAME_START = b"\n[Event "
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+
+_TAG = re.compile(r'\s*\[\s*(\w+)\s*"((?:[^"\\]|\\.)*)"\s*\]')
+_COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*")
+_VARIATION = re.compile(r"\([^()]*\)")
+_NAG = re.compile(r"\$\d+")
+_MOVE_NUMBER = re.compile(r"^\d+\.+")
+
+# index counts games from 0 in file order; moves are the resolved move ints,
+# played from the FEN header if there is one. error is None for a good game.
+PGNGame = namedtuple("PGNGame", "index headers moves result error")
+
+
+def iter_game_texts(file, chunk_size=CHUNK_SIZE):
+    # Raw bytes of each game in a binary file object
+    buffer = b""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer += chunk
+        start = 0
+        while True:
+            end = buffer.find(GAME_START, start + 1)
+            if end < 0:
+                break
+            if buffer[start:end].strip():
+                yield buffer[start:end + 1]
+            start = end + 1
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer
+
+
+def start_position(headers):
+    fen = headers.get("FEN")
+    return Position.from_fen(fen) if fen else Position.starting()
+
+
+def parse_movetext(text):
+    # SAN tokens and the result that ends the movetext, or None when it
+    # ends without one; comments, variations and NAGs are dropped
+    text = _COMMENT.sub(" ", text)
+    while "(" in text:
+        stripped = _VARIATION.sub(" ", text)
+        if stripped == text:
+            raise ValueError("unbalanced variation")
+        text = stripped
+    text = _NAG.sub(" ", text)
+
+    sans = []
+    result = None
+    for token in text.split():
+        token = _MOVE_NUMBER.sub("", token)
+        if not token:
+            continue
+        if token in RESULTS:
+            result = token
+        else:
+            sans.append(token)
+            result = None
+    return sans, result
+
+
+def parse_game(data, index=0):
+    # Parses one game and replays it through Game, so every move is checked
+    # by the same code as a move made on the board
+    text = data.decode("utf-8", "replace") if isinstance(data, bytes) else data
+    headers = {}
+    offset = 0
+    while True:
+        match = _TAG.match(text, offset)
+        if match is None:
+            break
+        headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        offset = match.end()
+
+    moves = []
+    result = headers.get("Result", "*")
+    try:
+        sans, ending = parse_movetext(text[offset:])
+        # The header's Result stands unless the movetext gives its own
+        if ending is not None:
+            result = ending
+        game = Game(start_position(headers))
+        # Game appends to this list, so a bad ply keeps the moves before it
+        moves = game.moves
+        for ply, san in enumerate(sans, 1):
+            try:
+                game.make_move(parse_san(game.position, san))
+            except ValueError as error:
+                raise ValueError(f"ply {ply}: {error}") from None
+    except ValueError as error:
+        return PGNGame(index, headers, moves, result, str(error))
+    return PGNGame(index, headers, moves, result, None)
+
+
+def parse_batch(first_index, texts):
+    return [parse_game(text, first_index + i) for i, text in enumerate(texts)]
+
+
+def _batches(texts, batch_size):
+    batch = []
+    index = 0
+    for text in texts:
+        batch.append(text)
+        if len(batch) == batch_size:
+            yield index, batch
+            index += len(batch)
+            batch = []
+    if batch:
+        yield index, batch
+
+
+def read_games(path, processes=1, ordered=True, batch_size=BATCH_SIZE):
+    # Generator of PGNGame. With processes > 1 batches are parsed in a pool;
+    # ordered=False yields each batch as soon as it is done. Only a few
+    # batches per process are in flight, so reading never runs far ahead.
+    with open(path, "rb") as file:
+        batches = _batches(iter_game_texts(file), batch_size)
+        if processes == 1:
+            for first_index, texts in batches:
+                yield from parse_batch(first_index, texts)
+            return
+
+        workers = processes or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            limit = 4 * workers
+            if ordered:
+                pending = deque()
+                for batch in batches:
+                    if len(pending) >= limit:
+                        yield from pending.popleft().result()
+                    pending.append(pool.submit(parse_batch, *batch))
+                while pending:
+                    yield from pending.popleft().result()
+            else:
+                pending = set()
+                for batch in batches:
+                    if len(pending) >= limit:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            yield from future.result()
+                    pending.add(pool.submit(parse_batch, *batch))
+                for future in pending:
+                    yield from future.result()
+
+
+def replay(game, pgn_game):
+    # Loads an imported game into a Game or one of the front ends
+    game.replay(start_position(pgn_game.headers), pgn_game.moves)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore pgn", description="Parse and validate a PGN archive.")
+    parser.add_argument("path")
+    parser.add_argument("--processes", "-j", type=int, default=1, help="worker processes, 0 for one per core")
+    parser.add_argument("--unordered", action="store_true", help="report games as batches finish")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    games = errors = moves = 0
+    for game in read_games(args.path, args.processes, not args.unordered, args.batch_size):
+        games += 1
+        moves += len(game.moves)
+        if game.error:
+            errors += 1
+            print(f"game {game.index + 1}: {game.error}")
+    seconds = time.perf_counter() - start
+    rate = int(games / seconds) if seconds > 0 else 0
+    print(f"{games} games, {moves} moves, {errors} errors in {seconds:.2f}s ({rate} games/s)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,494 @@
+import struct
+
+from .zobrist import CASTLING_KEYS, PIECE_KEYS, WHITE_TO_MOVE_KEY, compute_key, ep_key
+
+# Squares are numbered 0..63 as row * 8 + col, using the same (row, col)
+# layout as ChessGame.board: row 0 holds white's back rank, so a1 is 0 and
+# h8 is 63.
+
+BOARD_SIZE = 8
+
+WHITE = 0
+BLACK = 1
+COLOR_NAMES = ("white", "black")
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+
+# A piece index is color * 6 + kind, matching the order of PIECE_SYMBOLS
+PIECE_SYMBOLS = "PNBRQKpnbrqk"
+
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+CASTLING_SYMBOLS = "KQkq"
+
+FILE_NAMES = "abcdefgh"
+BACK_RANKS = 0xFF000000000000FF
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# Castling rights lost when a piece leaves or lands on these squares
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[0] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASKS[7] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASKS[4] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[56] = 15 & ~BLACK_QUEENSIDE
+CASTLING_MASKS[63] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASKS[60] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+
+# Moves are plain ints: from square, to square, promotion kind and a flag
+NORMAL = 0
+EN_PASSANT = 1
+CASTLE = 2
+
+_PACK_HEADER = struct.Struct("<QBBBH")
+_NO_EP = 0xFF
+
+
+def square(row, col):
+    return row * BOARD_SIZE + col
+
+
+def square_row_col(sq):
+    return sq >> 3, sq & 7
+
+
+def square_name(sq):
+    return FILE_NAMES[sq & 7] + str((sq >> 3) + 1)
+
+
+def parse_square(name):
+    col = FILE_NAMES.index(name[0])
+    row = int(name[1]) - 1
+    if not 0 <= row < BOARD_SIZE:
+        raise ValueError(f"Invalid square: {name!r}")
+    return square(row, col)
+
+
+def encode_move(from_sq, to_sq, promotion=0, flags=NORMAL):
+    return from_sq | (to_sq << 6) | (promotion << 12) | (flags << 15)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return (move >> 12) & 7
+
+
+def move_flags(move):
+    return move >> 15
+
+
+def move_to_uci(move):
+    text = square_name(move & 63) + square_name((move >> 6) & 63)
+    promotion = (move >> 12) & 7
+    if promotion:
+        text += PIECE_SYMBOLS[6 + promotion]
+    return text
+
+
+def piece_color(piece):
+    return piece // 6
+
+
+def piece_kind(piece):
+    return piece % 6
+
+
+def iter_squares(bitboard):
+    while bitboard:
+        lsb = bitboard & -bitboard
+        yield lsb.bit_length() - 1
+        bitboard ^= lsb
+
+
+def popcount(bitboard):
+    return bin(bitboard).count("1")
+
+
+class Position:
+    __slots__ = (
+        "pieces",
+        "occupied",
+        "king_squares",
+        "side_to_move",
+        "castling",
+        "ep_square",
+        "halfmove_clock",
+        "fullmove_number",
+        "key",
+    )
+
+    def __init__(self):
+        self.pieces = [0] * 12
+        self.occupied = [0, 0]
+        # Kept up to date by put_piece/remove_piece so check tests never
+        # have to search for the king
+        self.king_squares = [None, None]
+        self.side_to_move = WHITE
+        self.castling = 0
+        self.ep_square = None
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        # Zobrist key, updated incrementally by put/remove and make/unmake
+        self.key = WHITE_TO_MOVE_KEY
+
+    @classmethod
+    def starting(cls):
+        return cls.from_fen(STARTING_FEN)
+
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"Invalid FEN: {fen!r}")
+
+        position = cls()
+        rows = fields[0].split("/")
+        if len(rows) != BOARD_SIZE:
+            raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+
+        # FEN lists rank 8 first, which is our last row
+        for i, text in enumerate(rows):
+            row = BOARD_SIZE - 1 - i
+            col = 0
+            for char in text:
+                if char.isdigit():
+                    col += int(char)
+                elif char in PIECE_SYMBOLS and col < BOARD_SIZE:
+                    position.put_piece(PIECE_SYMBOLS.index(char), square(row, col))
+                    col += 1
+                else:
+                    raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+            if col != BOARD_SIZE:
+                raise ValueError(f"Invalid FEN board: {fields[0]!r}")
+
+        # Move generation relies on one king a side and no pawns on the
+        # back ranks
+        for color in (WHITE, BLACK):
+            if popcount(position.pieces[color * 6 + KING]) != 1:
+                raise ValueError(f"Invalid FEN board, {COLOR_NAMES[color]} needs one king: {fields[0]!r}")
+        if (position.pieces[PAWN] | position.pieces[6 + PAWN]) & BACK_RANKS:
+            raise ValueError(f"Invalid FEN board, pawn on a back rank: {fields[0]!r}")
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid side to move: {fields[1]!r}")
+        position.side_to_move = WHITE if fields[1] == "w" else BLACK
+
+        if fields[2] != "-":
+            for char in fields[2]:
+                if char not in CASTLING_SYMBOLS:
+                    raise ValueError(f"Invalid castling rights: {fields[2]!r}")
+                position.castling |= 1 << CASTLING_SYMBOLS.index(char)
+
+        if fields[3] != "-":
+            position.ep_square = parse_square(fields[3])
+            # The pawn that just moved two squares stands in front of the
+            # square, and the square and the one it came from are empty
+            ep = position.ep_square
+            forward = 8 if position.side_to_move == WHITE else -8
+            them = position.side_to_move ^ 1
+            if (
+                ep >> 3 != (5 if position.side_to_move == WHITE else 2)
+                or not position.pieces[them * 6 + PAWN] >> (ep - forward) & 1
+                or (position.occupied[WHITE] | position.occupied[BLACK]) & (1 << ep | 1 << (ep + forward))
+            ):
+                raise ValueError(f"Invalid en passant square: {fields[3]!r}")
+
+        if len(fields) > 4:
+            position.halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            position.fullmove_number = int(fields[5])
+        # pack() stores the fullmove number in 16 bits
+        if position.halfmove_clock < 0 or not 1 <= position.fullmove_number <= 0xFFFF:
+            raise ValueError(f"Invalid move clocks: {fen!r}")
+
+        position.key = compute_key(position)
+
+        from .movegen import is_check
+
+        if is_check(position, position.side_to_move ^ 1):
+            raise ValueError(f"Invalid FEN, the side not to move is in check: {fen!r}")
+        return position
+
+    def to_fen(self):
+        rows = []
+        for row in range(BOARD_SIZE - 1, -1, -1):
+            text = ""
+            empty = 0
+            for col in range(BOARD_SIZE):
+                piece = self.piece_at(square(row, col))
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += PIECE_SYMBOLS[piece]
+            if empty:
+                text += str(empty)
+            rows.append(text)
+
+        castling = "".join(symbol for i, symbol in enumerate(CASTLING_SYMBOLS) if self.castling & (1 << i))
+        ep = square_name(self.ep_square) if self.ep_square is not None else "-"
+
+        return " ".join([
+            "/".join(rows),
+            "w" if self.side_to_move == WHITE else "b",
+            castling or "-",
+            ep,
+            str(self.halfmove_clock),
+            str(self.fullmove_number),
+        ])
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.pieces = self.pieces[:]
+        position.occupied = self.occupied[:]
+        position.king_squares = self.king_squares[:]
+        position.side_to_move = self.side_to_move
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.key = self.key
+        return position
+
+    def __eq__(self, other):
+        if not isinstance(other, Position):
+            return NotImplemented
+        return (
+            self.key == other.key
+            and self.pieces == other.pieces
+            and self.side_to_move == other.side_to_move
+            and self.castling == other.castling
+            and self.ep_square == other.ep_square
+        )
+
+    def __repr__(self):
+        return f"Position({self.to_fen()!r})"
+
+    @property
+    def all_occupied(self):
+        return self.occupied[WHITE] | self.occupied[BLACK]
+
+    def piece_at(self, sq):
+        bit = 1 << sq
+        if not (self.occupied[WHITE] | self.occupied[BLACK]) & bit:
+            return None
+        pieces = self.pieces
+        start = 0 if self.occupied[WHITE] & bit else 6
+        for piece in range(start, start + 6):
+            if pieces[piece] & bit:
+                return piece
+        return None
+
+    def put_piece(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] |= bit
+        self.occupied[piece // 6] |= bit
+        self.key ^= PIECE_KEYS[piece][sq]
+        if piece % 6 == KING:
+            self.king_squares[piece // 6] = sq
+
+    def remove_piece(self, piece, sq):
+        bit = 1 << sq
+        self.pieces[piece] &= ~bit
+        self.occupied[piece // 6] &= ~bit
+        self.key ^= PIECE_KEYS[piece][sq]
+        if piece % 6 == KING and self.king_squares[piece // 6] == sq:
+            self.king_squares[piece // 6] = None
+
+    def make_move(self, move):
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flags = move >> 15
+        us = self.side_to_move
+        piece = self.piece_at(from_sq)
+        captured = self.piece_at(to_sq)
+        undo = (captured, self.castling, self.ep_square, self.halfmove_clock, self.key)
+        self.key ^= CASTLING_KEYS[self.castling] ^ ep_key(self.pieces, self.ep_square, us) ^ WHITE_TO_MOVE_KEY
+
+        if flags == EN_PASSANT:
+            self.remove_piece((us ^ 1) * 6 + PAWN, to_sq - 8 if us == WHITE else to_sq + 8)
+        elif captured is not None:
+            self.remove_piece(captured, to_sq)
+
+        self.remove_piece(piece, from_sq)
+        self.put_piece(us * 6 + promotion if promotion else piece, to_sq)
+
+        if flags == CASTLE:
+            rook = us * 6 + ROOK
+            if to_sq > from_sq:
+                self.remove_piece(rook, from_sq + 3)
+                self.put_piece(rook, from_sq + 1)
+            else:
+                self.remove_piece(rook, from_sq - 4)
+                self.put_piece(rook, from_sq - 1)
+
+        self.castling &= CASTLING_MASKS[from_sq] & CASTLING_MASKS[to_sq]
+        self.ep_square = None
+        if piece % 6 == PAWN:
+            self.halfmove_clock = 0
+            if abs(to_sq - from_sq) == 16:
+                self.ep_square = (from_sq + to_sq) // 2
+        elif captured is not None:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        if us == BLACK:
+            self.fullmove_number += 1
+        self.side_to_move = us ^ 1
+        self.key ^= CASTLING_KEYS[self.castling]
+        if self.ep_square is not None:
+            self.key ^= ep_key(self.pieces, self.ep_square, us ^ 1)
+
+        return undo
+
+    def make_null_move(self):
+        # Pass the turn, for null move pruning in search
+        undo = (self.ep_square, self.key)
+        self.key ^= ep_key(self.pieces, self.ep_square, self.side_to_move) ^ WHITE_TO_MOVE_KEY
+        self.ep_square = None
+        self.side_to_move ^= 1
+        return undo
+
+    def unmake_null_move(self, undo):
+        self.ep_square, self.key = undo
+        self.side_to_move ^= 1
+
+    def unmake_move(self, move, undo):
+        from_sq = move & 63
+        to_sq = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flags = move >> 15
+        captured, self.castling, self.ep_square, self.halfmove_clock, key = undo
+        us = self.side_to_move ^ 1
+        self.side_to_move = us
+        if us == BLACK:
+            self.fullmove_number -= 1
+
+        piece = self.piece_at(to_sq)
+        self.remove_piece(piece, to_sq)
+        self.put_piece(us * 6 + PAWN if promotion else piece, from_sq)
+
+        if flags == EN_PASSANT:
+            self.put_piece((us ^ 1) * 6 + PAWN, to_sq - 8 if us == WHITE else to_sq + 8)
+        elif captured is not None:
+            self.put_piece(captured, to_sq)
+
+        if flags == CASTLE:
+            rook = us * 6 + ROOK
+            if to_sq > from_sq:
+                self.remove_piece(rook, from_sq + 1)
+                self.put_piece(rook, from_sq + 3)
+            else:
+                self.remove_piece(rook, from_sq - 1)
+                self.put_piece(rook, from_sq - 4)
+
+        self.key = key
+
+    # Packed form: a 13 byte header (occupancy, side/castling, en-passant,
+    # halfmove clock, fullmove number) followed by one nibble per occupied
+    # square in ascending order, so a full board is 29 bytes.
+    def pack(self):
+        occupied = self.occupied[WHITE] | self.occupied[BLACK]
+        by_square = {}
+        for piece, bitboard in enumerate(self.pieces):
+            for sq in iter_squares(bitboard):
+                by_square[sq] = piece
+        nibbles = [by_square[sq] for sq in sorted(by_square)]
+        if len(nibbles) % 2:
+            nibbles.append(0)
+        body = bytes(nibbles[i] | (nibbles[i + 1] << 4) for i in range(0, len(nibbles), 2))
+
+        ep = _NO_EP if self.ep_square is None else self.ep_square
+        header = _PACK_HEADER.pack(
+            occupied,
+            self.side_to_move | (self.castling << 1),
+            ep,
+            min(self.halfmove_clock, 255),
+            self.fullmove_number,
+        )
+        return header + body
+
+    @classmethod
+    def unpack(cls, data):
+        occupied, flags, ep, halfmove, fullmove = _PACK_HEADER.unpack_from(data)
+        position = cls()
+        position.side_to_move = flags & 1
+        position.castling = flags >> 1
+        position.ep_square = None if ep == _NO_EP else ep
+        position.halfmove_clock = halfmove
+        position.fullmove_number = fullmove
+
+        # Bitboards are filled in directly and the key worked out once at
+        # the end, which is much cheaper than put_piece per square
+        offset = _PACK_HEADER.size
+        pieces = position.pieces
+        for i, sq in enumerate(iter_squares(occupied)):
+            byte = data[offset + i // 2]
+            pieces[byte >> 4 if i % 2 else byte & 15] |= 1 << sq
+        white = pieces[0] | pieces[1] | pieces[2] | pieces[3] | pieces[4] | pieces[5]
+        position.occupied = [white, occupied & ~white]
+        position.king_squares = [
+            pieces[KING].bit_length() - 1 if pieces[KING] else None,
+            pieces[6 + KING].bit_length() - 1 if pieces[6 + KING] else None,
+        ]
+
+        position.key = compute_key(position)
+        return position
+
+
+class BoardView:
+    # Read-only board[row][col] adapter over a Position, handing out one
+    # shared object per piece index (e.g. the GUI's sprites).
+    def __init__(self, position, pieces):
+        self.position = position
+        self.pieces = pieces
+
+    def __len__(self):
+        return BOARD_SIZE
+
+    def __getitem__(self, row):
+        if not 0 <= row < BOARD_SIZE:
+            raise IndexError(row)
+        return _RowView(self, row)
+
+    def __iter__(self):
+        for row in range(BOARD_SIZE):
+            yield _RowView(self, row)
+
+
+class _RowView:
+    __slots__ = ("board", "row")
+
+    def __init__(self, board, row):
+        self.board = board
+        self.row = row
+
+    def __len__(self):
+        return BOARD_SIZE
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [self[c] for c in range(BOARD_SIZE)[col]]
+        if not 0 <= col < BOARD_SIZE:
+            raise IndexError(col)
+        piece = self.board.position.piece_at(self.row * BOARD_SIZE + col)
+        if piece is None:
+            return None
+        return self.board.pieces[piece]
+
+    def __iter__(self):
+        for col in range(BOARD_SIZE):
+            yield self[col]
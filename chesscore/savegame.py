@@ -0,0 +1,182 @@
+import os
+
+from .movegen import generate_legal_moves
+from .position import Position, move_to_uci
+
+# Save files are an append-only journal of records:
+#   b"S" <length> <packed position>   snapshot, the game restarts from here
+#   b"M" <3 bytes, little endian>     one move played from the last snapshot
+# A save only appends what happened since the previous one, and a loader
+# replays the moves after the last snapshot. A record cut short by a crash
+# is ignored, so the journal is always readable up to the last full save,
+# and cut off before anything new is appended after it. SaveFile writes a
+# new snapshot into a fresh file that replaces the old one, so a journal
+# holds a single game and never grows past it.
+
+SNAPSHOT = b"S"
+MOVE = b"M"
+MOVE_BYTES = 3
+
+
+class MoveJournal:
+    # Records are written straight to the file, and fsync is left to sync(),
+    # so a save of any number of moves costs one fsync
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "ab")
+        self.pending = False
+        if self.file.tell():
+            with open(path, "rb") as file:
+                end = _parse(file.read(), path)[2]
+            self.file.truncate(end)
+
+    def write_snapshot(self, position):
+        data = position.pack()
+        self.file.write(SNAPSHOT + bytes((len(data),)) + data)
+        self.pending = True
+
+    def append_move(self, move):
+        self.file.write(MOVE + move.to_bytes(MOVE_BYTES, "little"))
+        self.pending = True
+
+    def sync(self):
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = False
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _parse(data, path):
+    # (last snapshot, moves after it, end of the last whole record)
+    position = None
+    moves = []
+    offset = 0
+    while offset < len(data):
+        tag = data[offset:offset + 1]
+        if tag == SNAPSHOT:
+            if offset + 2 > len(data):
+                break
+            end = offset + 2 + data[offset + 1]
+            if end > len(data):
+                break
+            position = Position.unpack(data[offset + 2:end])
+            moves = []
+        elif tag == MOVE:
+            end = offset + 1 + MOVE_BYTES
+            if end > len(data):
+                break
+            moves.append(int.from_bytes(data[offset + 1:end], "little"))
+        else:
+            raise ValueError(f"{path}: bad record at byte {offset}")
+        offset = end
+    return position, moves, offset
+
+
+def read_journal(path):
+    # The last snapshot and the moves after it, or None if the file has none
+    with open(path, "rb") as file:
+        position, moves, _ = _parse(file.read(), path)
+    if position is None:
+        return None
+    return position, moves
+
+
+class SaveFile:
+    # Ties a Game to a journal: the first save after a reset rewrites the
+    # file from a snapshot of the start position, later saves only append
+    # the new moves. Once moves were undone since the last save, the saved
+    # moves are no longer a prefix of the game and the file is rewritten.
+    def __init__(self, path):
+        self.path = path
+        self.journal = None
+        self.game = None
+        self.start_position = None
+        # The moves the journal holds after its snapshot
+        self.saved = []
+
+    def save(self, game):
+        saved = len(self.saved)
+        if game is not self.game or game.start_position != self.start_position or game.moves[:saved] != self.saved:
+            self.rewrite(game)
+        else:
+            if self.journal is None:
+                self.journal = MoveJournal(self.path)
+            for move in game.moves[saved:]:
+                self.journal.append_move(move)
+            self.journal.sync()
+        self.game = game
+        self.start_position = game.start_position.copy()
+        self.saved = game.moves[:]
+
+    def rewrite(self, game):
+        # The whole game goes to a temporary file that is then renamed over
+        # the journal, so a crash leaves either the old file or the new one
+        self.close()
+        temp = self.path + ".tmp"
+        if os.path.exists(temp):
+            os.remove(temp)
+        with MoveJournal(temp) as journal:
+            journal.write_snapshot(game.start_position)
+            for move in game.moves:
+                journal.append_move(move)
+        os.replace(temp, self.path)
+        self.journal = MoveJournal(self.path)
+
+    def load(self, game):
+        # Returns False when there is nothing to load, and raises ValueError
+        # for a journal that does not hold a legal game
+        try:
+            saved = read_journal(self.path)
+        except FileNotFoundError:
+            return False
+        if saved is None:
+            return False
+        position, moves = saved
+        # Every move is checked before the game is touched, so a corrupt
+        # journal leaves the game as it was
+        replayed = position.copy()
+        for ply, move in enumerate(moves, 1):
+            if move not in generate_legal_moves(replayed):
+                raise ValueError(f"{self.path}: illegal move at ply {ply}")
+            replayed.make_move(move)
+        game.replay(position, moves)
+        self.game = game
+        self.start_position = position.copy()
+        self.saved = moves
+        return True
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="chesscore journal", description="Show the game stored in a save journal.")
+    parser.add_argument("path")
+    args = parser.parse_args(argv)
+
+    saved = read_journal(args.path)
+    if saved is None:
+        print(f"{args.path}: no snapshot")
+        return 1
+
+    position, moves = saved
+    print(f"start {position.to_fen()}")
+    print(f"moves {' '.join(move_to_uci(move) for move in moves)}")
+    for move in moves:
+        position.make_move(move)
+    print(f"end   {position.to_fen()}")
+    return 0
@@ -0,0 +1,416 @@
+import argparse
+import time
+from collections import namedtuple
+
+from .evaluate import PIECE_VALUES, evaluate
+from .movegen import generate_legal_moves, is_check
+from .position import EN_PASSANT, KING, PAWN, STARTING_FEN, Position, move_to_uci
+from .tt import EXACT, LOWER_BOUND, UPPER_BOUND, TranspositionTable
+
+MATE_SCORE = 100000
+# Scores beyond this are mates, counted in plies from the root
+MATE_BOUND = MATE_SCORE - 1000
+INFINITE = MATE_SCORE + 1
+MAX_PLY = 64
+DELTA_MARGIN = 200
+NULL_MOVE_REDUCTION = 2
+LMR_MIN_MOVES = 3
+
+SearchLimits = namedtuple("SearchLimits", ["depth", "nodes", "movetime"], defaults=(None, None, None))
+
+# Difficulty is purely a matter of how far the engine may look
+DIFFICULTY_LEVELS = {
+    "easy": SearchLimits(depth=1, nodes=500, movetime=0.05),
+    "medium": SearchLimits(depth=3, nodes=5000, movetime=0.1),
+    "hard": SearchLimits(depth=5, nodes=50000, movetime=1.0),
+    "expert": SearchLimits(depth=MAX_PLY, movetime=5.0),
+}
+
+_TT_MOVE_SCORE = 1 << 30
+_CAPTURE_SCORE = 1 << 24
+_KILLER_SCORES = (1 << 23, (1 << 23) - 1)
+
+
+class SearchResult(namedtuple("SearchResult", ["move", "score", "depth", "nodes", "seconds", "pv"])):
+    __slots__ = ()
+
+    @property
+    def nps(self):
+        return int(self.nodes / self.seconds) if self.seconds else 0
+
+    @property
+    def uci_move(self):
+        return move_to_uci(self.move) if self.move else None
+
+
+class SearchStopped(Exception):
+    pass
+
+
+def tablebase_score(outcome, plies, ply):
+    # A tablebase result as a search score, mates counted from the root
+    if not outcome:
+        return 0
+    return outcome * (MATE_SCORE - ply - plies)
+
+
+def mate_in(score):
+    # Moves to mate (negative when being mated), or None for normal scores
+    if score > MATE_BOUND:
+        return (MATE_SCORE - score + 1) // 2
+    if score < -MATE_BOUND:
+        return -((MATE_SCORE + score + 1) // 2)
+    return None
+
+
+class Searcher:
+    # Negamax alpha-beta with iterative deepening, principal variation
+    # search, a transposition table and quiescence search. stop() may be
+    # called from another thread.
+    def __init__(self, tt=None, tt_size_mb=16, book=None, tablebase=None):
+        self.tt = tt if tt is not None else TranspositionTable(tt_size_mb)
+        # Optional OpeningBook consulted before searching
+        self.book = book
+        # Optional Tablebase giving exact scores once few enough men are left
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.stopped = False
+        self.keys = []
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self.deadline = None
+        self.node_limit = None
+        # Optional cross-process stop flag (a multiprocessing.Event)
+        self.stop_event = None
+
+    def stop(self):
+        self.stopped = True
+
+    def book_move(self, position):
+        # A SearchResult for a book or tablebase move, or None when the
+        # position is in neither
+        if self.book is not None:
+            move = self.book.choose(position)
+            if move:
+                return SearchResult(move, 0, 0, 0, 0.0, [move])
+        if self.tablebase is not None:
+            best = self.tablebase.best_move(position)
+            if best is not None:
+                move, outcome, plies = best
+                return SearchResult(move, tablebase_score(outcome, plies, 0), 0, 0, 0.0, [move])
+        return None
+
+    def search(self, position, limits=SearchLimits(), key_history=(), info=None, start_depth=1, generation=None):
+        # key_history is the game's position keys, oldest first; the
+        # position being searched may be included as the last entry
+        start = time.perf_counter()
+        result = self.book_move(position)
+        if result is not None:
+            return result._replace(seconds=time.perf_counter() - start)
+        position = position.copy()
+        self.nodes = 0
+        self.stopped = False
+        self.keys = list(key_history)
+        if self.keys and self.keys[-1] == position.key:
+            self.keys.pop()
+        self.killers = [[0, 0] for _ in range(MAX_PLY + 1)]
+        self.history = [0] * 4096
+        self.deadline = start + limits.movetime if limits.movetime else None
+        self.node_limit = limits.nodes or 1 << 62
+        self.tt.new_search(generation)
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            score = -MATE_SCORE if is_check(position) else 0
+            return SearchResult(0, score, 0, 0, time.perf_counter() - start, [])
+
+        result = SearchResult(moves[0], 0, 0, 0, 0.0, [moves[0]])
+        for depth in range(start_depth, min(limits.depth or MAX_PLY, MAX_PLY) + 1):
+            try:
+                score = self.negamax(position, depth, -INFINITE, INFINITE, 0)
+            except SearchStopped:
+                break
+
+            seconds = time.perf_counter() - start
+            pv = self.principal_variation(position, depth)
+            result = SearchResult(pv[0] if pv else result.move, score, depth, self.nodes, seconds, pv)
+            if info is not None:
+                info(result)
+
+            if len(moves) == 1 or abs(score) > MATE_BOUND and abs(mate_in(score)) * 2 <= depth:
+                break
+            # Another iteration takes several times longer than this one
+            if self.deadline is not None and time.perf_counter() + seconds > self.deadline:
+                break
+
+        return result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+
+    def check_limits(self):
+        if self.stopped or self.nodes >= self.node_limit:
+            raise SearchStopped
+        if self.stop_event is not None and self.stop_event.is_set():
+            self.stopped = True
+            raise SearchStopped
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchStopped
+
+    def is_repetition(self, key, halfmove_clock):
+        keys = self.keys
+        for i in range(len(keys) - 2, max(len(keys) - halfmove_clock, 0) - 1, -2):
+            if keys[i] == key:
+                return True
+        return False
+
+    def negamax(self, position, depth, alpha, beta, ply):
+        self.nodes += 1
+        if self.nodes & 255 == 0 or self.stopped or self.nodes >= self.node_limit:
+            self.check_limits()
+
+        key = position.key
+        if ply and (position.halfmove_clock >= 100 or self.is_repetition(key, position.halfmove_clock)):
+            return 0
+        if (
+            ply
+            and self.tablebase is not None
+            and bin(position.occupied[0] | position.occupied[1]).count("1") <= self.tablebase.max_men
+        ):
+            hit = self.tablebase.probe(position)
+            if hit is not None:
+                return tablebase_score(hit[0], hit[1], ply)
+
+        in_check = is_check(position)
+        if in_check:
+            depth += 1
+        if depth <= 0 or ply >= MAX_PLY:
+            return self.quiescence(position, alpha, beta, ply)
+
+        tt_move = 0
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_move, tt_depth, flag, tt_score = entry
+            if ply and tt_depth >= depth:
+                tt_score = score_from_tt(tt_score, ply)
+                if (
+                    flag == EXACT
+                    or (flag == LOWER_BOUND and tt_score >= beta)
+                    or (flag == UPPER_BOUND and tt_score <= alpha)
+                ):
+                    return tt_score
+
+        # Null move pruning: if passing the turn still fails high, some real
+        # move will too. Skipped in check and with only pawns left, where
+        # zugzwang makes passing unsound.
+        us = position.side_to_move
+        if (
+            ply
+            and not in_check
+            and depth > NULL_MOVE_REDUCTION
+            and beta < MATE_BOUND
+            and position.occupied[us] & ~(position.pieces[us * 6 + PAWN] | position.pieces[us * 6 + KING])
+        ):
+            self.keys.append(key)
+            undo = position.make_null_move()
+            score = -self.negamax(position, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1, ply + 1)
+            position.unmake_null_move(undo)
+            self.keys.pop()
+            if score >= beta:
+                return beta
+
+        moves = generate_legal_moves(position)
+        if not moves:
+            return -MATE_SCORE + ply if in_check else 0
+
+        original_alpha = alpha
+        best_score = -INFINITE
+        best_move = 0
+        self.keys.append(key)
+        for i, move in enumerate(self.order_moves(position, moves, tt_move, ply)):
+            undo = position.make_move(move)
+            if i == 0:
+                score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            else:
+                # Late move reductions: quiet moves ordered this far back
+                # get a shallower look first
+                quiet = undo[0] is None and not move >> 12
+                reduction = 1 if quiet and i >= LMR_MIN_MOVES and depth >= 3 and not in_check else 0
+                score = -self.negamax(position, depth - 1 - reduction, -alpha - 1, -alpha, ply + 1)
+                if reduction and score > alpha:
+                    score = -self.negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                if alpha < score < beta:
+                    score = -self.negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move(move, undo)
+
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if undo[0] is None and not move >> 12:
+                            self.remember_quiet(move, depth, ply)
+                        break
+        self.keys.pop()
+
+        if best_score >= beta:
+            flag = LOWER_BOUND
+        elif best_score > original_alpha:
+            flag = EXACT
+        else:
+            flag = UPPER_BOUND
+        self.tt.store(key, best_move, depth, flag, score_to_tt(best_score, ply))
+        return best_score
+
+    def quiescence(self, position, alpha, beta, ply):
+        # Captures and promotions only, with the static score as a floor
+        self.nodes += 1
+        if self.nodes & 255 == 0 or self.stopped or self.nodes >= self.node_limit:
+            self.check_limits()
+
+        best_score = evaluate(position)
+        if best_score >= beta or ply >= MAX_PLY:
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        for move in self.order_moves(position, generate_legal_moves(position, captures_only=True), 0, ply):
+            # Delta pruning: skip captures that cannot lift the score to alpha
+            victim = position.piece_at((move >> 6) & 63)
+            gain = PIECE_VALUES[victim % 6] if victim is not None else PIECE_VALUES[PAWN]
+            if (move >> 12) & 7:
+                gain += PIECE_VALUES[(move >> 12) & 7]
+            if best_score + gain + DELTA_MARGIN < alpha:
+                continue
+
+            undo = position.make_move(move)
+            score = -self.quiescence(position, -beta, -alpha, ply + 1)
+            position.unmake_move(move, undo)
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def order_moves(self, position, moves, tt_move, ply):
+        # TT move, then captures by MVV-LVA and promotions, then killers,
+        # then quiet moves by history score
+        killers = self.killers[ply] if ply <= MAX_PLY else (0, 0)
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                scored.append((_TT_MOVE_SCORE, move))
+                continue
+            victim = position.piece_at((move >> 6) & 63)
+            if victim is None and move >> 15 == EN_PASSANT:
+                victim = PAWN
+            promotion = (move >> 12) & 7
+            if victim is not None or promotion:
+                attacker = position.piece_at(move & 63) % 6
+                gain = PIECE_VALUES[victim % 6] if victim is not None else 0
+                gain += PIECE_VALUES[promotion] if promotion else 0
+                scored.append((_CAPTURE_SCORE + 10 * gain - PIECE_VALUES[attacker] // 10, move))
+            elif move == killers[0]:
+                scored.append((_KILLER_SCORES[0], move))
+            elif move == killers[1]:
+                scored.append((_KILLER_SCORES[1], move))
+            else:
+                scored.append((history[move & 4095], move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+
+    def remember_quiet(self, move, depth, ply):
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[move & 4095] += depth * depth
+
+    def principal_variation(self, position, depth):
+        # Follow best moves stored in the transposition table
+        pv = []
+        undos = []
+        seen = set()
+        while len(pv) < depth and position.key not in seen:
+            seen.add(position.key)
+            entry = self.tt.probe(position.key)
+            if entry is None or entry[0] not in generate_legal_moves(position):
+                break
+            pv.append(entry[0])
+            undos.append(position.make_move(entry[0]))
+        for move, undo in zip(reversed(pv), reversed(undos)):
+            position.unmake_move(move, undo)
+        return pv
+
+
+def score_to_tt(score, ply):
+    # Mate scores are stored relative to the node, not the root
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def score_from_tt(score, ply):
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def search(position, limits=SearchLimits(), key_history=(), info=None, tt=None):
+    return Searcher(tt).search(position, limits, key_history, info)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore search", description="Search a position for the best move.")
+    parser.add_argument("--fen", default=STARTING_FEN)
+    parser.add_argument("--level", choices=sorted(DIFFICULTY_LEVELS))
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--movetime", type=int, help="milliseconds")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB")
+    parser.add_argument("--workers", type=int, default=1, help="search processes (Lazy SMP), 0 for one per core")
+    parser.add_argument("--book", help="Polyglot opening book to play from first")
+    parser.add_argument("--tablebases", help="directory of endgame tables to play from")
+    args = parser.parse_args(argv)
+
+    if args.level:
+        limits = DIFFICULTY_LEVELS[args.level]
+    else:
+        limits = SearchLimits(depth=None if args.movetime or args.nodes else 4)
+    limits = limits._replace(
+        depth=args.depth or limits.depth,
+        nodes=args.nodes or limits.nodes,
+        movetime=args.movetime / 1000 if args.movetime else limits.movetime,
+    )
+
+    def report(result):
+        pv = " ".join(move_to_uci(move) for move in result.pv)
+        print(f"depth {result.depth} score {result.score} nodes {result.nodes} nps {result.nps} pv {pv}")
+
+    book = None
+    if args.book:
+        from .book import OpeningBook
+
+        book = OpeningBook(args.book)
+    tablebase = None
+    if args.tablebases:
+        from .tablebase import Tablebase
+
+        tablebase = Tablebase(args.tablebases)
+
+    position = Position.from_fen(args.fen)
+    if args.workers == 1:
+        result = Searcher(tt_size_mb=args.hash, book=book, tablebase=tablebase).search(position, limits, info=report)
+    else:
+        # Imported here because chesscore.parallel builds on this module
+        from .parallel import ParallelSearcher
+
+        with ParallelSearcher(args.workers or None, args.hash, book, tablebase) as searcher:
+            result = searcher.search(position, limits, info=report)
+    print(f"bestmove {result.uci_move} depth {result.depth} nodes {result.nodes} nps {result.nps}")
+    return 0
@@ -0,0 +1,521 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .game import Game
+from .movegen import generate_legal_moves, parse_uci_move
+from .position import COLOR_NAMES, PIECE_SYMBOLS, Position, iter_squares, move_to_uci, square_name
+
+# A headless game server: many games in one process behind a line-based
+# JSON protocol on a TCP or Unix socket. Each request is one JSON object per
+# line and gets exactly one reply line, in order; "id" is echoed back.
+#   {"op": "new", "fen": FEN?}                 -> {"game": N, "fen": ...}
+#   {"op": "move", "game": N, "move": "e2e4"}  -> a move result
+#   {"op": "moves", "moves": [[N, "e2e4"], ...]}  -> {"results": [...]}
+#   {"op": "state", "game": N}                 -> {"fen", "moves", "turn", "status"}
+#   {"op": "watch" | "unwatch" | "close", "game": N}
+#   {"op": "stats"}
+# A move result is the diff of the board: {"game", "move", "changes":
+# {"e2": null, "e4": "P"}, "turn", "status"}, or {"ok": false, "error"}.
+# Other connections watching the game get the same diff as an "event" line.
+#
+# Idle games are kept packed (Position.pack() plus the keys since the last
+# capture or pawn move), so they cost a few hundred bytes each; only the
+# HOT_GAMES most recently played are kept as live Game objects. Large
+# "moves" batches are played in a process pool on the packed form.
+
+HOT_GAMES = 1024
+# Plies a live Game plays before it is rebuilt from its packed form; the
+# server never takes moves back, so the undo records and checkpoints a
+# Game keeps would otherwise only grow
+LIVE_PLIES = 256
+BATCH_THRESHOLD = 64
+LINE_LIMIT = 1 << 20
+
+
+class HostedGame:
+    __slots__ = ("packed", "keys", "moves", "live")
+
+    def __init__(self, position):
+        self.packed = position.pack()
+        self.keys = array("Q", (position.key,))
+        self.moves = array("L")
+        self.live = None
+
+
+def _rules_game(packed, keys):
+    game = Game(Position.unpack(packed))
+    game.key_history = list(keys)
+    return game
+
+
+def _trimmed_keys(game):
+    # Only keys since the last irreversible move can ever repeat
+    return game.key_history[-(game.position.halfmove_clock + 1):]
+
+
+def play_moves(game, game_id, ucis):
+    # Plays UCI moves on a Game, returning (moves played, result per move)
+    played = []
+    results = []
+    for uci in ucis:
+        position = game.position
+        try:
+            move = parse_uci_move(position, uci, game.legal_moves())
+        except ValueError as error:
+            results.append({"ok": False, "game": game_id, "move": uci, "error": str(error)})
+            continue
+        before = position.pieces[:]
+        game.make_move(move)
+        changed = 0
+        for old, new in zip(before, position.pieces):
+            changed |= old ^ new
+        changes = {}
+        for sq in iter_squares(changed):
+            piece = position.piece_at(sq)
+            changes[square_name(sq)] = None if piece is None else PIECE_SYMBOLS[piece]
+        played.append(move)
+        results.append({
+            "ok": True,
+            "game": game_id,
+            "move": uci,
+            "changes": changes,
+            "turn": COLOR_NAMES[position.side_to_move],
+            "status": game.status(),
+        })
+    return played, results
+
+
+def play_packed(game_id, packed, keys, ucis):
+    # Worker side of a large batch: everything in and out is packed
+    game = _rules_game(packed, keys)
+    played, results = play_moves(game, game_id, ucis)
+    return game_id, game.position.pack(), array("Q", _trimmed_keys(game)), played, results
+
+
+class GameServer:
+    def __init__(self, processes=1, batch_threshold=BATCH_THRESHOLD, hot_games=HOT_GAMES):
+        self.games = {}
+        self.next_id = 1
+        # game id -> live Game, least recently played first
+        self.hot = OrderedDict()
+        self.hot_games = hot_games
+        # game id -> set of writers, only for games somebody watches
+        self.watchers = {}
+        self.batch_threshold = batch_threshold
+        self.processes = processes
+        self.pool = None
+        self.moves_played = 0
+        # Wall time spent in request handlers, so a bench run in the same
+        # process can tell server time from client time
+        self.busy = 0.0
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _game(self, request):
+        game_id = request.get("game")
+        if game_id not in self.games:
+            raise ValueError(f"No such game: {game_id!r}")
+        return game_id, self.games[game_id]
+
+    def _live(self, game_id, hosted):
+        # Live Game for a hosted game, packing the coldest one if the hot set
+        # is full
+        if hosted.live is not None:
+            self.hot.move_to_end(game_id)
+            return hosted.live
+        if len(self.hot) >= self.hot_games:
+            cold_id, _ = self.hot.popitem(last=False)
+            self._pack(self.games[cold_id])
+        hosted.live = _rules_game(hosted.packed, hosted.keys)
+        self.hot[game_id] = hosted.live
+        return hosted.live
+
+    def _pack(self, hosted):
+        game = hosted.live
+        if game is not None:
+            hosted.packed = game.position.pack()
+            hosted.keys = array("Q", _trimmed_keys(game))
+            hosted.live = None
+
+    def new_game(self, fen=None):
+        position = Position.from_fen(fen) if fen else Position.starting()
+        game_id = self.next_id
+        self.next_id += 1
+        self.games[game_id] = HostedGame(position)
+        return game_id, position
+
+    def close_game(self, game_id):
+        self.games.pop(game_id)
+        self.hot.pop(game_id, None)
+        self.watchers.pop(game_id, None)
+
+    def play(self, game_id, ucis):
+        hosted = self.games[game_id]
+        game = self._live(game_id, hosted)
+        played, results = play_moves(game, game_id, ucis)
+        hosted.moves.extend(played)
+        self.moves_played += len(played)
+        if len(game.moves) >= LIVE_PLIES:
+            self._pack(hosted)
+            hosted.live = self.hot[game_id] = _rules_game(hosted.packed, hosted.keys)
+        return results
+
+    async def play_batch(self, pairs):
+        # Results in request order. Moves are grouped per game so each game's
+        # moves still run in order, in one worker call when the batch is large.
+        grouped = {}
+        for index, (game_id, uci) in enumerate(pairs):
+            grouped.setdefault(game_id, []).append((index, uci))
+        results = [None] * len(pairs)
+
+        def store(game_id, game_results):
+            for (index, _), result in zip(grouped[game_id], game_results):
+                results[index] = result
+
+        def missing(game_id, entries):
+            return [{"ok": False, "game": game_id, "move": uci, "error": f"No such game: {game_id!r}"} for _, uci in entries]
+
+        offload = len(pairs) >= self.batch_threshold and self.processes != 1
+        if not offload:
+            for game_id, entries in grouped.items():
+                if game_id in self.games:
+                    store(game_id, self.play(game_id, [uci for _, uci in entries]))
+                else:
+                    store(game_id, missing(game_id, entries))
+            return results
+
+        if self.pool is None:
+            # Spawned rather than forked, so workers don't inherit client
+            # sockets and keep them open after the server hangs up
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.processes or os.cpu_count(),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        loop = asyncio.get_running_loop()
+        jobs = []
+        for game_id, entries in grouped.items():
+            hosted = self.games.get(game_id)
+            if hosted is None:
+                store(game_id, missing(game_id, entries))
+                continue
+            self._pack(hosted)
+            self.hot.pop(game_id, None)
+            ucis = [uci for _, uci in entries]
+            future = loop.run_in_executor(self.pool, play_packed, game_id, hosted.packed, hosted.keys, ucis)
+            jobs.append((hosted, len(hosted.moves), ucis, future))
+
+        for hosted, version, ucis, future in jobs:
+            game_id, packed, keys, played, game_results = await future
+            if self.games.get(game_id) is not hosted:
+                store(game_id, missing(game_id, grouped[game_id]))
+            elif len(hosted.moves) != version or hosted.live is not None:
+                # Played on meanwhile; the worker's answer is stale
+                store(game_id, self.play(game_id, ucis))
+            else:
+                hosted.packed = packed
+                hosted.keys = keys
+                hosted.moves.extend(played)
+                self.moves_played += len(played)
+                store(game_id, game_results)
+        return results
+
+    def state(self, game_id):
+        hosted = self.games[game_id]
+        game = hosted.live or _rules_game(hosted.packed, hosted.keys)
+        return {
+            "game": game_id,
+            "fen": game.position.to_fen(),
+            "moves": [move_to_uci(move) for move in hosted.moves],
+            "turn": COLOR_NAMES[game.position.side_to_move],
+            "status": game.status(),
+        }
+
+    def broadcast(self, results, source):
+        for result in results:
+            writers = self.watchers.get(result["game"]) if result["ok"] else None
+            if writers:
+                line = json.dumps(dict(result, event="move")).encode() + b"\n"
+                for writer in writers:
+                    if writer is not source:
+                        writer.write(line)
+
+    async def handle_request(self, request, writer):
+        op = request.get("op")
+        if op == "move":
+            game_id, _ = self._game(request)
+            results = self.play(game_id, [request.get("move", "")])
+            self.broadcast(results, writer)
+            return results[0]
+        if op == "moves":
+            pairs = [(game_id, uci) for game_id, uci in request.get("moves", ())]
+            results = await self.play_batch(pairs)
+            self.broadcast(results, writer)
+            return {"ok": True, "results": results}
+        if op == "new":
+            game_id, position = self.new_game(request.get("fen"))
+            if request.get("watch"):
+                self.watchers.setdefault(game_id, set()).add(writer)
+            return {"ok": True, "game": game_id, "fen": position.to_fen()}
+        if op == "state":
+            game_id, _ = self._game(request)
+            return dict(self.state(game_id), ok=True)
+        if op == "watch":
+            game_id, _ = self._game(request)
+            self.watchers.setdefault(game_id, set()).add(writer)
+            return {"ok": True, "game": game_id}
+        if op == "unwatch":
+            game_id, _ = self._game(request)
+            self._unwatch(game_id, writer)
+            return {"ok": True, "game": game_id}
+        if op == "close":
+            game_id, _ = self._game(request)
+            self.close_game(game_id)
+            return {"ok": True, "game": game_id}
+        if op == "stats":
+            return {
+                "ok": True,
+                "games": len(self.games),
+                "hot": len(self.hot),
+                "moves": self.moves_played,
+                "busy": self.busy,
+            }
+        raise ValueError(f"Unknown op: {op!r}")
+
+    def _unwatch(self, game_id, writer):
+        writers = self.watchers.get(game_id)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.watchers[game_id]
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                started = time.perf_counter()
+                request = {}
+                try:
+                    request = json.loads(line)
+                    reply = await self.handle_request(request, writer)
+                except (ValueError, TypeError, AttributeError, KeyError) as error:
+                    reply = {"ok": False, "error": str(error)}
+                if isinstance(request, dict) and "id" in request:
+                    reply["id"] = request["id"]
+                writer.write(json.dumps(reply).encode() + b"\n")
+                self.busy += time.perf_counter() - started
+                if writer.transport.get_write_buffer_size() > LINE_LIMIT:
+                    await writer.drain()
+        finally:
+            for game_id in list(self.watchers):
+                self._unwatch(game_id, writer)
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0, unix=None):
+        if unix:
+            return await asyncio.start_unix_server(self.serve_client, unix, limit=LINE_LIMIT)
+        return await asyncio.start_server(self.serve_client, host, port, limit=LINE_LIMIT)
+
+
+class Client:
+    # asyncio client for the protocol above. Requests may be pipelined:
+    # replies come back in order, and "event" lines go to self.events.
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.pending = deque()
+        self.events = asyncio.Queue()
+        self.reading = asyncio.ensure_future(self._read())
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=0, unix=None):
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix, limit=LINE_LIMIT)
+        else:
+            reader, writer = await asyncio.open_connection(host, port, limit=LINE_LIMIT)
+        return cls(reader, writer)
+
+    async def _read(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if "event" in message:
+                self.events.put_nowait(message)
+            else:
+                self.pending.popleft().set_result(message)
+        for future in self.pending:
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    def send(self, op, **fields):
+        # Future of the reply; await it or gather several
+        fields["op"] = op
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        self.writer.write(json.dumps(fields).encode() + b"\n")
+        return future
+
+    async def request(self, op, **fields):
+        return await self.send(op, **fields)
+
+    async def close(self):
+        # Half-close and wait for the server to hang up, so every reply
+        # sent before is read
+        self.writer.write_eof()
+        await self.reading
+        self.writer.close()
+
+
+def random_games(count, max_plies=80, seed=0):
+    # UCI move lists of random legal games, the scripts the bench plays
+    rng = random.Random(seed)
+    games = []
+    for _ in range(count):
+        position = Position.starting()
+        ucis = []
+        for _ in range(max_plies):
+            moves = generate_legal_moves(position)
+            if not moves:
+                break
+            move = rng.choice(moves)
+            ucis.append(move_to_uci(move))
+            position.make_move(move)
+        games.append(ucis)
+    return games
+
+
+async def bench(args):
+    # Opens args.games sessions, then plays scripted moves on args.active of
+    # them at a time over args.connections pipelined connections
+    server = None
+    if args.port is None and args.unix is None:
+        server = GameServer(args.processes, args.batch_threshold)
+        listener = await server.start(unix=f"/tmp/chesscore-{os.getpid()}.sock")
+        address = {"unix": listener.sockets[0].getsockname()}
+    else:
+        address = {"host": args.host, "port": args.port, "unix": args.unix}
+    scripts = random_games(64, seed=args.seed)
+    clients = [await Client.connect(**address) for _ in range(args.connections)]
+
+    import tracemalloc
+
+    if server is not None:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+    sessions = []
+    for start in range(0, args.games, 1000):
+        replies = await asyncio.gather(*(
+            clients[i % len(clients)].send("new") for i in range(start, min(start + 1000, args.games))
+        ))
+        sessions.extend([reply["game"], i % len(scripts), 0] for i, reply in enumerate(replies, start))
+    if server is not None:
+        per_game = (tracemalloc.get_traced_memory()[0] - before) / max(args.games, 1)
+        tracemalloc.stop()
+
+    rng = random.Random(args.seed)
+    errors = played = 0
+    before = await clients[0].request("stats")
+    start_time = time.perf_counter()
+    # Idle-heavy load: a small active set plays every round, and a few of
+    # its sessions go idle each round in favour of others
+    active = rng.sample(sessions, min(args.active, len(sessions)))
+    while played < args.moves:
+        for _ in range(len(active) // 20):
+            session = rng.choice(sessions)
+            if session not in active:
+                active[rng.randrange(len(active))] = session
+        futures = []
+        pairs = []
+        for n, session in enumerate(active):
+            game_id, script, ply = session
+            if ply == len(scripts[script]):
+                # Finished: start over on a fresh game
+                client = clients[n % len(clients)]
+                await client.request("close", game=game_id)
+                session[0] = (await client.request("new"))["game"]
+                session[2] = ply = 0
+            pairs.append([session[0], scripts[script][ply]])
+            session[2] += 1
+        if args.batch:
+            for n in range(0, len(pairs), args.batch):
+                futures.append(clients[n // args.batch % len(clients)].send("moves", moves=pairs[n:n + args.batch]))
+            replies = [result for reply in await asyncio.gather(*futures) for result in reply["results"]]
+        else:
+            for n, (game_id, uci) in enumerate(pairs):
+                futures.append(clients[n % len(clients)].send("move", game=game_id, move=uci))
+            replies = await asyncio.gather(*futures)
+        played += len(replies)
+        errors += sum(not reply["ok"] for reply in replies)
+    seconds = time.perf_counter() - start_time
+
+    stats = await clients[0].request("stats")
+    for client in clients:
+        await client.close()
+    if server is not None:
+        server.close()
+        listener.close()
+        await listener.wait_closed()
+        os.unlink(address["unix"])
+        print(f"{args.games} games opened, {per_game:.0f} bytes per idle game")
+    rate = int(played / seconds) if seconds > 0 else 0
+    print(f"{played} moves, {errors} errors in {seconds:.2f}s ({rate} moves/s); server has {stats['games']} games")
+    busy = stats["busy"] - before["busy"]
+    served = stats["moves"] - before["moves"]
+    if busy > 0 and args.processes == 1:
+        print(f"server busy {busy:.2f}s for {served} moves ({int(served / busy)} moves/s of server time)")
+    return 1 if errors else 0
+
+
+async def serve(args):
+    server = GameServer(args.processes, args.batch_threshold)
+    listener = await server.start(args.host, args.port or 0, args.unix)
+    print(f"listening on {listener.sockets[0].getsockname()}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore server", description="Host many games over a JSON line protocol.")
+    parser.add_argument("command", nargs="?", choices=("serve", "bench"), default="serve")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="TCP port (serve defaults to any free port)")
+    parser.add_argument("--unix", help="Unix socket path instead of TCP")
+    parser.add_argument("--processes", "-j", type=int, default=1, help="worker processes for large batches, 0 for one per core")
+    parser.add_argument("--batch-threshold", type=int, default=BATCH_THRESHOLD)
+    bench_options = parser.add_argument_group("bench", "bench starts its own server unless --port or --unix is given")
+    bench_options.add_argument("--games", type=int, default=10000, help="sessions to open")
+    bench_options.add_argument("--active", type=int, default=500, help="sessions moving in each round")
+    bench_options.add_argument("--moves", type=int, default=50000, help="moves to play in total")
+    bench_options.add_argument("--connections", type=int, default=8)
+    bench_options.add_argument("--batch", type=int, default=0, help="send moves in batches of this size")
+    bench_options.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        return asyncio.run(bench(args) if args.command == "bench" else serve(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,520 @@
+import argparse
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .attacks import KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, bishop_attacks, queen_attacks, rook_attacks
+from .movegen import generate_legal_moves
+from .position import BISHOP, BLACK, KING, KNIGHT, PAWN, PIECE_SYMBOLS, QUEEN, ROOK, WHITE, Position, iter_squares, move_to_uci
+
+# Endgame tablebases for a king and up to two pieces against a lone king,
+# built by retrograde analysis. Every table is worked out with the strong
+# side as white; black-strong positions are probed through the colour flip.
+#
+# A table file is two byte arrays back to back, white to move then black to
+# move, indexed by a perfect hash of the canonical piece placement:
+#   index = ((king slot * 64 + black king) * 64 + piece 1) * 64 + piece 2
+# The king slot is the white king's square after the board symmetries have
+# brought it into the a1-d1-d4 triangle (10 slots), or onto files a-d when
+# pawns fix the board's orientation (32 slots). A byte is 0 for a draw, or
+# plies to mate + 1: white to move is always winning, black to move losing.
+
+PIECE_ORDER = (QUEEN, ROOK, BISHOP, KNIGHT, PAWN)
+MAX_PIECES = 2
+MAX_MEN = MAX_PIECES + 2
+EXTENSION = ".ctb"
+ESCAPE = 255
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+
+def _transform(sq, symmetry):
+    row, col = divmod(sq, 8)
+    if symmetry & 1:
+        col = 7 - col
+    if symmetry & 2:
+        row = 7 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+# SYMMETRIES[s][sq]: the square sq lands on under symmetry s; 0 and 1 (the
+# identity and the file mirror) are the ones that also hold with pawns
+SYMMETRIES = [[_transform(sq, symmetry) for sq in range(64)] for symmetry in range(8)]
+TRIANGLE = [sq for sq in range(64) if (sq & 7) <= 3 and (sq >> 3) <= (sq & 7)]
+QUEENSIDE = [sq for sq in range(64) if (sq & 7) <= 3]
+
+
+def material_name(kinds):
+    return "K" + "".join(PIECE_SYMBOLS[kind] for kind in sorted(kinds, key=PIECE_ORDER.index)) + "K"
+
+
+def parse_material(name):
+    name = name.upper()
+    if len(name) < 2 or name[0] != "K" or name[-1] != "K" or len(name) - 2 > MAX_PIECES:
+        raise ValueError(f"Unsupported material: {name!r}")
+    kinds = tuple(sorted((PIECE_SYMBOLS.index(letter) for letter in name[1:-1]), key=PIECE_ORDER.index))
+    if KING in kinds:
+        raise ValueError(f"Unsupported material: {name!r}")
+    return kinds
+
+
+def is_drawn_material(kinds):
+    # A lone minor piece (or nothing) can never mate
+    return not kinds or (len(kinds) == 1 and kinds[0] in (BISHOP, KNIGHT))
+
+
+def submaterials(kinds):
+    # Tables a position can leave for: a piece captured or a pawn promoted
+    found = set()
+    for i, kind in enumerate(kinds):
+        rest = kinds[:i] + kinds[i + 1:]
+        found.add(material_name(rest))
+        if kind == PAWN:
+            for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                found.add(material_name(rest + (promotion,)))
+    return sorted(name for name in found if not is_drawn_material(parse_material(name)))
+
+
+def piece_attacks(kind, sq, occupied):
+    if kind == KNIGHT:
+        return KNIGHT_ATTACKS[sq]
+    if kind == BISHOP:
+        return bishop_attacks(sq, occupied)
+    if kind == ROOK:
+        return rook_attacks(sq, occupied)
+    if kind == QUEEN:
+        return queen_attacks(sq, occupied)
+    return PAWN_ATTACKS[WHITE][sq]
+
+
+class Layout:
+    # Index arithmetic for one material set
+    def __init__(self, kinds):
+        self.kinds = kinds
+        self.name = material_name(kinds)
+        self.pawns = PAWN in kinds
+        self.count = len(kinds)
+        slots = QUEENSIDE if self.pawns else TRIANGLE
+        self.slot_of = [None] * 64
+        for slot, sq in enumerate(slots):
+            self.slot_of[sq] = slot
+        self.slot_squares = slots
+        # Symmetries taking each white king square into the slot area
+        candidates = (0, 1) if self.pawns else range(8)
+        self.symmetries = [
+            [symmetry for symmetry in candidates if self.slot_of[SYMMETRIES[symmetry][sq]] is not None]
+            for sq in range(64)
+        ]
+        self.same_kinds = self.count == 2 and kinds[0] == kinds[1]
+        self.stride = 64 ** (1 + self.count)
+        self.size = len(slots) * self.stride
+
+    def index(self, white_king, black_king, squares):
+        # Index of the canonical form: the smallest placement over every
+        # symmetry that puts the white king in the slot area
+        best = None
+        for symmetry in self.symmetries[white_king]:
+            table = SYMMETRIES[symmetry]
+            placed = [table[sq] for sq in squares]
+            if self.same_kinds and placed[0] > placed[1]:
+                placed.reverse()
+            key = (table[black_king], *placed)
+            if best is None or key < best:
+                best = key
+                king = table[white_king]
+        index = self.slot_of[king] * 64 + best[0]
+        for sq in best[1:]:
+            index = index * 64 + sq
+        return index
+
+    def squares(self, index):
+        # (white king, black king, piece squares) of a raw index
+        pieces = []
+        for _ in range(self.count):
+            index, sq = divmod(index, 64)
+            pieces.append(sq)
+        pieces.reverse()
+        slot, black_king = divmod(index, 64)
+        return self.slot_squares[slot], black_king, pieces
+
+    def white_attacks(self, white_king, squares, occupied, skip=None):
+        attacks = KING_ATTACKS[white_king]
+        for i, sq in enumerate(squares):
+            if i != skip:
+                attacks |= piece_attacks(self.kinds[i], sq, occupied)
+        return attacks
+
+    def is_valid(self, index, white_to_move):
+        # Legal, canonical placements; everything else is never visited
+        white_king, black_king, squares = self.squares(index)
+        occupied = (1 << white_king) | (1 << black_king)
+        for i, sq in enumerate(squares):
+            if occupied & (1 << sq):
+                return False
+            if self.kinds[i] == PAWN and not 8 <= sq < 56:
+                return False
+            occupied |= 1 << sq
+        if KING_ATTACKS[white_king] & (1 << black_king):
+            return False
+        if white_to_move and self.white_attacks(white_king, squares, occupied) & (1 << black_king):
+            return False
+        return self.index(white_king, black_king, squares) == index
+
+
+class Tablebase:
+    # Probes the table files in a directory, mapping each one the first time
+    # its material comes up. Lookups are a few index operations and a read.
+    max_men = MAX_MEN
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table[1].close()
+                table[2].close()
+        self.tables.clear()
+
+    def table(self, name):
+        if name not in self.tables:
+            path = os.path.join(self.directory, name + EXTENSION)
+            layout = Layout(parse_material(name))
+            try:
+                file = open(path, "rb")
+            except FileNotFoundError:
+                self.tables[name] = None
+            else:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                if len(data) != 2 * layout.size:
+                    raise ValueError(f"{path}: wrong size for {name}")
+                self.tables[name] = (layout, data, file)
+        return self.tables[name]
+
+    def has_table(self, name):
+        return self.table(name) is not None
+
+    def probe_squares(self, kinds, white_king, black_king, squares, white_to_move):
+        # (result for the side to move, plies to mate) with white as the
+        # strong side, or None without a table. squares follow kinds.
+        if is_drawn_material(kinds):
+            return DRAW, 0
+        table = self.table(material_name(kinds))
+        if table is None:
+            return None
+        layout, data, _ = table
+        order = sorted(range(len(kinds)), key=lambda i: PIECE_ORDER.index(kinds[i]))
+        index = layout.index(white_king, black_king, [squares[i] for i in order])
+        value = data[index if white_to_move else layout.size + index]
+        if not value:
+            return DRAW, 0
+        return (WIN if white_to_move else LOSS), value - 1
+
+    def probe(self, position):
+        # (WIN/DRAW/LOSS for the side to move, plies to mate), or None when
+        # the position is outside the tables
+        pieces = position.pieces
+        white, black = position.occupied
+        if position.castling or bin(white | black).count("1") > MAX_MEN:
+            return None
+        if white == pieces[KING]:
+            strong = BLACK
+        elif black == pieces[6 + KING]:
+            strong = WHITE
+        else:
+            return None
+
+        # Flip colours so the strong side is white
+        flip = 56 if strong == BLACK else 0
+        kinds = []
+        squares = []
+        base = strong * 6
+        for kind in PIECE_ORDER:
+            for sq in iter_squares(pieces[base + kind]):
+                kinds.append(kind)
+                squares.append(sq ^ flip)
+        if len(kinds) > MAX_PIECES:
+            return None
+        return self.probe_squares(
+            tuple(kinds),
+            position.king_squares[strong] ^ flip,
+            position.king_squares[strong ^ 1] ^ flip,
+            squares,
+            position.side_to_move == strong,
+        )
+
+    def best_move(self, position):
+        # (move, result, plies) of the fastest win, any draw, or the slowest
+        # loss, or None outside the tables
+        if self.probe(position) is None:
+            return None
+        best = None
+        for move in generate_legal_moves(position):
+            undo = position.make_move(move)
+            result = self.probe(position)
+            if result is None:
+                # Left the tables, e.g. an underpromotion to two minor pieces
+                position.unmake_move(move, undo)
+                continue
+            if not generate_legal_moves(position):
+                result = (LOSS, 0) if result[0] == LOSS else (DRAW, 0)
+            position.unmake_move(move, undo)
+            outcome, plies = -result[0], result[1] + 1
+            rank = (outcome, -plies if outcome == WIN else plies)
+            if best is None or rank > best[0]:
+                best = (rank, move, outcome, plies if outcome else 0)
+        if best is None:
+            return None
+        return best[1], best[2], best[3]
+
+
+def _scan_slot(kinds, directory, slot):
+    # First pass over one white king slot: move counts and mates for black
+    # to move, and moves that leave the table for both sides
+    layout = Layout(kinds)
+    tablebase = Tablebase(directory)
+    first = slot * layout.stride
+    counters = bytearray(layout.stride)
+    mates = []
+    black_exits = []
+    white_exits = []
+
+    for offset in range(layout.stride):
+        index = first + offset
+        white_king, black_king, squares = layout.squares(index)
+
+        if layout.is_valid(index, False):
+            white_bits = 1 << white_king
+            for sq in squares:
+                white_bits |= 1 << sq
+            in_check = layout.white_attacks(white_king, squares, white_bits) & (1 << black_king)
+            successors = set()
+            exits = []
+            escape = False
+            for target in iter_squares(KING_ATTACKS[black_king] & ~(1 << white_king)):
+                captured = squares.index(target) if white_bits & (1 << target) else None
+                remaining = white_bits & ~(1 << target)
+                if layout.white_attacks(white_king, squares, remaining, captured) & (1 << target):
+                    continue
+                if captured is None:
+                    successors.add(layout.index(white_king, target, squares))
+                    continue
+                rest = kinds[:captured] + kinds[captured + 1:]
+                result = tablebase.probe_squares(rest, white_king, target, squares[:captured] + squares[captured + 1:], True)
+                if result is None:
+                    raise RuntimeError(f"{material_name(rest)} must be built before {layout.name}")
+                if result[0] == DRAW:
+                    escape = True
+                else:
+                    exits.append((result[1], index))
+            if escape:
+                counters[offset] = ESCAPE
+            elif successors or exits:
+                counters[offset] = len(successors) + len(exits)
+                black_exits.extend(exits)
+            elif in_check:
+                mates.append(index)
+            else:
+                counters[offset] = ESCAPE
+
+        if layout.pawns and layout.is_valid(index, True):
+            occupied = (1 << white_king) | (1 << black_king)
+            for sq in squares:
+                occupied |= 1 << sq
+            for i, sq in enumerate(squares):
+                if kinds[i] != PAWN or sq < 48 or occupied & (1 << (sq + 8)):
+                    continue
+                for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                    promoted = kinds[:i] + (promotion,) + kinds[i + 1:]
+                    placed = squares[:i] + [sq + 8] + squares[i + 1:]
+                    result = tablebase.probe_squares(promoted, white_king, black_king, placed, False)
+                    if result is None:
+                        raise RuntimeError(f"{material_name(promoted)} must be built before {layout.name}")
+                    if result[0] == LOSS:
+                        white_exits.append((result[1] + 1, index))
+
+    tablebase.close()
+    return slot, bytes(counters), mates, black_exits, white_exits
+
+
+def _white_unmoves(layout, index):
+    # White to move positions one white move before a black to move one
+    white_king, black_king, squares = layout.squares(index)
+    occupied = (1 << white_king) | (1 << black_king)
+    for sq in squares:
+        occupied |= 1 << sq
+    empty = ~occupied
+    black_king_bit = 1 << black_king
+    found = set()
+
+    for origin in iter_squares(KING_ATTACKS[white_king] & empty & ~KING_ATTACKS[black_king]):
+        if not layout.white_attacks(origin, squares, occupied ^ (1 << white_king) ^ (1 << origin)) & black_king_bit:
+            found.add(layout.index(origin, black_king, squares))
+
+    for i, sq in enumerate(squares):
+        kind = layout.kinds[i]
+        if kind == PAWN:
+            origins = 0
+            if sq >= 16 and empty & (1 << (sq - 8)):
+                origins = 1 << (sq - 8)
+                if 24 <= sq < 32 and empty & (1 << (sq - 16)):
+                    origins |= 1 << (sq - 16)
+        else:
+            origins = piece_attacks(kind, sq, occupied) & empty
+        for origin in iter_squares(origins):
+            moved = squares[:i] + [origin] + squares[i + 1:]
+            if not layout.white_attacks(white_king, moved, occupied ^ (1 << sq) ^ (1 << origin)) & black_king_bit:
+                found.add(layout.index(white_king, black_king, moved))
+    return found
+
+
+def _black_unmoves(layout, index):
+    # Black to move positions one black king move before a white to move one
+    white_king, black_king, squares = layout.squares(index)
+    occupied = 1 << white_king
+    for sq in squares:
+        occupied |= 1 << sq
+    return {
+        layout.index(white_king, origin, squares)
+        for origin in iter_squares(KING_ATTACKS[black_king] & ~occupied & ~KING_ATTACKS[white_king])
+    }
+
+
+def generate_table(name, directory, processes=1, out=None):
+    # Builds one table from its subtables, which must already be on disk
+    kinds = parse_material(name)
+    layout = Layout(kinds)
+    white = bytearray(layout.size)
+    black = bytearray(layout.size)
+    counters = bytearray(layout.size)
+    black_events = {}
+    white_events = {}
+    losses = []
+
+    slots = range(len(layout.slot_squares))
+    if processes == 1:
+        scans = map(_scan_slot, [kinds] * len(slots), [directory] * len(slots), slots)
+    else:
+        pool = ProcessPoolExecutor(max_workers=processes or os.cpu_count())
+        scans = pool.map(_scan_slot, [kinds] * len(slots), [directory] * len(slots), slots)
+    for slot, slot_counters, mates, black_exits, white_exits in scans:
+        counters[slot * layout.stride:(slot + 1) * layout.stride] = slot_counters
+        losses.extend(mates)
+        for plies, index in black_exits:
+            black_events.setdefault(plies, []).append(index)
+        for plies, index in white_exits:
+            white_events.setdefault(plies, []).append(index)
+    if processes != 1:
+        pool.shutdown()
+
+    # Backward induction, one move pair per round: every white position one
+    # move before a loss wins, and a black position whose last escape has
+    # just turned into a white win is lost
+    for index in losses:
+        black[index] = 1
+    plies = 0
+    while losses or any(key > plies for key in black_events) or any(key > plies for key in white_events):
+        wins = []
+        for index in losses:
+            for previous in _white_unmoves(layout, index):
+                if not white[previous]:
+                    white[previous] = plies + 2
+                    wins.append(previous)
+        for index in white_events.pop(plies + 1, ()):
+            if not white[index]:
+                white[index] = plies + 2
+                wins.append(index)
+
+        losses = []
+        for index in wins:
+            for previous in _black_unmoves(layout, index):
+                count = counters[previous]
+                if count != ESCAPE and not black[previous]:
+                    counters[previous] = count - 1
+                    if count == 1:
+                        black[previous] = plies + 3
+                        losses.append(previous)
+        for index in black_events.pop(plies + 1, ()):
+            count = counters[index]
+            counters[index] = count - 1
+            if count == 1:
+                black[index] = plies + 3
+                losses.append(index)
+        plies += 2
+        if plies + 3 > ESCAPE:
+            raise RuntimeError(f"{name}: mates longer than a table byte holds")
+
+    path = os.path.join(directory, name + EXTENSION)
+    with open(path + ".tmp", "wb") as file:
+        file.write(white)
+        file.write(black)
+    os.replace(path + ".tmp", path)
+    if out is not None:
+        print(f"{name}: longest mate {max(max(white), max(black)) - 1} plies", file=out)
+    return path
+
+
+def build_tables(names, directory, processes=1, out=None):
+    # Builds each table and, first, any subtable it needs that is missing
+    os.makedirs(directory, exist_ok=True)
+    built = []
+
+    def build(name):
+        name = material_name(parse_material(name))
+        if name in built or is_drawn_material(parse_material(name)):
+            return
+        for sub in submaterials(parse_material(name)):
+            build(sub)
+        if not os.path.exists(os.path.join(directory, name + EXTENSION)):
+            generate_table(name, directory, processes, out)
+        built.append(name)
+
+    for name in names:
+        build(name)
+    return built
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore tablebase", description="Build or probe endgame tablebases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="generate tables, with any subtables they need")
+    build.add_argument("materials", nargs="+", help="e.g. KQK KRK KPK KBNK")
+    build.add_argument("--dir", default="tablebases")
+    build.add_argument("--processes", "-j", type=int, default=1, help="worker processes, 0 for one per core")
+    probe = commands.add_parser("probe", help="look a position up")
+    probe.add_argument("fen")
+    probe.add_argument("--dir", default="tablebases")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        build_tables(args.materials, args.dir, args.processes, sys.stdout)
+        print(f"done in {time.perf_counter() - start:.1f}s")
+        return 0
+
+    position = Position.from_fen(args.fen)
+    tablebase = Tablebase(args.dir)
+    result = tablebase.probe(position)
+    if result is None:
+        print("not in the tables")
+        return 1
+    outcome, plies = result
+    if outcome == DRAW:
+        print("draw")
+    else:
+        print(f"{'win' if outcome == WIN else 'loss'} for the side to move, mate in {plies} plies")
+    best = tablebase.best_move(position)
+    if best is not None:
+        print(f"best move {move_to_uci(best[0])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,466 @@
+import argparse
+import csv
+import math
+import multiprocessing
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .game import Game
+from .movegen import parse_uci_move
+from .pgn import read_games, replay
+from .position import COLOR_NAMES, KING, WHITE, Position, iter_squares, move_to_uci
+from .search import SearchLimits, Searcher
+from .tablebase import is_drawn_material
+from .uci import time_budget
+
+# Engine-vs-engine matches for telling whether a change plays stronger.
+# Every opening is played twice with the colors swapped, the games run
+# across a process pool, each result is written to the results file as it
+# comes in, and a sequential probability ratio test ends the match as soon
+# as the score is conclusive.
+
+DEFAULT_TC = "2+0.02"
+# Plies after which a game still going is called a draw
+MAX_PLIES = 400
+# Random plies played from the start position when no openings are given
+RANDOM_OPENING_PLIES = 6
+# Games of each result added to the score variance the SPRT uses
+LLR_PRIOR = 0.5
+ENGINE_OPTIONS = ("depth", "nodes", "hash", "book", "tablebases", "cmd")
+RESULT_COLUMNS = ("game", "white", "black", "result", "reason", "plies", "seconds", "opening", "moves")
+
+# An engine is either a Searcher built from these settings, or an outside
+# UCI engine started with command
+EngineSpec = namedtuple(
+    "EngineSpec",
+    "name depth nodes hash book tablebases command",
+    defaults=(None, None, 16, None, None, None),
+)
+
+GameRecord = namedtuple("GameRecord", "number white black result reason plies seconds opening moves")
+
+
+def parse_engine(text, default_name):
+    # "[name:]key=value,..." with keys from ENGINE_OPTIONS; cmd takes the
+    # rest of the text, so a command line may contain commas
+    name, _, options = text.partition(":") if ":" in text.split("=")[0] else ("", "", text)
+    options, _, command = options.partition("cmd=")
+    settings = {}
+    for item in filter(None, options.split(",")):
+        key, _, value = item.partition("=")
+        if key not in ENGINE_OPTIONS:
+            raise ValueError(f"Unknown engine option: {key!r}")
+        settings[key] = int(value) if key in ("depth", "nodes", "hash") else value
+    return EngineSpec(name or default_name, command=command.strip() or None, **settings)
+
+
+def parse_time_control(text):
+    # "base+increment" in seconds, or None for "none"
+    if text.lower() == "none":
+        return None
+    base, _, increment = text.partition("+")
+    return float(base), float(increment or 0)
+
+
+class SearcherPlayer:
+    def __init__(self, spec):
+        book = tablebase = None
+        if spec.book:
+            from .book import OpeningBook
+
+            book = OpeningBook(spec.book)
+        if spec.tablebases:
+            from .tablebase import Tablebase
+
+            tablebase = Tablebase(spec.tablebases)
+        self.spec = spec
+        self.searcher = Searcher(tt_size_mb=spec.hash, book=book, tablebase=tablebase)
+
+    def new_game(self):
+        self.searcher.tt.clear()
+
+    def choose(self, game, clock):
+        # clock is (wtime, btime, winc, binc) in milliseconds, or None
+        budget = None
+        if clock is not None:
+            side = game.position.side_to_move
+            budget = time_budget(clock[side], clock[side + 2])
+        limits = SearchLimits(depth=self.spec.depth, nodes=self.spec.nodes, movetime=budget)
+        return self.searcher.search(game.position, limits, game.key_history).move or None
+
+
+class UCIPlayer:
+    # An outside engine over UCI, started once per worker process
+    def __init__(self, spec):
+        self.spec = spec
+        self.process = subprocess.Popen(
+            shlex.split(spec.command), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.send("uci")
+        self.read_until("uciok")
+        self.send(f"setoption name Hash value {spec.hash}")
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def read_until(self, prefix):
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"engine {self.spec.name} exited")
+            if line.startswith(prefix):
+                return line.split()
+
+    def new_game(self):
+        self.send("ucinewgame")
+        self.send("isready")
+        self.read_until("readyok")
+
+    def choose(self, game, clock):
+        moves = " ".join(move_to_uci(move) for move in game.moves)
+        self.send(f"position fen {game.start_position.to_fen()} moves {moves}")
+        if clock is not None:
+            self.send("go wtime {} btime {} winc {} binc {}".format(*clock))
+        elif self.spec.nodes:
+            self.send(f"go nodes {self.spec.nodes}")
+        else:
+            self.send(f"go depth {self.spec.depth or 4}")
+        tokens = self.read_until("bestmove")
+        try:
+            return parse_uci_move(game.position, tokens[1], game.legal_moves())
+        except (IndexError, ValueError):
+            return None
+
+
+# Players and tablebases of this process, built on first use and kept for
+# every game it plays
+_players = {}
+_tablebases = {}
+
+
+def _player(spec):
+    player = _players.get(spec)
+    if player is None:
+        player = _players[spec] = UCIPlayer(spec) if spec.command else SearcherPlayer(spec)
+    return player
+
+
+def _tablebase(path):
+    if path not in _tablebases:
+        from .tablebase import Tablebase
+
+        _tablebases[path] = Tablebase(path)
+    return _tablebases[path]
+
+
+def adjudicate(game, tablebase=None, max_plies=MAX_PLIES):
+    # (result, reason) once the game is decided, or None while it goes on
+    position = game.position
+    color = COLOR_NAMES[position.side_to_move]
+    loss, win = ("0-1", "1-0") if position.side_to_move == WHITE else ("1-0", "0-1")
+    if game.is_checkmate(color):
+        return loss, "checkmate"
+    if game.is_stalemate(color):
+        return "1/2-1/2", "stalemate"
+    if game.is_threefold_repetition():
+        return "1/2-1/2", "repetition"
+    if position.halfmove_clock >= 100:
+        return "1/2-1/2", "fifty moves"
+    kinds = [piece % 6 for piece, bitboard in enumerate(position.pieces) if piece % 6 != KING for _ in iter_squares(bitboard)]
+    if is_drawn_material(kinds):
+        return "1/2-1/2", "insufficient material"
+    if tablebase is not None:
+        hit = tablebase.probe(position)
+        if hit is not None:
+            outcome = hit[0]
+            if not outcome:
+                return "1/2-1/2", "tablebase"
+            return (win if outcome > 0 else loss), "tablebase"
+    if len(game.moves) >= max_plies:
+        return "1/2-1/2", "move limit"
+    return None
+
+
+def play_game(number, opening, white, black, time_control=None, tablebase_path=None, max_plies=MAX_PLIES):
+    # Plays one game and returns its GameRecord; runs in a pool worker
+    game = Game(Position.from_fen(opening))
+    players = (_player(white), _player(black))
+    for player in players:
+        player.new_game()
+    tablebase = _tablebase(tablebase_path) if tablebase_path else None
+    clock = None
+    if time_control is not None:
+        base, increment = time_control
+        clock = [base * 1000, base * 1000, increment * 1000, increment * 1000]
+    start = time.perf_counter()
+    while True:
+        decided = adjudicate(game, tablebase, max_plies)
+        if decided is not None:
+            result, reason = decided
+            break
+        side = game.position.side_to_move
+        thinking = time.perf_counter()
+        move = players[side].choose(game, None if clock is None else [int(value) for value in clock])
+        if clock is not None:
+            clock[side] -= (time.perf_counter() - thinking) * 1000
+            if clock[side] < 0:
+                result, reason = ("0-1" if side == WHITE else "1-0"), "time"
+                break
+            clock[side] += clock[side + 2]
+        if move is None:
+            result, reason = ("0-1" if side == WHITE else "1-0"), "illegal move"
+            break
+        game.make_move(move)
+    return GameRecord(
+        number,
+        white.name,
+        black.name,
+        result,
+        reason,
+        len(game.moves),
+        round(time.perf_counter() - start, 3),
+        opening,
+        " ".join(move_to_uci(move) for move in game.moves),
+    )
+
+
+def random_openings(count, plies=RANDOM_OPENING_PLIES, rng=None):
+    # FENs reached by random legal moves from the start position
+    rng = rng or random.Random()
+    openings = []
+    while len(openings) < count:
+        game = Game()
+        for _ in range(plies):
+            moves = game.legal_moves()
+            if not moves:
+                break
+            game.make_move(rng.choice(moves))
+        else:
+            openings.append(game.position.to_fen())
+    return openings
+
+
+def load_openings(path):
+    # The end position of every good game in a PGN file, or one FEN or EPD
+    # per line of any other file
+    if path.endswith(".pgn"):
+        openings = []
+        for pgn_game in read_games(path):
+            if pgn_game.error is None:
+                game = Game()
+                replay(game, pgn_game)
+                openings.append(game.position.to_fen())
+        return openings
+    openings = []
+    with open(path) as file:
+        for line in file:
+            fields = line.split(";")[0].split()
+            if len(fields) >= 4:
+                # EPD lines stop after the en passant square
+                fen = " ".join(fields[:6]) if len(fields) >= 6 and fields[4].isdigit() else " ".join(fields[:4]) + " 0 1"
+                openings.append(Position.from_fen(fen).to_fen())
+    return openings
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_from_score(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return 400 * math.log10(score / (1 - score))
+
+
+class MatchScore:
+    # Wins, draws and losses of the first engine, with the Elo difference
+    # and the SPRT log-likelihood ratio they give
+    def __init__(self):
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, record, first):
+        if record.result == "1/2-1/2":
+            self.draws += 1
+        elif (record.result == "1-0") == (record.white == first):
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.5
+
+    def variance(self, prior=0.0):
+        # Per game variance of the score, counting prior extra games of
+        # each result
+        games = self.games + 3 * prior
+        if not games:
+            return 0.0
+        wins, draws, losses = self.wins + prior, self.draws + prior, self.losses + prior
+        score = (wins + draws / 2) / games
+        return (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+
+    def elo(self):
+        # (Elo difference, 95% error margin)
+        score = self.score()
+        if not self.games:
+            return 0.0, math.inf
+        spread = 1.96 * math.sqrt(self.variance() / self.games)
+        low, high = elo_from_score(score - spread), elo_from_score(score + spread)
+        margin = (high - low) / 2 if math.isfinite(high - low) else math.inf
+        return elo_from_score(score), margin
+
+    def llr(self, elo0, elo1):
+        # Normal approximation of the trinomial log-likelihood ratio of
+        # H1 (elo1) against H0 (elo0). The variance is taken with LLR_PRIOR
+        # games of each result added, so a run of wins or losses alone
+        # still moves the ratio instead of leaving it at zero.
+        variance = self.variance(LLR_PRIOR)
+        score0, score1 = expected_score(elo0), expected_score(elo1)
+        return (score1 - score0) * (2 * self.score() - score0 - score1) * self.games / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def play_match(first, second, openings, games, time_control=None, processes=1, tablebase_path=None, max_plies=MAX_PLIES):
+    # Generator of GameRecords in the order they finish. Game 2k plays
+    # opening k with first as white, game 2k + 1 swaps the colors. Closing
+    # the generator cancels the games not yet started.
+    def tasks():
+        for number in range(games):
+            opening = openings[number // 2 % len(openings)]
+            white, black = (first, second) if number % 2 == 0 else (second, first)
+            yield number, opening, white, black, time_control, tablebase_path, max_plies
+
+    if processes == 1:
+        for task in tasks():
+            yield play_game(*task)
+        return
+
+    workers = processes or os.cpu_count()
+    # Spawned rather than forked, so workers start without the parent's
+    # open files and UCI engine pipes
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    pending = set()
+    try:
+        for task in tasks():
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(play_game, *task))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def format_score(score, first, second, bounds=None, llr=None):
+    elo, margin = score.elo()
+    line = (
+        f"{score.games} games {first} vs {second}: +{score.wins} -{score.losses} ={score.draws} "
+        f"score {score.score() * 100:.1f}% elo {elo:+.1f} +/- {margin:.1f}"
+    )
+    if bounds is not None:
+        line += f" LLR {llr:.2f} [{bounds[0]:.2f}, {bounds[1]:.2f}]"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore tournament", description="Play two engines against each other.")
+    parser.add_argument(
+        "--engine",
+        action="append",
+        default=[],
+        help="[name:]key=value,... with depth, nodes, hash, book, tablebases, or cmd=COMMAND for a UCI engine; given twice",
+    )
+    parser.add_argument("--games", type=int, default=100, help="games to play at most")
+    parser.add_argument("--tc", default=DEFAULT_TC, help="time control base+increment in seconds, or none")
+    parser.add_argument("--openings", help="PGN, EPD or FEN file of start positions, shuffled")
+    parser.add_argument("--seed", type=int, help="seed for the opening order")
+    parser.add_argument("--tablebases", help="directory of endgame tables to adjudicate with")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="plies after which a game is drawn")
+    parser.add_argument("--results", default="tournament.csv", help="file every game is written to as it ends")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"), help="stop once H0 or H1 is accepted")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--report", type=int, default=10, help="print the score every N games")
+    parser.add_argument("--processes", "-j", type=int, default=1, help="worker processes, 0 for one per core")
+    args = parser.parse_args(argv)
+
+    if len(args.engine) != 2:
+        parser.error("--engine must be given twice")
+    first, second = (parse_engine(text, f"engine{i + 1}") for i, text in enumerate(args.engine))
+    if first.name == second.name:
+        parser.error("the engines need different names")
+    time_control = parse_time_control(args.tc)
+    if time_control is None and not all(spec.depth or spec.nodes or spec.command for spec in (first, second)):
+        parser.error("without a time control every engine needs depth or nodes")
+
+    rng = random.Random(args.seed)
+    if args.openings:
+        openings = load_openings(args.openings)
+        if not openings:
+            parser.error(f"no openings in {args.openings}")
+    else:
+        openings = random_openings((args.games + 1) // 2, rng=rng)
+    rng.shuffle(openings)
+
+    score = MatchScore()
+    bounds = llr = None
+    if args.sprt:
+        bounds = sprt_bounds(args.alpha, args.beta)
+    verdict = None
+    start = time.perf_counter()
+    with open(args.results, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(RESULT_COLUMNS)
+        records = play_match(
+            first, second, openings, args.games, time_control, args.processes, args.tablebases, args.max_plies
+        )
+        for record in records:
+            writer.writerow(record)
+            file.flush()
+            score.add(record, first.name)
+            if args.sprt:
+                llr = score.llr(*args.sprt)
+                if llr <= bounds[0]:
+                    verdict = f"H0 accepted (elo <= {args.sprt[0]:g})"
+                elif llr >= bounds[1]:
+                    verdict = f"H1 accepted (elo >= {args.sprt[1]:g})"
+            if verdict or score.games % args.report == 0:
+                print(format_score(score, first.name, second.name, bounds, llr), flush=True)
+            if verdict:
+                records.close()
+                break
+
+    seconds = time.perf_counter() - start
+    if score.games % args.report and not verdict:
+        print(format_score(score, first.name, second.name, bounds, llr))
+    rate = score.games * 60 / seconds if seconds > 0 else 0
+    print(f"{score.games} games in {seconds:.1f}s ({rate:.0f} games/min), results in {args.results}")
+    if verdict:
+        print(f"SPRT: {verdict}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
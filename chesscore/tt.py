@@ -0,0 +1,110 @@
+from array import array
+
+EXACT = 1
+LOWER_BOUND = 2
+UPPER_BOUND = 3
+
+# Each slot is two 64-bit words: the position key XOR the packed entry, and
+# the packed entry itself. Storing the XOR means a slot torn by two processes
+# writing at once simply fails to match on probe.
+#   bits  0-16  move
+#   bits 17-24  depth
+#   bits 25-26  bound type
+#   bits 27-46  score, offset by SCORE_OFFSET
+#   bits 47-54  search generation
+SLOT_BYTES = 16
+BUCKET_SLOTS = 2
+SCORE_OFFSET = 1 << 19
+
+_MOVE_MASK = (1 << 17) - 1
+_SCORE_MASK = (1 << 20) - 1
+
+
+def pack_entry(move, depth, flag, score, generation):
+    score = max(-SCORE_OFFSET + 1, min(SCORE_OFFSET - 1, score))
+    return (
+        (move & _MOVE_MASK)
+        | (max(0, min(depth, 255)) << 17)
+        | (flag << 25)
+        | ((score + SCORE_OFFSET) << 27)
+        | ((generation & 255) << 47)
+    )
+
+
+def unpack_entry(data):
+    return (
+        data & _MOVE_MASK,
+        (data >> 17) & 255,
+        (data >> 25) & 3,
+        ((data >> 27) & _SCORE_MASK) - SCORE_OFFSET,
+    )
+
+
+class TranspositionTable:
+    # Buckets of two slots: the first keeps the deepest result seen for the
+    # current search, the second always takes the newest result. slots may be
+    # any writable sequence of 64-bit words, e.g. a view of shared memory.
+    def __init__(self, size_mb=16, slots=None):
+        if slots is None:
+            buckets = max(1, (size_mb << 20) // (SLOT_BYTES * BUCKET_SLOTS))
+            slots = array("Q", bytes(buckets * BUCKET_SLOTS * SLOT_BYTES))
+        self.buckets = len(slots) // (BUCKET_SLOTS * 2)
+        self.slots = slots
+        self.generation = 0
+
+    @property
+    def size_mb(self):
+        return self.buckets * BUCKET_SLOTS * SLOT_BYTES / (1 << 20)
+
+    def clear(self):
+        self.slots[:] = array("Q", bytes(len(self.slots) * 8))
+        self.generation = 0
+
+    def new_search(self, generation=None):
+        if generation is None:
+            generation = self.generation + 1
+        self.generation = generation & 255
+
+    def probe(self, key):
+        slots = self.slots
+        index = (key % self.buckets) * BUCKET_SLOTS * 2
+        data = slots[index + 1]
+        if data and slots[index] ^ data == key:
+            return unpack_entry(data)
+        data = slots[index + 3]
+        if data and slots[index + 2] ^ data == key:
+            return unpack_entry(data)
+        return None
+
+    def store(self, key, move, depth, flag, score):
+        slots = self.slots
+        index = (key % self.buckets) * BUCKET_SLOTS * 2
+        data = pack_entry(move, depth, flag, score, self.generation)
+
+        stored = slots[index + 1]
+        same_key = slots[index] ^ stored == key
+        if (
+            same_key
+            or not stored
+            or depth >= (stored >> 17) & 255
+            or (stored >> 47) & 255 != self.generation
+        ):
+            # Keep the old move if the new result has none
+            if same_key and not move:
+                data |= stored & _MOVE_MASK
+            slots[index] = key ^ data
+            slots[index + 1] = data
+        else:
+            slots[index + 2] = key ^ data
+            slots[index + 3] = data
+
+    def hashfull(self):
+        # Permille of depth-preferred slots filled in the current search,
+        # sampled from the first thousand buckets as UCI engines do
+        sample = min(self.buckets, 1000)
+        used = 0
+        for bucket in range(sample):
+            data = self.slots[bucket * BUCKET_SLOTS * 2 + 1]
+            if data and (data >> 47) & 255 == self.generation:
+                used += 1
+        return used * 1000 // sample
@@ -0,0 +1,297 @@
+import argparse
+import sys
+import threading
+import time
+
+from .game import Game
+from .movegen import parse_uci_move
+from .position import WHITE, Position, move_to_uci
+from .search import SearchLimits, Searcher, mate_in
+
+# Universal Chess Interface on stdin/stdout, so the engine can be run under
+# tournament managers and GUIs. The main thread only reads commands; every
+# search runs on a worker thread, which is how "stop", "ponderhit" and
+# "isready" are answered at once while it thinks.
+
+ENGINE_NAME = "chesscore"
+ENGINE_AUTHOR = "bentonah"
+# Milliseconds kept back from every move for the GUI and the pipe
+MOVE_OVERHEAD = 50
+# Moves the remaining time is spread over when the GUI gives no movestogo
+DEFAULT_MOVES_TO_GO = 30
+GO_INTEGERS = ("wtime", "btime", "winc", "binc", "movestogo", "depth", "nodes", "movetime")
+
+
+def time_budget(remaining, increment=0, moves_to_go=None):
+    # Seconds to think with remaining and increment in milliseconds
+    budget = remaining / (moves_to_go or DEFAULT_MOVES_TO_GO) + increment * 3 / 4
+    budget = min(budget, remaining - MOVE_OVERHEAD)
+    return max(budget, 10) / 1000
+
+
+def format_info(result):
+    mate = mate_in(result.score)
+    score = f"mate {mate}" if mate is not None else f"cp {result.score}"
+    pv = " ".join(move_to_uci(move) for move in result.pv)
+    return (
+        f"info depth {result.depth} score {score} nodes {result.nodes} nps {result.nps} "
+        f"time {int(result.seconds * 1000)} pv {pv}"
+    )
+
+
+class UCIEngine:
+    def __init__(self, output=None, hash_mb=16, threads=1, book_path=None, tablebase_path=None):
+        self.output = output or sys.stdout
+        self.output_lock = threading.Lock()
+        self.hash_mb = hash_mb
+        self.threads = threads
+        self.book_path = book_path
+        self.tablebase_path = tablebase_path
+        self.searcher = None
+        self.game = Game()
+        self.thread = None
+        # Set once the GUI allows a bestmove: at once for a normal go, on
+        # stop or ponderhit for go ponder and go infinite
+        self.released = threading.Event()
+        self.pondering = False
+        # Seconds to think once a ponder search becomes a real one, and the
+        # deadline that gives at ponderhit
+        self.ponder_budget = None
+        self.ponder_deadline = None
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def main_searcher(self):
+        # The Searcher whose deadline rules the search, also under Lazy SMP
+        return getattr(self.searcher, "searcher", self.searcher)
+
+    def build_searcher(self):
+        self.close_searcher()
+        book = tablebase = None
+        if self.book_path:
+            from .book import OpeningBook
+
+            # A book that will not open is reported and played without,
+            # rather than ending the engine
+            try:
+                book = OpeningBook(self.book_path)
+            except OSError as error:
+                self.send(f"info string cannot open book: {error}")
+        if self.tablebase_path:
+            from .tablebase import Tablebase
+
+            tablebase = Tablebase(self.tablebase_path)
+        if self.threads > 1:
+            from .parallel import ParallelSearcher
+
+            self.searcher = ParallelSearcher(self.threads, self.hash_mb, book, tablebase)
+        else:
+            self.searcher = Searcher(tt_size_mb=self.hash_mb, book=book, tablebase=tablebase)
+
+    def close_searcher(self):
+        if self.searcher is None:
+            return
+        searcher = self.main_searcher()
+        for resource in (searcher.book, searcher.tablebase):
+            if resource is not None:
+                resource.close()
+        if searcher is not self.searcher:
+            self.searcher.close()
+        self.searcher = None
+
+    def handle(self, line):
+        # Runs one command; False once the engine should exit
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {self.hash_mb} min 1 max 4096")
+            self.send(f"option name Threads type spin default {self.threads} min 1 max 256")
+            self.send("option name Ponder type check default false")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            if self.searcher is None:
+                self.build_searcher()
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop()
+            if self.searcher is not None:
+                self.main_searcher().tt.clear()
+            self.game = Game()
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop()
+            self.close_searcher()
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        # setoption name <name> [value <value>]; names may contain spaces
+        text = " ".join(args)
+        name, _, value = text.partition(" value ")
+        if name.startswith("name "):
+            name = name[5:]
+        name = name.strip().lower()
+        value = value.strip()
+        if value == "<empty>":
+            value = ""
+        self.stop()
+        if name == "hash":
+            self.hash_mb = max(1, int(value))
+        elif name == "threads":
+            self.threads = max(1, int(value))
+        elif name == "bookfile":
+            self.book_path = value or None
+        elif name == "tablebasepath":
+            self.tablebase_path = value or None
+        elif name == "ponder":
+            # Pondering is driven by the GUI's go ponder; nothing to set
+            return
+        else:
+            self.send(f"info string unknown option {name}")
+            return
+        if self.searcher is not None:
+            self.build_searcher()
+
+    def set_position(self, args):
+        if args[:1] == ["startpos"]:
+            position = Position.starting()
+            rest = args[1:]
+        elif args[:1] == ["fen"]:
+            end = args.index("moves") if "moves" in args else len(args)
+            position = Position.from_fen(" ".join(args[1:end]))
+            rest = args[end:]
+        else:
+            self.send("info string position needs startpos or fen")
+            return
+        game = Game(position)
+        for uci in rest[1:] if rest[:1] == ["moves"] else ():
+            try:
+                game.make_move(parse_uci_move(game.position, uci, game.legal_moves()))
+            except ValueError:
+                self.send(f"info string illegal move {uci}")
+                break
+        self.game = game
+
+    def go(self, args):
+        self.stop()
+        if self.searcher is None:
+            self.build_searcher()
+        params = {}
+        for i, token in enumerate(args[:-1]):
+            if token in GO_INTEGERS:
+                params[token] = int(args[i + 1])
+
+        white = self.game.position.side_to_move == WHITE
+        budget = None
+        if "movetime" in params:
+            budget = params["movetime"] / 1000
+        elif ("wtime" if white else "btime") in params:
+            budget = time_budget(
+                params["wtime" if white else "btime"],
+                params.get("winc" if white else "binc", 0),
+                params.get("movestogo"),
+            )
+
+        self.pondering = "ponder" in args
+        self.ponder_budget = budget if self.pondering else None
+        if self.pondering or "infinite" in args:
+            budget = None
+            self.released.clear()
+        else:
+            self.released.set()
+        limits = SearchLimits(depth=params.get("depth"), nodes=params.get("nodes"), movetime=budget)
+        self.thread = threading.Thread(
+            target=self.run_search,
+            args=(self.game.position.copy(), limits, list(self.game.key_history)),
+            daemon=True,
+        )
+        self.thread.start()
+
+    def run_search(self, position, limits, key_history):
+        result = self.searcher.search(position, limits, key_history, info=self.report)
+        # A finished ponder or infinite search still waits for the GUI
+        self.released.wait()
+        if not result.move:
+            self.send("bestmove 0000")
+        elif len(result.pv) > 1:
+            self.send(f"bestmove {move_to_uci(result.move)} ponder {move_to_uci(result.pv[1])}")
+        else:
+            self.send(f"bestmove {move_to_uci(result.move)}")
+
+    def report(self, result):
+        # Called after every iteration; also catches a ponderhit that came
+        # before the search had set its own deadline
+        searcher = self.main_searcher()
+        if not self.pondering and self.ponder_budget is not None and searcher.deadline is None:
+            searcher.deadline = self.ponder_deadline
+        self.send(format_info(result))
+
+    def ponderhit(self):
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.ponder_budget is not None:
+            self.ponder_deadline = time.perf_counter() + self.ponder_budget
+            self.main_searcher().deadline = self.ponder_deadline
+        self.released.set()
+
+    def stop(self):
+        # Stops any search and waits for its bestmove; stop() is repeated
+        # in case the search thread had not started searching yet
+        self.pondering = False
+        self.released.set()
+        while self.thread is not None and self.thread.is_alive():
+            self.searcher.stop()
+            self.thread.join(0.01)
+        self.thread = None
+
+    def run(self, input=None):
+        input = input or sys.stdin
+        while True:
+            line = input.readline()
+            if not line:
+                break
+            try:
+                if not self.handle(line):
+                    break
+            except (IndexError, ValueError) as error:
+                self.send(f"info string error: {error}")
+        self.stop()
+        self.close_searcher()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="chesscore uci", description="Speak UCI on stdin/stdout.")
+    parser.add_argument("--hash", type=int, default=16, help="transposition table size in MB")
+    parser.add_argument("--threads", type=int, default=1, help="search processes (Lazy SMP)")
+    parser.add_argument("--book", help="Polyglot opening book to play from first")
+    parser.add_argument("--tablebases", help="directory of endgame tables to play from")
+    args = parser.parse_args(argv)
+
+    UCIEngine(hash_mb=args.hash, threads=args.threads, book_path=args.book, tablebase_path=args.tablebases).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
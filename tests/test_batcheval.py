@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from chesscore.batcheval import evaluate_batch, evaluate_file, open_dataset, pack_positions, write_dataset
+from chesscore.evaluate import evaluate
+from chesscore.movegen import generate_legal_moves
+from chesscore.perft import REFERENCE_POSITIONS
+from chesscore.position import Position
+
+
+def sample_positions(count=300):
+    # Reference positions and random walks from them
+    rng = random.Random(5)
+    positions = []
+    for _, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        positions.append(position.copy())
+        for _ in range(count // len(REFERENCE_POSITIONS)):
+            moves = generate_legal_moves(position)
+            if not moves:
+                position = Position.from_fen(fen)
+                continue
+            position.make_move(rng.choice(moves))
+            positions.append(position.copy())
+    return positions
+
+
+def test_batch_matches_evaluate():
+    positions = sample_positions()
+    scores = evaluate_batch(pack_positions(positions))
+    assert scores.tolist() == [evaluate(position) for position in positions]
+
+
+def test_evaluate_file_on_memmap(tmp_path):
+    positions = sample_positions(100)
+    path = str(tmp_path / "data.bin")
+    write_dataset(path, positions)
+    assert isinstance(open_dataset(path), np.memmap)
+    out = np.lib.format.open_memmap(str(tmp_path / "scores.npy"), mode="w+", dtype=np.int64, shape=(len(positions),))
+    # A small chunk size so the file is scored over several chunks
+    evaluate_file(path, out, chunk_rows=7)
+    assert out.tolist() == [evaluate(position) for position in positions]
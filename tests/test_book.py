@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+from chesscore.book import ENTRY, ENTRY_SIZE, OpeningBook, build_book, decode_book_move, encode_book_move
+from chesscore.movegen import generate_legal_moves, parse_san
+from chesscore.position import CASTLE, Position
+
+GAMES = """[Event "a"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. O-O 1-0
+
+[Event "b"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bc4 Nf6 4. O-O 1-0
+
+[Event "c"]
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+"""
+
+# Polyglot key of the start position, from the format's specification
+START_KEY = 0x463B96181691FC9C
+
+
+def test_build_and_probe(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text(GAMES)
+    path = str(tmp_path / "book.bin")
+    build_book(str(pgn), path)
+    with open(path, "rb") as file:
+        data = file.read()
+    keys = [ENTRY.unpack_from(data, offset)[0] for offset in range(0, len(data), ENTRY_SIZE)]
+    assert START_KEY in keys
+    assert keys == sorted(keys)
+
+    position = Position.starting()
+    with OpeningBook(path, random.Random(1)) as book:
+        # Two white wins for e4, one draw for d4
+        entries = dict(book.entries(position))
+        assert entries == {parse_san(position, "e4"): 4, parse_san(position, "d4"): 1}
+        picks = Counter(book.choose(position) for _ in range(5000))
+        assert 0.75 < picks[parse_san(position, "e4")] / 5000 < 0.85
+
+        for san in ("e4", "e5", "Nf3", "Nc6", "Bc4", "Nf6"):
+            position.make_move(parse_san(position, san))
+        # Stored as the king taking its rook, read back as a castle move
+        assert book.raw_entries(position.key) == [(7 | 4 << 6, 4)]
+        move = book.choose(position)
+        assert move >> 15 == CASTLE and (move >> 6) & 63 == 6
+        assert book.choose(Position.from_fen("4k3/8/8/8/8/8/8/4K3 w - - 0 1")) is None
+
+
+def test_move_encoding_round_trips():
+    for fen in ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1"):
+        position = Position.from_fen(fen)
+        moves = generate_legal_moves(position)
+        castles = [move for move in moves if move >> 15 == CASTLE]
+        assert len(castles) == 2
+        for move in moves:
+            assert decode_book_move(position, encode_book_move(move)) == move
+        for move in castles:
+            raw = encode_book_move(move)
+            assert raw & 63 in (0, 7, 56, 63)
@@ -0,0 +1,55 @@
+import io
+
+from chesscore.explorer import PositionIndex, build_index, totals
+from chesscore.movegen import parse_uci_move
+from chesscore.position import Position
+
+GAMES = """[Event "a"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 1-0
+
+[Event "b"]
+[White "C"]
+[Black "D"]
+[Result "0-1"]
+
+1. e4 c5 2. Nf3 d6 0-1
+
+[Event "c"]
+[White "E"]
+[Black "F"]
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+"""
+
+
+def played(*ucis):
+    position = Position.starting()
+    for uci in ucis:
+        position.make_move(parse_uci_move(position, uci))
+    return position
+
+
+def test_build_and_query(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text(GAMES)
+    path = str(tmp_path / "positions.db")
+    out = io.StringIO()
+    build_index(path, [str(pgn)], out=out)
+    # The same source again is skipped, not counted twice
+    build_index(path, [str(pgn)], out=out)
+    assert "already indexed" in out.getvalue()
+
+    with PositionIndex(path, readonly=True) as index:
+        rows = index.lookup(Position.starting())
+        assert totals(rows) == (3, 1, 1, 1)
+        assert [row[:2] for row in rows][0] == (parse_uci_move(Position.starting(), "e2e4"), 2)
+        assert index.games_reaching(Position.starting()) == [1, 2, 3]
+        assert index.games_reaching(played("e2e4", "c7c5")) == [2]
+        assert index.games_reaching(played("e2e4"), 1) == [1]
+        assert index.game(2) == (str(pgn), 2, "C", "D", "0-1")
+        assert index.games_reaching(played("a2a4")) == []
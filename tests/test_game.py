@@ -0,0 +1,68 @@
+import random
+
+from chesscore.game import CHECKPOINT_INTERVAL, Game
+
+
+def random_game(rng, plies):
+    game = Game()
+    for _ in range(plies):
+        moves = game.legal_moves()
+        if not moves:
+            break
+        game.make_move(rng.choice(moves))
+    return game
+
+
+def replayed(game, ply):
+    # A fresh game played up to ply of game's line
+    line = game.moves + [record[0] for record in reversed(game.future)]
+    fresh = Game()
+    fresh.replay(game.start_position.copy(), line[:ply])
+    return fresh
+
+
+def assert_same(game, fresh):
+    assert game.position == fresh.position
+    assert game.position.to_fen() == fresh.position.to_fen()
+    assert game.key_history == fresh.key_history
+    assert game.moves == fresh.moves
+
+
+def test_seek_matches_replay():
+    rng = random.Random(7)
+    for _ in range(5):
+        game = random_game(rng, 120)
+        total = len(game.moves)
+        for ply in [0, total, 1, total - 1, CHECKPOINT_INTERVAL, 3 * CHECKPOINT_INTERVAL + 5] + [
+            rng.randrange(total + 1) for _ in range(20)
+        ]:
+            game.seek(ply)
+            assert_same(game, replayed(game, ply))
+            assert len(game.moves) + len(game.future) == total
+
+
+def test_undo_redo_match_replay():
+    rng = random.Random(11)
+    game = random_game(rng, 60)
+    for _ in range(200):
+        if rng.random() < 0.5:
+            game.undo()
+        else:
+            game.redo()
+        assert_same(game, replayed(game, len(game.moves)))
+
+
+def test_new_move_drops_the_undone_line():
+    rng = random.Random(3)
+    game = random_game(rng, 50)
+    game.seek(20)
+    moves = [move for move in game.legal_moves() if move != game.future[-1][0]]
+    game.make_move(moves[0])
+    assert not game.future
+    assert game.redo() is None
+    assert_same(game, replayed(game, 21))
+    for _ in range(40):
+        game.make_move(rng.choice(game.legal_moves()))
+    game.seek(0)
+    game.seek(61)
+    assert_same(game, replayed(game, 61))
@@ -0,0 +1,40 @@
+import importlib
+import sys
+
+import chesscore
+from chesscore import instrument, movegen, pgn
+from chesscore.position import Position
+
+
+def test_disable_restores_modules_imported_while_enabled(monkeypatch):
+    # explorer is imported afresh while enabled; monkeypatch puts any
+    # earlier copy back afterwards
+    monkeypatch.delitem(sys.modules, "chesscore.explorer", raising=False)
+    monkeypatch.setattr(chesscore, "explorer", None, raising=False)
+    original = movegen.parse_uci_move
+    instrument.metrics.reset()
+    instrument.enable()
+    try:
+        explorer = importlib.import_module("chesscore.explorer")
+        assert explorer.parse_uci_move is not original
+        explorer.parse_uci_move(Position.starting(), "e2e4")
+        assert instrument.metrics.timings["validation.parse_uci_move"].count == 1
+    finally:
+        instrument.disable()
+    assert explorer.parse_uci_move is original
+    assert movegen.parse_uci_move is original
+    assert not instrument.enabled()
+
+
+def test_enable_twice_keeps_one_wrapper():
+    original = movegen.generate_legal_moves
+    instrument.metrics.reset()
+    instrument.enable()
+    instrument.enable()
+    try:
+        pgn.parse_game("1. e4 e5 *")
+        movegen.generate_legal_moves(Position.starting())
+        assert instrument.metrics.counters["movegen.calls"] == 1
+    finally:
+        instrument.disable()
+    assert movegen.generate_legal_moves is original
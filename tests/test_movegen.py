@@ -0,0 +1,46 @@
+import pytest
+
+from chesscore.movegen import generate_legal_moves, is_check
+from chesscore.perft import REFERENCE_POSITIONS
+from chesscore.position import EN_PASSANT, Position, parse_square
+from chesscore.zobrist import compute_key
+
+
+def test_unmake_restores_every_position():
+    for name, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        for move in generate_legal_moves(position):
+            undo = position.make_move(move)
+            assert position.key == compute_key(position), name
+            for reply in generate_legal_moves(position):
+                reply_undo = position.make_move(reply)
+                assert position.key == compute_key(position), name
+                position.unmake_move(reply, reply_undo)
+            position.unmake_move(move, undo)
+            assert position.to_fen() == fen, name
+            assert position.key == compute_key(position), name
+
+
+def test_moves_never_leave_the_king_in_check():
+    for name, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        us = position.side_to_move
+        for move in generate_legal_moves(position):
+            undo = position.make_move(move)
+            assert not is_check(position, us), name
+            position.unmake_move(move, undo)
+
+
+def test_en_passant_needs_a_pawn_to_capture():
+    for fen in ("4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1", "4k3/4p3/8/3Pp3/8/8/8/4K3 w - e6 0 1"):
+        with pytest.raises(ValueError):
+            Position.from_fen(fen)
+    # A position reached some other way still never gets a phantom capture
+    position = Position.from_fen("4k3/8/8/3P4/8/8/8/4K3 w - - 0 1")
+    position.ep_square = parse_square("e6")
+    fen = position.to_fen()
+    moves = generate_legal_moves(position)
+    assert position.to_fen() == fen
+    assert not any(move >> 15 == EN_PASSANT for move in moves)
+    position = Position.from_fen("4k3/8/8/3Pp3/8/8/8/4K3 w - e6 0 1")
+    assert sum(move >> 15 == EN_PASSANT for move in generate_legal_moves(position)) == 1
@@ -0,0 +1,15 @@
+from chesscore.movegen import generate_legal_moves
+from chesscore.parallel import ParallelSearcher
+from chesscore.position import Position
+from chesscore.search import SearchLimits
+
+
+def test_two_workers_find_a_legal_move():
+    position = Position.starting()
+    with ParallelSearcher(2, tt_size_mb=1) as searcher:
+        result = searcher.search(position, SearchLimits(depth=3))
+        processes = list(searcher.pool._processes.values())
+    assert result.move in generate_legal_moves(position)
+    assert result.depth >= 3
+    assert searcher.pool is None
+    assert processes and not any(process.is_alive() for process in processes)
@@ -0,0 +1,19 @@
+import pytest
+
+from chesscore.perft import REFERENCE_POSITIONS, perft
+from chesscore.position import Position
+
+# Depths up to about a million leaves keep the suite quick
+MAX_NODES = 1000000
+
+CASES = [
+    (name, fen, depth, nodes)
+    for name, fen, counts in REFERENCE_POSITIONS
+    for depth, nodes in counts.items()
+    if nodes <= MAX_NODES
+]
+
+
+@pytest.mark.parametrize("name, fen, depth, nodes", CASES, ids=[f"{case[0]}-{case[2]}" for case in CASES])
+def test_reference_counts(name, fen, depth, nodes):
+    assert perft(Position.from_fen(fen), depth) == nodes
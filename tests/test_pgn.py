@@ -0,0 +1,69 @@
+from chesscore.movegen import generate_legal_moves, move_to_san, parse_san
+from chesscore.perft import REFERENCE_POSITIONS
+from chesscore.pgn import parse_game, read_games
+from chesscore.position import Position
+
+GAME = """[Event "Test"]
+[White "A"]
+[Black "B"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7 1-0
+"""
+
+# Ply 9 is a king move into the bishop's diagonal
+BROKEN_GAME = GAME.replace("5. O-O", "5. Kd3")
+
+
+def test_san_round_trips():
+    # Every legal move of every reference position and its replies
+    for name, fen, _ in REFERENCE_POSITIONS:
+        position = Position.from_fen(fen)
+        for move in generate_legal_moves(position):
+            assert parse_san(position, move_to_san(position, move)) == move, name
+            undo = position.make_move(move)
+            for reply in generate_legal_moves(position):
+                assert parse_san(position, move_to_san(position, reply)) == reply, name
+            position.unmake_move(move, undo)
+
+
+def test_san_suffixes_and_disambiguation():
+    position = Position.from_fen("4k3/8/8/8/8/8/8/R3K2R w KQ - 0 1")
+    sans = {move_to_san(position, move) for move in generate_legal_moves(position)}
+    assert {"O-O", "O-O-O", "Rd1", "Ra8+", "Rh8+"} <= sans
+    position = Position.from_fen("7k/1P6/8/8/8/8/8/N3K2N w - - 0 1")
+    sans = {move_to_san(position, move) for move in generate_legal_moves(position)}
+    assert {"b8=Q+", "b8=N", "Ng3", "Nb3"} <= sans
+    position = Position.from_fen("6k1/5ppp/8/R7/8/8/8/R4RK1 w - - 0 1")
+    sans = {move_to_san(position, move) for move in generate_legal_moves(position)}
+    assert {"R1a3", "R5a3", "Rae1", "Rfe1", "Ra8#"} <= sans
+
+
+def test_parse_game():
+    game = parse_game(GAME)
+    assert game.error is None
+    assert game.result == "1-0"
+    assert game.headers["White"] == "A"
+    assert len(game.moves) == 10
+
+
+def test_header_result_without_result_token():
+    game = parse_game('[Event "a"]\n[Result "1-0"]\n\n1. e4 e5 2. Nf3\n')
+    assert game.error is None
+    assert game.result == "1-0"
+    assert parse_game('[Result "1-0"]\n\n1. e4 e5 *\n').result == "*"
+    assert parse_game("1. e4 e5\n").result == "*"
+
+
+def test_error_keeps_moves_before_it():
+    game = parse_game(BROKEN_GAME)
+    assert game.error.startswith("ply 9:")
+    assert game.moves == parse_game(GAME).moves[:8]
+
+
+def test_read_games(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text(GAME + "\n" + BROKEN_GAME + "\n" + GAME)
+    games = list(read_games(str(path)))
+    assert [game.index for game in games] == [0, 1, 2]
+    assert [game.error is None for game in games] == [True, False, True]
@@ -0,0 +1,85 @@
+import os
+
+import pytest
+
+from chesscore.game import Game
+from chesscore.savegame import MOVE_BYTES, MoveJournal, SaveFile, read_journal
+
+
+def play(game, count):
+    for _ in range(count):
+        game.make_move(game.legal_moves()[0])
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "save.journal")
+    game = Game()
+    play(game, 12)
+    save_file = SaveFile(path)
+    save_file.save(game)
+    play(game, 3)
+    save_file.save(game)
+    save_file.close()
+
+    loaded = Game()
+    assert SaveFile(path).load(loaded)
+    assert loaded.moves == game.moves
+    assert loaded.position == game.position
+
+
+def test_torn_record_is_cut_off_before_appending(tmp_path):
+    path = str(tmp_path / "save.journal")
+    game = Game()
+    play(game, 6)
+    save_file = SaveFile(path)
+    save_file.save(game)
+    save_file.close()
+    whole = os.path.getsize(path)
+    with open(path, "ab") as file:
+        file.write(b"M\x01")
+
+    assert read_journal(path)[1] == game.moves
+    with MoveJournal(path) as journal:
+        journal.append_move(game.legal_moves()[0])
+    assert os.path.getsize(path) == whole + 4
+    game.make_move(game.legal_moves()[0])
+    assert read_journal(path)[1] == game.moves
+
+
+def test_new_game_rewrites_the_file(tmp_path):
+    path = str(tmp_path / "save.journal")
+    game = Game()
+    save_file = SaveFile(path)
+    play(game, 10)
+    save_file.save(game)
+    size = os.path.getsize(path)
+    for _ in range(5):
+        game.reset()
+        play(game, 4)
+        save_file.save(game)
+        play(game, 6)
+        save_file.save(game)
+    save_file.close()
+    assert os.path.getsize(path) == size
+
+
+def test_corrupt_journal_is_a_load_error(tmp_path):
+    path = str(tmp_path / "save.journal")
+    game = Game()
+    play(game, 6)
+    save_file = SaveFile(path)
+    save_file.save(game)
+    save_file.close()
+    # Ply 4 becomes a move of an empty square, and then an out of range int
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+    offset = len(data) - 3 * (1 + MOVE_BYTES)
+    for bad in (0x3FFFF, 0x7FFFFF):
+        data[offset + 1:offset + 1 + MOVE_BYTES] = bad.to_bytes(MOVE_BYTES, "little")
+        with open(path, "wb") as file:
+            file.write(data)
+        loaded = Game()
+        play(loaded, 2)
+        with pytest.raises(ValueError, match="ply 4"):
+            SaveFile(path).load(loaded)
+        assert len(loaded.moves) == 2
@@ -0,0 +1,35 @@
+from chesscore.movegen import generate_legal_moves, is_check
+from chesscore.position import Position, move_to_uci
+from chesscore.search import SearchLimits, Searcher, mate_in
+
+# Rook roller: 1. Rb7 Kg8 2. Ra8#
+MATE_IN_TWO = "7k/8/8/8/8/8/R7/1R4K1 w - - 0 1"
+
+
+def test_mate_in_two():
+    position = Position.from_fen(MATE_IN_TWO)
+    result = Searcher(tt_size_mb=1).search(position, SearchLimits(depth=4))
+    assert mate_in(result.score) == 2
+    assert len(result.pv) == 3
+    for move in result.pv:
+        position.make_move(move)
+    assert is_check(position) and not generate_legal_moves(position)
+
+
+def test_mate_in_one():
+    result = Searcher(tt_size_mb=1).search(Position.from_fen("6k1/8/6K1/8/8/8/8/R7 w - - 0 1"), SearchLimits(depth=3))
+    assert move_to_uci(result.move) == "a1a8"
+    assert mate_in(result.score) == 1
+
+
+def test_node_limit():
+    result = Searcher(tt_size_mb=1).search(Position.starting(), SearchLimits(nodes=500))
+    assert 0 < result.nodes <= 500
+    assert result.move in generate_legal_moves(Position.starting())
+
+
+def test_search_leaves_position_alone():
+    position = Position.starting()
+    fen = position.to_fen()
+    Searcher(tt_size_mb=1).search(position, SearchLimits(depth=3))
+    assert position.to_fen() == fen
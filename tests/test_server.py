@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from chesscore.game import Game
+from chesscore.position import Position
+from chesscore.server import LIVE_PLIES, GameServer, _rules_game
+
+INVALID_FENS = [
+    "7k/8/8/8/8/8/8/K6p b - - 0 1",
+    "8/8/8/8/8/8/8/K7 w - - 0 1",
+    "kk6/8/8/8/8/8/8/K7 w - - 0 1",
+    "k7/8/8/8/8/8/8/KP6 w - - 0 1",
+    "k6R/8/8/8/8/8/8/K7 w - - 0 1",
+    "k7/8/8/8/8/8/8/K7 w - e3 0 1",
+    "4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - - -1 1",
+    "4k3/8/8/8/8/8/8/4K3 w - - 0 65536",
+    "4k3/8/8/8/8/8/8/4K3 w - - 0 0",
+]
+
+
+def request(server, **fields):
+    return asyncio.run(server.handle_request(fields, None))
+
+
+@pytest.mark.parametrize("fen", INVALID_FENS)
+def test_invalid_fen(fen):
+    with pytest.raises(ValueError):
+        Position.from_fen(fen)
+
+
+def test_new_game_rejects_invalid_fen():
+    server = GameServer()
+    for fen in INVALID_FENS:
+        with pytest.raises(ValueError, match="Invalid"):
+            request(server, op="new", fen=fen)
+    assert not server.games
+    reply = request(server, op="new", fen="k6R/8/8/8/8/8/8/K7 b - - 0 1")
+    assert reply["ok"] and reply["game"] == 1
+
+
+def test_live_games_stay_bounded():
+    # Knights out and back, so the start position keeps repeating
+    server = GameServer()
+    game_id, _ = server.new_game()
+    for _ in range(LIVE_PLIES // 4 + 1):
+        results = server.play(game_id, ["g1f3", "g8f6", "f3g1", "f6g8"])
+        assert all(result["ok"] for result in results)
+    hosted = server.games[game_id]
+    assert len(hosted.moves) == LIVE_PLIES + 4
+    assert len(hosted.live.moves) == 4
+    assert len(hosted.live.key_history) == LIVE_PLIES + 5
+    assert results[-1]["status"] == "Draw by threefold repetition."
+
+
+def test_seek_with_earlier_keys():
+    # A rules game carries keys from before its start position
+    game = Game()
+    for _ in range(10):
+        game.make_move(game.legal_moves()[0])
+    game = _rules_game(game.position.pack(), game.key_history)
+    history = [game.key_history[:]]
+    for ply in range(40):
+        game.make_move(game.legal_moves()[ply % len(game.legal_moves())])
+        history.append(game.key_history[:])
+    for ply in (0, 40, 20, 3, 37):
+        game.seek(ply)
+        assert game.key_history == history[ply]
+
+
+def test_bad_fen_keeps_the_connection():
+    # Pipelined requests around a bad FEN all get their replies
+    async def session():
+        server = GameServer()
+        listener = await server.start()
+        port = listener.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        fens = ["4k3/8/8/8/8/8/8/4K3 w - - 0 70000", "4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1", None]
+        for i, fen in enumerate(fens):
+            writer.write(json.dumps({"op": "new", "fen": fen, "id": i}).encode() + b"\n")
+        await writer.drain()
+        replies = [json.loads(await reader.readline()) for _ in fens]
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return replies
+
+    replies = asyncio.run(session())
+    assert [reply["id"] for reply in replies] == [0, 1, 2]
+    assert [reply["ok"] for reply in replies] == [False, False, True]
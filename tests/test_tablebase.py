@@ -0,0 +1,69 @@
+import io
+import random
+
+import pytest
+
+from chesscore.movegen import generate_legal_moves
+from chesscore.position import Position
+from chesscore.tablebase import DRAW, LOSS, WIN, Tablebase, build_tables
+
+
+@pytest.fixture(scope="module")
+def built(tmp_path_factory):
+    # KPK needs KQK and KRK for its promotions, so all three are built
+    directory = str(tmp_path_factory.mktemp("tablebases"))
+    out = io.StringIO()
+    build_tables(["KQK", "KPK"], directory, out=out)
+    return directory, out.getvalue()
+
+
+@pytest.fixture(scope="module")
+def tablebase(built):
+    tablebase = Tablebase(built[0])
+    yield tablebase
+    tablebase.close()
+
+
+def test_longest_mates(built):
+    report = built[1]
+    assert "KQK: longest mate 20 plies" in report
+    assert "KRK: longest mate 32 plies" in report
+
+
+def test_known_values(tablebase):
+    # Mate in one, for either colour as the strong side
+    assert tablebase.probe(Position.from_fen("k7/7Q/1K6/8/8/8/8/8 w - - 0 1")) == (WIN, 1)
+    assert tablebase.probe(Position.from_fen("K7/7q/1k6/8/8/8/8/8 b - - 0 1")) == (WIN, 1)
+    assert tablebase.probe(Position.from_fen("Q1k5/8/2K5/8/8/8/8/8 b - - 0 1")) == (LOSS, 0)
+    # A king on the sixth rank in front of its pawn wins whoever moves
+    assert tablebase.probe(Position.from_fen("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1"))[0] == WIN
+    assert tablebase.probe(Position.from_fen("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1"))[0] == LOSS
+    # Stalemate, and a pawn that is simply taken
+    assert tablebase.probe(Position.from_fen("4k3/4P3/4K3/8/8/8/8/8 b - - 0 1")) == (DRAW, 0)
+    assert tablebase.probe(Position.from_fen("8/8/8/8/8/3k4/4P3/K7 b - - 0 1")) == (DRAW, 0)
+    # A rook pawn with the defending king in the corner is always drawn
+    assert tablebase.probe(Position.from_fen("k7/8/8/8/P7/8/8/K7 w - - 0 1")) == (DRAW, 0)
+    assert tablebase.probe(Position.from_fen("k7/8/8/8/8/8/8/K7 w - - 0 1")) == (DRAW, 0)
+    # Outside the tables
+    assert tablebase.probe(Position.starting()) is None
+
+
+def test_best_move_shortens_the_mate(tablebase):
+    rng = random.Random(9)
+    for fen in ("8/8/8/3k4/8/8/8/Q3K3 w - - 0 1", "8/8/8/8/2k5/8/4P3/4K3 w - - 0 1"):
+        position = Position.from_fen(fen)
+        outcome, plies = tablebase.probe(position)
+        assert outcome == WIN
+        while plies:
+            move, result, best_plies = tablebase.best_move(position)
+            assert (result, best_plies) == (WIN, plies)
+            position.make_move(move)
+            assert tablebase.probe(position) == (LOSS, plies - 1)
+            if not generate_legal_moves(position):
+                break
+            # Any defence keeps the mate at most plies - 2 away
+            position.make_move(rng.choice(generate_legal_moves(position)))
+            outcome, next_plies = tablebase.probe(position)
+            assert outcome == WIN and next_plies <= plies - 2
+            plies = next_plies
+        assert not generate_legal_moves(position)
@@ -0,0 +1,77 @@
+from chesscore.game import Game
+from chesscore.movegen import generate_legal_moves, parse_uci_move
+from chesscore.position import Position
+from chesscore.tournament import (
+    EngineSpec,
+    MatchScore,
+    adjudicate,
+    load_openings,
+    parse_engine,
+    play_game,
+    sprt_bounds,
+)
+
+BOUNDS = sprt_bounds(0.05, 0.05)
+
+
+def match(wins, draws, losses):
+    score = MatchScore()
+    score.wins, score.draws, score.losses = wins, draws, losses
+    return score
+
+
+def test_all_wins_accepts_h1():
+    assert match(0, 0, 0).llr(0, 10) == 0
+    assert match(30, 0, 0).llr(0, 10) >= BOUNDS[1]
+
+
+def test_all_losses_accepts_h0():
+    assert match(0, 0, 30).llr(0, 10) <= BOUNDS[0]
+
+
+def test_llr_follows_the_score():
+    llrs = [match(wins, 100, 200 - wins).llr(0, 10) for wins in range(80, 121, 10)]
+    assert llrs == sorted(llrs)
+    assert BOUNDS[0] < match(100, 100, 100).llr(0, 10) < 0
+    assert abs(match(0, 30, 0).llr(-10, 10)) < 1e-9
+
+
+def test_parse_engine():
+    assert parse_engine("depth=3,hash=8", "base") == EngineSpec("base", depth=3, hash=8)
+    spec = parse_engine("sf:nodes=1000,cmd=stockfish --opt a,b", "base")
+    assert spec.name == "sf"
+    assert spec.nodes == 1000
+    assert spec.command == "stockfish --opt a,b"
+
+
+def test_adjudicate():
+    def decided(fen):
+        return adjudicate(Game(Position.from_fen(fen)))
+
+    assert decided("R5k1/5ppp/8/8/8/8/8/6K1 b - - 1 1") == ("1-0", "checkmate")
+    assert decided("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1") == ("1/2-1/2", "stalemate")
+    assert decided("8/8/4k3/8/8/3NK3/8/8 w - - 0 1") == ("1/2-1/2", "insufficient material")
+    assert decided(Position.starting().to_fen()) is None
+
+
+def test_play_game():
+    opening = Position.starting().to_fen()
+    record = play_game(1, opening, EngineSpec("a", depth=1), EngineSpec("b", depth=1), max_plies=6)
+    assert (record.result, record.reason, record.plies) == ("1/2-1/2", "move limit", 6)
+    assert (record.white, record.black) == ("a", "b")
+    position = Position.from_fen(opening)
+    for uci in record.moves.split():
+        move = parse_uci_move(position, uci, generate_legal_moves(position))
+        position.make_move(move)
+
+
+def test_load_openings_from_epd(tmp_path):
+    path = tmp_path / "openings.epd"
+    path.write_text(
+        'rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - bm e5; id "e4";\n'
+        "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1\n"
+    )
+    assert load_openings(str(path)) == [
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1",
+        "rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1",
+    ]
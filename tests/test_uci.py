@@ -0,0 +1,77 @@
+import io
+import time
+
+from chesscore.movegen import generate_legal_moves, parse_uci_move
+from chesscore.position import Position
+from chesscore.uci import UCIEngine
+
+
+def engine():
+    output = io.StringIO()
+    return UCIEngine(output=output), output
+
+
+def bestmoves(output):
+    return [line.split()[1] for line in output.getvalue().splitlines() if line.startswith("bestmove")]
+
+
+def test_position_moves():
+    uci, output = engine()
+    uci.handle("position startpos moves e2e4 e7e5 g1f3")
+    assert len(uci.game.moves) == 3
+    assert uci.game.position.to_fen() == "rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"
+    uci.handle("position fen 4k3/8/8/8/8/8/8/R3K3 w Q - 0 1 moves e1c1 e8e7")
+    assert uci.game.position.to_fen() == "8/4k3/8/8/8/8/8/2KR4 w - - 2 2"
+    uci.handle("position startpos moves e2e4 e2e4")
+    assert len(uci.game.moves) == 1
+    assert "info string illegal move e2e4" in output.getvalue()
+
+
+def test_go_depth():
+    uci, output = engine()
+    uci.handle("position startpos moves e2e4")
+    uci.handle("go depth 2")
+    uci.thread.join(10)
+    lines = output.getvalue().splitlines()
+    assert any(line.startswith("info depth 2 ") for line in lines)
+    moves = bestmoves(output)
+    assert len(moves) == 1
+    parse_uci_move(Position.from_fen("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"), moves[0])
+
+
+def test_ponder_waits_for_ponderhit():
+    uci, output = engine()
+    uci.handle("position startpos")
+    uci.handle("go ponder depth 1")
+    deadline = time.time() + 10
+    while "info depth 1 " not in output.getvalue() and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    # The search is done, but a ponder search keeps its move until told
+    assert not bestmoves(output)
+    uci.handle("ponderhit")
+    uci.thread.join(10)
+    assert len(bestmoves(output)) == 1
+
+
+def test_stop_ends_an_infinite_search():
+    uci, output = engine()
+    uci.handle("position startpos")
+    uci.handle("go infinite")
+    time.sleep(0.1)
+    assert uci.thread.is_alive()
+    uci.handle("stop")
+    assert uci.thread is None
+    moves = bestmoves(output)
+    assert len(moves) == 1
+    position = Position.starting()
+    assert parse_uci_move(position, moves[0]) in generate_legal_moves(position)
+
+
+def test_missing_book_is_reported():
+    uci, output = engine()
+    uci.run(io.StringIO("setoption name BookFile value /missing/book.bin\nisready\nposition startpos\ngo depth 1\n"))
+    text = output.getvalue()
+    assert "info string cannot open book" in text
+    assert "readyok" in text
+    assert len(bestmoves(output)) == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from chesscore.movegen import parse_uci_move
+from chesscore.position import Position
+from chesscore.tt import EXACT, TranspositionTable
+from chesscore.zobrist import compute_key, repetition_count
+
+# Test vectors from the Polyglot book format specification
+POLYGLOT_KEYS = [
+    ("", 0x463B96181691FC9C),
+    ("e2e4", 0x823C9B50FD114196),
+    ("e2e4 d7d5", 0x0756B94461C50FB0),
+    ("e2e4 d7d5 e4e5", 0x662FAFB965DB29D4),
+    ("e2e4 d7d5 e4e5 f7f5", 0x22A48B5A8E47FF78),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652A607CA3F242C1),
+    ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00FDD303C946BDD9),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3C8123EA7B067637),
+    ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5C3F9B829B279560),
+]
+
+
+@pytest.mark.parametrize("moves, key", POLYGLOT_KEYS)
+def test_polyglot_keys(moves, key):
+    position = Position.starting()
+    for uci in moves.split():
+        position.make_move(parse_uci_move(position, uci))
+    assert position.key == key
+    assert compute_key(position) == key
+    assert Position.from_fen(position.to_fen()).key == key
+
+
+def test_repetition_count():
+    position = Position.starting()
+    keys = [position.key]
+    for uci in "g1f3 g8f6 f3g1 f6g8 g1f3 g8f6 f3g1 f6g8".split():
+        position.make_move(parse_uci_move(position, uci))
+        keys.append(position.key)
+    assert repetition_count(keys, position.halfmove_clock) == 3
+
+
+def test_transposition_table_round_trip():
+    table = TranspositionTable(1)
+    key = 0x463B96181691FC9C
+    table.store(key, 796, 3, EXACT, -25)
+    assert table.probe(key) == (796, 3, EXACT, -25)
+    assert table.probe(key ^ 1) is None